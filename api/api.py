@@ -1,6 +1,12 @@
 """
 API entry point para Vercel - Versión simplificada
 """
+import sys
+from pathlib import Path
+
+# Los módulos del backend se importan como paquetes de primer nivel (models, utils)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
 from backend.simple_api import app
 
 # Exportar la aplicación para Vercel
@@ -1,15 +1,35 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+import asyncio
 import json
+import os
+import secrets
 from models.predict import ChatPredictor
+from utils.executor import PredictionExecutor, PoolSaturated
+from utils.metrics import MetricsMiddleware, MetricsRegistry
+from utils.chat_session import ChatSession, handle_session_message, receive_text_frame
+
+# Arranque: calentar el modelo antes de recibir tráfico (CHAT_WARMUP=0 lo desactiva)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Carga el modelo en el arranque para que las sondas de salud no lo hagan"""
+    if os.environ.get("CHAT_WARMUP", "1") != "0":
+        try:
+            await executor.run(predictor.warmup)
+        except Exception as e:
+            print(f"Error calentando el modelo: {e}")
+    yield
 
 # Crear aplicación FastAPI
 app = FastAPI(
     title="Chat IA API",
     description="API para el sistema de chat con inteligencia artificial",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -31,10 +51,32 @@ app.add_middleware(
 # Inicializar predictor
 predictor = ChatPredictor()
 
+# Pool acotado para las predicciones (CPU) fuera del event loop
+executor = PredictionExecutor.from_env()
+
+# Métricas en formato Prometheus (GET /metrics), agregadas al hacer scrape
+metrics = MetricsRegistry()
+predictor.register_metrics(metrics)
+executor.register_metrics(metrics)
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# Sesiones abiertas en /ws/chat (estado por conexión, solo en memoria)
+chat_sessions: Dict[str, ChatSession] = {}
+metrics.gauge("chat_ws_sessions_active", "Conexiones /ws/chat abiertas", lambda: len(chat_sessions))
+
+# Máximo de mensajes aceptados por /chat/batch
+MAX_BATCH_SIZE = 256
+
+# Token para los endpoints /admin/* (sin CHAT_ADMIN_TOKEN quedan deshabilitados)
+ADMIN_TOKEN = os.environ.get("CHAT_ADMIN_TOKEN")
+# Código HTTP según el resultado de una recarga del modelo
+RELOAD_STATUS_CODES = {"ok": 200, "unchanged": 200, "in_progress": 409, "rejected": 422, "error": 500}
+
 # Modelos Pydantic
 class ChatMessage(BaseModel):
     text: str
     include_pictos: bool = True
+    debug: bool = False
 
 class ChatResponse(BaseModel):
     input: str
@@ -45,20 +87,64 @@ class ChatResponse(BaseModel):
     response: str
     pictos: Optional[list] = None
     timestamp: str
+    timings_ms: Optional[Dict[str, float]] = None
+    corrections: Optional[list] = None
+
+class ChatBatchMessage(BaseModel):
+    texts: List[str]
+    include_pictos: bool = True
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatResponse]
 
 class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
 
+def _to_chat_response(result: Dict[str, Any], include_pictos: bool) -> ChatResponse:
+    """Construye la respuesta del endpoint a partir del resultado del predictor"""
+    return ChatResponse(
+        input=result['input'],
+        prediction=result['prediction'],
+        decided_intent=result['decided_intent'],
+        best_prob=result['best_prob'],
+        status=result['status'],
+        response=result['response'],
+        pictos=result.get('pictos', []) if include_pictos else None,
+        timestamp=result.get('timestamp', 'now'),
+        timings_ms=result.get('timings_ms'),
+        corrections=result.get('corrections') if include_pictos else None
+    )
+
+def _busy_error(error: PoolSaturated) -> HTTPException:
+    """Respuesta 503 con Retry-After cuando el pool de predicción está lleno"""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 # Endpoints
 @app.get("/", response_model=HealthResponse)
 async def root():
-    """Endpoint de salud básico"""
-    try:
-        predictor.load_model()
-        return HealthResponse(status="ok", model_loaded=True)
-    except Exception as e:
-        return HealthResponse(status="error", model_loaded=False)
+    """Endpoint de salud básico (no carga el modelo)"""
+    return HealthResponse(status="ok", model_loaded=predictor.model is not None)
+
+@app.get("/livez")
+async def liveness():
+    """Liveness: el proceso responde. No toca el modelo ni el disco"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness():
+    """
+    Readiness: estado real del predictor sin efectos secundarios
+    
+    Responde 503 mientras el modelo no esté cargado; nunca dispara la carga.
+    """
+    status = predictor.status()
+    status["pool"] = executor.stats()
+    return JSONResponse(status_code=200 if status["model_loaded"] else 503, content=status)
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(message: ChatMessage):
@@ -72,26 +158,121 @@ async def chat(message: ChatMessage):
         Respuesta del asistente con predicción e intención
     """
     try:
-        # Procesar mensaje
-        result = predictor.process_message(message.text)
+        # Procesar mensaje en el pool (carga el modelo si hace falta)
+        result = await executor.run(predictor.process_message, message.text, message.debug)
         
         # Construir respuesta
-        response = ChatResponse(
-            input=result['input'],
-            prediction=result['prediction'],
-            decided_intent=result['decided_intent'],
-            best_prob=result['best_prob'],
-            status=result['status'],
-            response=result['response'],
-            pictos=result.get('pictos', []) if message.include_pictos else None,
-            timestamp=result.get('timestamp', 'now')
-        )
-        
-        return response
+        return _to_chat_response(result, message.include_pictos)
         
+    except PoolSaturated as e:
+        raise _busy_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando mensaje: {str(e)}")
 
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(batch: ChatBatchMessage):
+    """
+    Procesa varios mensajes en una sola llamada al modelo
+    
+    Pensado para tablets que encolan mensajes sin conexión y los reenvían
+    al reconectarse: todos los textos se vectorizan y puntúan juntos.
+    
+    Args:
+        batch: Lista de textos y opciones comunes
+        
+    Returns:
+        Respuestas del asistente en el mismo orden que los textos
+    """
+    if len(batch.texts) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El lote excede el máximo de {MAX_BATCH_SIZE} mensajes"
+        )
+    
+    try:
+        results = await executor.run(predictor.process_messages, batch.texts)
+        return ChatBatchResponse(
+            results=[_to_chat_response(result, batch.include_pictos) for result in results]
+        )
+        
+    except PoolSaturated as e:
+        raise _busy_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error procesando lote: {str(e)}")
+
+@app.get("/pictos/suggest")
+async def suggest_pictos(q: str = Query("", max_length=200), limit: int = Query(8, ge=1, le=50)):
+    """
+    Sugerencias de pictogramas mientras se escribe (autocompletado por prefijo)
+    
+    La consulta es una búsqueda binaria en el índice ordenado (microsegundos),
+    pero la primera construye el índice, así que pasa por el pool de predicción
+    igual que /chat para no bloquear el loop.
+    """
+    try:
+        suggestions = await executor.run(predictor.suggest_pictos, q, limit)
+    except PoolSaturated as e:
+        raise _busy_error(e)
+    return {
+        "query": q,
+        "suggestions": suggestions,
+        "pictos": [s["pictos"][0] for s in suggestions if s["pictos"]]
+    }
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Canal de chat persistente: un flujo de mensajes por una sola conexión
+    
+    Evita el costo de una petición HTTP (y del preflight de CORS) por mensaje.
+    Cada frame se responde en orden con la misma respuesta que /chat más un
+    resumen de la sesión; ver utils/chat_session.py para el protocolo.
+    """
+    await websocket.accept()
+    include_pictos = websocket.query_params.get("include_pictos", "true").lower() != "false"
+    session = ChatSession(include_pictos=include_pictos)
+    chat_sessions[session.session_id] = session
+    try:
+        await websocket.send_json({"type": "session", **session.info()})
+        while True:
+            raw = await receive_text_frame(websocket)
+            if raw is None:
+                break
+            reply = await handle_session_message(session, raw, predictor, executor, _to_chat_response)
+            await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        chat_sessions.pop(session.session_id, None)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Métricas de latencia, intenciones, cachés, pool y modelo en formato Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/timings")
+async def stage_timings():
+    """Percentiles por etapa (normalize, transform, score, topk, pictos, response)"""
+    return {
+        "stage_timing": predictor.stage_timing,
+        "stages": predictor.stage_stats()
+    }
+
+@app.post("/admin/reload-model")
+async def reload_model(force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """
+    Recarga el modelo desde disco sin reiniciar el proceso
+    
+    El modelo nuevo se carga en un hilo aparte (no ocupa el pool de
+    predicción), se valida con el canario y se publica de forma atómica; las
+    peticiones en curso terminan con el anterior. Requiere el encabezado
+    X-Admin-Token con el valor de CHAT_ADMIN_TOKEN.
+    """
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Recarga deshabilitada o token inválido")
+    report = await asyncio.to_thread(predictor.reload_model, force)
+    return JSONResponse(status_code=RELOAD_STATUS_CODES.get(report["result"], 500), content=report)
+
 @app.get("/intents")
 async def get_intents():
     """Retorna la lista de intenciones soportadas"""
@@ -104,20 +285,14 @@ async def get_intents():
 
 @app.get("/health")
 async def health_check():
-    """Verificación de salud del sistema"""
-    try:
-        predictor.load_model()
-        return {
-            "status": "healthy",
-            "model_loaded": True,
-            "message": "Sistema funcionando correctamente"
-        }
-    except Exception as e:
-        return {
-            "status": "unhealthy", 
-            "model_loaded": False,
-            "error": str(e)
-        }
+    """Verificación de salud del sistema (solo informa, no carga el modelo)"""
+    status = predictor.status()
+    return {
+        "status": "healthy" if status["model_loaded"] else "starting",
+        "model_loaded": status["model_loaded"],
+        "model_version": status["model_version"],
+        "message": "Sistema funcionando correctamente" if status["model_loaded"] else "Modelo aún no cargado"
+    }
 
 # Función para ejecutar el servidor
 def run_server(host: str = "127.0.0.1", port: int = 8000):
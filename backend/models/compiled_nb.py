@@ -0,0 +1,259 @@
+"""
+Motor de inferencia Naive Bayes en NumPy puro
+
+Extrae del pipeline entrenado (TfidfVectorizer + MultinomialNB) el vocabulario,
+el vector idf, la configuración de n-gramas y los parámetros del clasificador
+(feature_log_prob_ / class_log_prior_) a un artefacto .npz compacto. El
+puntuador resultante reproduce las probabilidades del pipeline sin pasar por
+la validación y los objetos de scikit-learn en cada mensaje.
+
+train.py lo exporta junto al .joblib en cada entrenamiento. El artefacto
+guarda la huella (blake2b del contenido) del .joblib del que salió, así el
+predictor detecta un .npz que quedó atrás de un reentrenamiento.
+
+Uso:
+    python models/compiled_nb.py --model models/baseline_nb.joblib --out models/baseline_nb.npz
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Versión del formato del artefacto; cambiarla invalida exportaciones anteriores
+COMPILED_FORMAT_VERSION = 1
+
+
+def file_fingerprint(path: str) -> str:
+    """Huella del contenido de un archivo (blake2b)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def strip_accents_unicode(s: str) -> str:
+    """Elimina acentos igual que strip_accents='unicode' de scikit-learn"""
+    try:
+        s.encode("ASCII", errors="strict")
+        return s
+    except UnicodeEncodeError:
+        normalized = unicodedata.normalize("NFKD", s)
+        return "".join([c for c in normalized if not unicodedata.combining(c)])
+
+
+class CompiledNB:
+    """Puntuador TF-IDF + Multinomial NB respaldado por arreglos NumPy"""
+
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray,
+                 feature_log_prob: np.ndarray, class_log_prior: np.ndarray,
+                 classes: np.ndarray, settings: Dict[str, Any]):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        # Traspuesta contigua: una fila por feature para el gather por índice
+        self.feature_log_prob_t = np.ascontiguousarray(feature_log_prob.T)
+        self.class_log_prior = class_log_prior
+        self.classes_ = classes
+        self.settings = settings
+
+        self._lowercase = settings['lowercase']
+        self._strip_accents = settings['strip_accents'] == 'unicode'
+        self._token_re = re.compile(settings['token_pattern'])
+        self._min_n, self._max_n = settings['ngram_range']
+        self._binary = settings['binary']
+        self._sublinear_tf = settings['sublinear_tf']
+        self._norm = settings['norm']
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "CompiledNB":
+        """Construye el puntuador desde un Pipeline(TfidfVectorizer, MultinomialNB) entrenado"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+
+        vectorizer = pipeline.steps[0][1]
+        clf = pipeline.steps[-1][1]
+        if len(pipeline.steps) != 2 or not isinstance(vectorizer, TfidfVectorizer) \
+                or not hasattr(vectorizer, 'vocabulary_'):
+            # Los modelos de train.py --stream (HashingVectorizer) no tienen vocabulario
+            raise ValueError("Solo se soportan pipelines TfidfVectorizer + MultinomialNB; "
+                             "los modelos con hashing se sirven con el backend 'sklearn'")
+        # Otro clasificador (ComplementNB, BernoulliNB, ...) puntúa distinto aunque tenga
+        # feature_log_prob_: exportarlo daría probabilidades diferentes sin avisar
+        if not isinstance(clf, MultinomialNB):
+            raise ValueError(f"Solo se soporta MultinomialNB, el pipeline usa {type(clf).__name__}")
+        params = vectorizer.get_params()
+
+        if params['analyzer'] != 'word' or params['tokenizer'] is not None \
+                or params['preprocessor'] is not None or params['stop_words'] is not None:
+            raise ValueError("Solo se soportan vectorizadores 'word' sin tokenizer, preprocessor ni stop_words")
+        if params['strip_accents'] not in (None, 'unicode'):
+            raise ValueError(f"strip_accents no soportado: {params['strip_accents']}")
+        if params['norm'] not in (None, 'l1', 'l2'):
+            raise ValueError(f"norm no soportado: {params['norm']}")
+        if not isinstance(params['sublinear_tf'], bool):
+            raise ValueError(f"sublinear_tf no soportado: {params['sublinear_tf']}")
+
+        settings = {
+            'format_version': COMPILED_FORMAT_VERSION,
+            'lowercase': params['lowercase'],
+            'strip_accents': params['strip_accents'],
+            'token_pattern': params['token_pattern'],
+            'ngram_range': list(params['ngram_range']),
+            'binary': params['binary'],
+            'use_idf': params['use_idf'],
+            'sublinear_tf': params['sublinear_tf'],
+            'norm': params['norm'],
+        }
+        idf = vectorizer.idf_ if params['use_idf'] else np.ones(len(vectorizer.vocabulary_))
+        return cls(
+            vocabulary={term: int(idx) for term, idx in vectorizer.vocabulary_.items()},
+            idf=np.asarray(idf, dtype=np.float64),
+            feature_log_prob=np.asarray(clf.feature_log_prob_, dtype=np.float64),
+            class_log_prior=np.asarray(clf.class_log_prior_, dtype=np.float64),
+            classes=np.asarray(clf.classes_),
+            settings=settings,
+        )
+
+    def save(self, path):
+        """Guarda el artefacto compilado en formato .npz (ruta o archivo abierto)"""
+        terms = [''] * len(self.vocabulary)
+        for term, idx in self.vocabulary.items():
+            terms[idx] = term
+        np.savez(
+            path,
+            terms=np.array(terms, dtype=str),
+            idf=self.idf,
+            feature_log_prob=self.feature_log_prob_t.T,
+            class_log_prior=self.class_log_prior,
+            classes=np.array([str(c) for c in self.classes_], dtype=str),
+            settings=np.array(json.dumps(self.settings)),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledNB":
+        """Carga un artefacto .npz generado por save()"""
+        with np.load(path, allow_pickle=False) as data:
+            settings = json.loads(str(data['settings']))
+            if settings.get('format_version') != COMPILED_FORMAT_VERSION:
+                raise ValueError(f"Versión de artefacto incompatible en {path}")
+            terms = data['terms'].tolist()
+            return cls(
+                vocabulary={term: idx for idx, term in enumerate(terms)},
+                idf=data['idf'],
+                feature_log_prob=data['feature_log_prob'],
+                class_log_prior=data['class_log_prior'],
+                classes=data['classes'],
+                settings=settings,
+            )
+
+    def analyze(self, text: str) -> List[str]:
+        """Preprocesa, tokeniza y genera n-gramas igual que el vectorizador original"""
+        if self._lowercase:
+            text = text.lower()
+        if self._strip_accents:
+            text = strip_accents_unicode(text)
+        tokens = self._token_re.findall(text)
+
+        if self._max_n == 1:
+            return tokens
+        ngrams = tokens[:] if self._min_n == 1 else []
+        n_tokens = len(tokens)
+        for n in range(max(self._min_n, 2), min(self._max_n, n_tokens) + 1):
+            for i in range(n_tokens - n + 1):
+                ngrams.append(" ".join(tokens[i:i + n]))
+        return ngrams
+
+    def _features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Índices de features y pesos tf-idf normalizados de un texto"""
+        counts: Dict[int, int] = {}
+        vocabulary = self.vocabulary
+        for term in self.analyze(text):
+            idx = vocabulary.get(term)
+            if idx is not None:
+                counts[idx] = counts.get(idx, 0) + 1
+
+        indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        if self._binary:
+            weights = np.ones(len(counts), dtype=np.float64)
+        else:
+            weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            if self._sublinear_tf:
+                weights = np.log(weights) + 1.0
+        weights = weights * self.idf[indices]
+
+        if self._norm == 'l2':
+            norm = np.sqrt(np.dot(weights, weights))
+        elif self._norm == 'l1':
+            norm = np.abs(weights).sum()
+        else:
+            norm = 0.0
+        if norm > 0.0:
+            weights /= norm
+        return indices, weights
+
+    def transform(self, texts: List[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Features tf-idf de cada texto (equivalente a vectorizer.transform)"""
+        return [self._features(text) for text in texts]
+
+    def predict_proba_features(self, features: List[Tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+        """Probabilidades por clase a partir de features ya calculadas con transform()"""
+        jll = np.tile(self.class_log_prior, (len(features), 1))
+        for row, (indices, weights) in enumerate(features):
+            if len(indices):
+                jll[row] += weights @ self.feature_log_prob_t[indices]
+
+        # Normalización en espacio logarítmico (logsumexp por fila)
+        max_jll = jll.max(axis=1, keepdims=True)
+        log_norm = max_jll + np.log(np.exp(jll - max_jll).sum(axis=1, keepdims=True))
+        return np.exp(jll - log_norm)
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        """Probabilidades por clase, una fila por texto (mismo orden que classes_)"""
+        return self.predict_proba_features(self.transform(texts))
+
+
+def export_model(model_path: str, out_path: str, pipeline=None) -> CompiledNB:
+    """
+    Exporta un pipeline joblib a un artefacto compilado .npz
+
+    Args:
+        model_path: .joblib del pipeline; su huella queda en el artefacto
+        out_path: Archivo .npz de salida (se reemplaza de forma atómica)
+        pipeline: El pipeline ya cargado de model_path, para no volver a leerlo
+
+    Raises:
+        ValueError: Si el pipeline no se puede compilar (por ejemplo, con hashing)
+    """
+    if pipeline is None:
+        import joblib
+        pipeline = joblib.load(model_path)
+    compiled = CompiledNB.from_pipeline(pipeline)
+    compiled.settings['source_fingerprint'] = file_fingerprint(model_path)
+    # Escribir aparte y renombrar: el predictor nunca lee un .npz a medias
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        compiled.save(f)
+    os.replace(tmp_path, out_path)
+    return compiled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar el modelo Naive Bayes a un artefacto NumPy")
+    parser.add_argument('--model', type=str, default='models/baseline_nb.joblib')
+    parser.add_argument('--out', type=str, default=None, help='Por defecto, el mismo nombre con extensión .npz')
+    args = parser.parse_args()
+
+    out_path = args.out or str(Path(args.model).with_suffix('.npz'))
+    compiled = export_model(args.model, out_path)
+    print(f"Modelo compilado guardado en {out_path}: "
+          f"{len(compiled.vocabulary)} features, {len(compiled.classes_)} clases")
+
+
+if __name__ == '__main__':
+    main()
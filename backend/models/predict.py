@@ -1,63 +1,582 @@
+import csv
 import json
-import joblib
+import os
+import threading
+import time
+import numpy as np
 from pathlib import Path
-from typing import List, Dict, Any
-from sklearn.pipeline import Pipeline
-from utils.pictos_mapping import PictosMapper
+from typing import TYPE_CHECKING, List, Dict, Any, NamedTuple, Optional, Tuple
+from utils.pictos_mapping import get_shared_mapper, peek_shared_mapper
+from utils.lru_cache import LRUCache, MISSING
+from utils.metrics import Counter, Histogram, MetricsRegistry, StageTimer, NULL_TIMER
+from models.compiled_nb import CompiledNB, file_fingerprint
 
+# scikit-learn y joblib se importan de forma diferida: el modo de servicio
+# 'compiled' solo necesita NumPy y no debe pagar su importación en cada arranque
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
 
-def load_model(path: str) -> Pipeline:
+# Backends de inferencia disponibles:
+#   'sklearn'  -> Pipeline completo cargado desde el .joblib
+#   'compiled' -> puntuador NumPy (CompiledNB) cargado desde el .npz exportado;
+#                 si el .npz no corresponde al .joblib actual se compila este en memoria
+PREDICTOR_BACKENDS = ('sklearn', 'compiled')
+DEFAULT_BACKEND = os.environ.get('CHAT_PREDICTOR_BACKEND', 'sklearn')
+
+# Caché de predicciones por frase normalizada (0 lo desactiva)
+PREDICTION_CACHE_SIZE = int(os.environ.get('CHAT_CACHE_SIZE', '4096'))
+PREDICTION_CACHE_TTL = float(os.environ.get('CHAT_CACHE_TTL', '3600'))
+# Cada cuántos segundos, como máximo, se revisa si el modelo cambió en disco
+MODEL_CHECK_INTERVAL = 1.0
+
+# Canario con que se valida un modelo nuevo antes de publicarlo: frases con su
+# intención esperada (CHAT_CANARY_FILE apunta a un CSV con columnas texto,intent)
+# y precisión mínima exigida sobre las intenciones que el modelo conoce
+CANARY_FILE = os.environ.get('CHAT_CANARY_FILE')
+CANARY_MIN_ACCURACY = float(os.environ.get('CHAT_CANARY_MIN_ACCURACY', '0.8'))
+CANARY_SET: List[Tuple[str, str]] = [
+    ("hola", "SALUDAR"),
+    ("adiós", "DESPEDIR"),
+    ("ayuda por favor", "PEDIR_AYUDA"),
+    ("tengo hambre", "COMER_BEBER"),
+    ("quiero agua", "COMER_BEBER"),
+    ("estoy triste", "EXPRESAR_EMOCION"),
+    ("me duele la cabeza", "DESCRIBIR_DOLOR"),
+    ("quiero jugar", "JUGAR"),
+    ("vamos al parque", "IR_LUGAR"),
+    ("gracias", "AGRADECER"),
+]
+
+# Medición por etapas: CHAT_STAGE_TIMING=1 la activa para todas las peticiones
+# (además de las que piden debug) y CHAT_SLOW_MS registra en el log las lentas
+STAGE_TIMING = os.environ.get('CHAT_STAGE_TIMING', '0') == '1'
+SLOW_REQUEST_MS = float(os.environ.get('CHAT_SLOW_MS', '250'))
+STAGES = ('normalize', 'cache', 'transform', 'score', 'topk', 'pictos', 'response', 'total')
+
+
+def load_model(path: str) -> "Pipeline":
     """Carga un modelo entrenado desde un archivo joblib"""
+    import joblib
     return joblib.load(path)
 
 
-def predict(model: Pipeline, text: str, top_k: int = 3) -> List[tuple]:
+def load_canary_set(path: str) -> List[Tuple[str, str]]:
+    """Frases del canario desde un CSV con columnas texto,intent"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return [(row['texto'], row['intent']) for row in csv.DictReader(f)]
+
+
+class ModelValidationError(Exception):
+    """El modelo candidato no pasó la validación con el canario"""
+
+
+class LoadedModel(NamedTuple):
+    """
+    Modelo publicado junto con sus metadatos
+
+    Se reemplaza entero con una sola asignación: cada petición toma una
+    referencia al inicio y termina con ese modelo aunque otro se publique
+    mientras tanto, y nunca ve un modelo con la versión de otro.
+    """
+    model: Any
+    version: str
+    path: str
+    loaded_at: float
+    load_seconds: float
+
+
+def predict(model: "Pipeline", text: str, top_k: int = 3) -> List[tuple]:
     """Realiza predicción con el modelo y retorna top-k resultados"""
-    probs = model.predict_proba([text])[0]
-    classes = model.classes_
-    paired = list(zip(classes, probs))
-    paired.sort(key=lambda x: x[1], reverse=True)
-    return paired[:top_k]
+    return predict_batch(model, [text], top_k=top_k)[0]
+
+
+def predict_batch(model: "Pipeline", texts: List[str], top_k: int = 3,
+                  timer=NULL_TIMER) -> List[List[tuple]]:
+    """
+    Realiza predicción de varios textos en una sola llamada a predict_proba
+
+    El vectorizador y el clasificador procesan toda la lista como una única
+    matriz dispersa, por lo que el costo por mensaje baja con el tamaño del lote.
+    Con un StageTimer se miden por separado las etapas transform, score y topk.
+    """
+    if not texts:
+        return []
+    with timer.stage('transform'):
+        features = transform_texts(model, list(texts))
+    with timer.stage('score'):
+        probs = score_features(model, features)
+    with timer.stage('topk'):
+        classes = model.classes_
+        # Orden estable descendente: mismo desempate que el sort por probabilidad
+        order = np.argsort(-probs, axis=1, kind='stable')[:, :top_k]
+        return [
+            [(classes[j], row[j]) for j in row_order]
+            for row, row_order in zip(probs, order)
+        ]
+
+
+def transform_texts(model, texts: List[str]):
+    """Vectorización TF-IDF (todas las etapas del pipeline salvo el clasificador)"""
+    if isinstance(model, CompiledNB):
+        return model.transform(texts)
+    features = texts
+    for _, step in model.steps[:-1]:
+        features = step.transform(features)
+    return features
+
+
+def score_features(model, features) -> np.ndarray:
+    """Probabilidades del clasificador a partir de las features ya vectorizadas"""
+    if isinstance(model, CompiledNB):
+        return model.predict_proba_features(features)
+    return model.steps[-1][1].predict_proba(features)
 
 
 class ChatPredictor:
     """Clase principal para el sistema de predicción del chat"""
     
-    def __init__(self, model_path: str = "backend/models/baseline_nb.joblib"):
+    def __init__(self, model_path: str = "backend/models/baseline_nb.joblib",
+                 backend: str = DEFAULT_BACKEND, compiled_path: Optional[str] = None):
+        if backend not in PREDICTOR_BACKENDS:
+            raise ValueError(f"Backend desconocido: {backend}. Opciones: {PREDICTOR_BACKENDS}")
         self.model_path = model_path
-        self.model = None
-        self.picto_mapper = PictosMapper()
+        self.backend = backend
+        self.compiled_path = compiled_path or str(Path(model_path).with_suffix('.npz'))
+        self._active: Optional[LoadedModel] = None
+        self._last_model_check = 0.0
         self.fallback_threshold = 0.45
+        self.cache = LRUCache(maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL)
+        self.stage_timing = STAGE_TIMING
+        self.stage_histograms = {stage: Histogram() for stage in STAGES}
+        # Predicciones por decided_intent (incluye FALLBACK)
+        self.intent_counter = Counter()
+        # Las predicciones corren en un pool de hilos: la carga debe ocurrir una sola vez
+        self._load_lock = threading.Lock()
+        # Recarga en caliente: una a la vez, en segundo plano, validada con el canario
+        self.canary_set = load_canary_set(CANARY_FILE) if CANARY_FILE else list(CANARY_SET)
+        self.reload_status: Optional[Dict[str, Any]] = None
+        self.reload_counter = Counter()
+        self._reload_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self._rejected_version: Optional[str] = None
+    
+    @property
+    def picto_mapper(self):
+        """Mapeador compartido vigente (reload_shared_mapper lo reemplaza en caliente)"""
+        return get_shared_mapper()
+    
+    @property
+    def model(self):
+        """Modelo publicado (None mientras no se haya cargado)"""
+        active = self._active
+        return active.model if active is not None else None
+    
+    @property
+    def model_version(self) -> Optional[str]:
+        active = self._active
+        return active.version if active is not None else None
+    
+    @property
+    def loaded_at(self) -> Optional[float]:
+        active = self._active
+        return active.loaded_at if active is not None else None
+    
+    @property
+    def load_seconds(self) -> Optional[float]:
+        active = self._active
+        return active.load_seconds if active is not None else None
         
-    def load_model(self):
-        """Carga el modelo si no está cargado"""
-        if self.model is None:
-            if Path(self.model_path).exists():
-                self.model = load_model(self.model_path)
-            else:
-                print(f"Modelo no encontrado en {self.model_path}, creando modelo básico...")
-                self._create_basic_model()
+    def load_model(self) -> LoadedModel:
+        """
+        Modelo publicado; lo carga en el primer uso
+        
+        Si el archivo cambió en disco no bloquea: programa una recarga en
+        segundo plano y sigue respondiendo con el modelo actual.
+        """
+        active = self._active
+        if active is None:
+            with self._load_lock:
+                if self._active is None:
+                    self._active = self._load_candidate(create_basic=True)
+                    self._last_model_check = time.monotonic()
+                active = self._active
+        elif self._model_file_changed(active):
+            self.reload_in_background()
+        return active
     
-    def predict_intent(self, text: str, include_pictos: bool = True) -> Dict[str, Any]:
+    def _load_candidate(self, create_basic: bool = False) -> LoadedModel:
+        """Carga el modelo desde disco (o crea el básico) sin publicarlo"""
+        start = time.perf_counter()
+        # La versión se toma antes de leer: si un archivo cambia durante la
+        # carga, la próxima revisión detecta la diferencia y vuelve a cargar
+        version = self._current_version()
+        compiled = self._load_compiled() if self.backend == 'compiled' else None
+        if compiled is not None:
+            model = compiled
+            loaded_path = self.compiled_path
+        elif Path(self.model_path).exists():
+            model = load_model(self.model_path)
+            loaded_path = self.model_path
+            if self.backend == 'compiled':
+                # Sin artefacto exportado al día: compilar en memoria desde el pipeline
+                model = CompiledNB.from_pipeline(model)
+        elif create_basic:
+            print(f"Modelo no encontrado en {self.model_path}, creando modelo básico...")
+            model = self._create_basic_model()
+            loaded_path = self.model_path
+            version = self._current_version()
+        else:
+            raise FileNotFoundError(f"Modelo no encontrado en {self.model_path}")
+        
+        return LoadedModel(model=model, version=version, path=loaded_path,
+                           loaded_at=time.time(), load_seconds=time.perf_counter() - start)
+    
+    def validate_model(self, model) -> Dict[str, Any]:
+        """
+        Valida un modelo candidato con el canario antes de publicarlo
+        
+        Exige probabilidades finitas que sumen 1 y, sobre las frases cuya
+        intención esperada el modelo conoce, una precisión de al menos
+        CANARY_MIN_ACCURACY.
+        
+        Raises:
+            ModelValidationError: Si el modelo no pasa alguna de las pruebas
+        """
+        texts = [text for text, _ in self.canary_set]
+        start = time.perf_counter()
+        probs = np.asarray(score_features(model, transform_texts(model, texts)))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        classes = model.classes_
+        if (probs.shape != (len(texts), len(classes)) or not np.all(np.isfinite(probs))
+                or not np.allclose(probs.sum(axis=1), 1.0, atol=1e-3)):
+            raise ModelValidationError("El modelo devuelve probabilidades inválidas para el canario")
+        
+        known = set(classes)
+        predicted = classes[probs.argmax(axis=1)]
+        checked = [expected == got for (_, expected), got in zip(self.canary_set, predicted)
+                   if expected in known]
+        accuracy = sum(checked) / len(checked) if checked else None
+        if accuracy is not None and accuracy < CANARY_MIN_ACCURACY:
+            raise ModelValidationError(
+                f"Precisión en el canario {accuracy:.2f} menor a {CANARY_MIN_ACCURACY:.2f}"
+            )
+        return {'size': len(texts), 'checked': len(checked), 'accuracy': accuracy,
+                'ms': round(elapsed_ms, 3)}
+    
+    def reload_model(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Carga el modelo de disco, lo valida y lo publica con una sola asignación
+        
+        Las peticiones en curso terminan con el modelo anterior; las nuevas
+        usan el nuevo. Si la carga falla o el canario lo rechaza, se sigue
+        sirviendo el anterior y esa versión del archivo no se reintenta.
+        
+        Args:
+            force: Recargar aunque la versión del archivo no haya cambiado
+            
+        Returns:
+            Informe con 'result' ('ok', 'unchanged', 'rejected', 'error' o 'in_progress')
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return {'result': 'in_progress'}
+        try:
+            return self._reload_locked(force)
+        finally:
+            self._reload_lock.release()
+    
+    def _reload_locked(self, force: bool) -> Dict[str, Any]:
+        current = self._active
+        version = self._current_version()
+        if current is not None and not force and version == current.version:
+            return self._record_reload('unchanged', version)
+        
+        print(f"Recargando modelo ({version})...")
+        try:
+            candidate = self._load_candidate()
+            canary = self.validate_model(candidate.model)
+        except ModelValidationError as e:
+            self._rejected_version = version
+            return self._record_reload('rejected', version, detail=str(e))
+        except Exception as e:
+            self._rejected_version = version
+            return self._record_reload('error', version, detail=str(e))
+        
+        self._active = candidate
+        self._rejected_version = None
+        # Las entradas del modelo anterior llevan su versión en la clave: ya no se usan
+        self.cache.clear()
+        return self._record_reload('ok', candidate.version, canary=canary,
+                                   previous_version=current.version if current else None,
+                                   load_seconds=candidate.load_seconds)
+    
+    def _record_reload(self, result: str, version: str, **extra) -> Dict[str, Any]:
+        self.reload_counter.inc((result,))
+        report = {'result': result, 'version': version, 'at': time.time(), **extra}
+        if result != 'unchanged':
+            print(f"Recarga del modelo: {result} ({version}) {extra.get('detail', '')}".rstrip())
+            self.reload_status = report
+        return report
+    
+    def reload_in_background(self) -> bool:
+        """Lanza reload_model en un hilo aparte; False si ya hay una recarga en curso"""
+        with self._load_lock:
+            if self._reload_lock.locked() or (self._reload_thread and self._reload_thread.is_alive()):
+                return False
+            thread = threading.Thread(target=self.reload_model, name='model-reload', daemon=True)
+            self._reload_thread = thread
+            thread.start()
+        return True
+    
+    def wait_for_reload(self, timeout: Optional[float] = None):
+        """Espera a que termine la recarga en segundo plano, si hay una"""
+        thread = self._reload_thread
+        if thread is not None:
+            thread.join(timeout)
+    
+    def warmup(self, texts: Optional[List[str]] = None):
+        """
+        Carga el modelo y ejecuta unas predicciones de calentamiento
+        
+        Pensado para el arranque del servidor: así ni las sondas de salud ni la
+        primera petición de un usuario pagan la carga en frío.
+        """
+        active = self.load_model()
+        texts = texts or ["hola", "quiero agua"]
+        # Sin pasar por el caché ni contar intenciones: el calentamiento no es tráfico real
+        for text, top_predictions in zip(texts, predict_batch(active.model, texts, top_k=3)):
+            self._build_result(text, top_predictions, include_pictos=True, count=False)
+        # Índices de autocompletado (/pictos/suggest) y de corrección de errores
+        self.picto_mapper.get_prefix_index()
+        self.picto_mapper.get_fuzzy_index()
+    
+    def status(self) -> Dict[str, Any]:
+        """
+        Estado actual del predictor, sin efectos secundarios
+        
+        No carga ni crea el modelo ni el mapeador de pictogramas: solo informa lo que ya está en memoria.
+        """
+        return {
+            'model_loaded': self.model is not None,
+            'state': 'warm' if self.model is not None else 'cold',
+            'backend': self.backend,
+            'model_version': self.model_version,
+            'loaded_at': self.loaded_at,
+            'load_seconds': self.load_seconds,
+            'pictos_index_size': self._pictos_index_size(),
+            'reload': self.reload_status,
+        }
+    
+    @staticmethod
+    def _file_version(path: str) -> str:
+        """Versión del modelo derivada del archivo (nombre, fecha de modificación y tamaño)"""
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return f"{Path(path).name}:memoria"
+        return f"{Path(path).name}:{stat.st_mtime_ns}:{stat.st_size}"
+    
+    def _current_version(self) -> str:
+        """
+        Versión de los archivos de los que sale el modelo servido
+        
+        Con el backend 'compiled' se vigilan el .npz y el .joblib: un
+        reentrenamiento que solo reemplaza el .joblib también cambia el modelo.
+        """
+        if self.backend == 'compiled':
+            return f"{self._file_version(self.compiled_path)}|{self._file_version(self.model_path)}"
+        return self._file_version(self.model_path)
+    
+    def _load_compiled(self) -> Optional[CompiledNB]:
+        """El .npz exportado, o None si no existe o quedó atrás del .joblib"""
+        if not Path(self.compiled_path).exists():
+            return None
+        compiled = CompiledNB.load(self.compiled_path)
+        if not self._compiled_is_current(compiled):
+            print(f"{self.compiled_path} no corresponde a {self.model_path} "
+                  f"(¿reentrenado sin exportar?); se compila el .joblib en memoria")
+            return None
+        return compiled
+    
+    def _compiled_is_current(self, compiled: CompiledNB) -> bool:
+        """El .npz salió del .joblib actual (o no hay .joblib con qué compararlo)"""
+        if not Path(self.model_path).exists():
+            return True
+        source = compiled.settings.get('source_fingerprint')
+        if source is None:
+            # Exportado sin huella: vale mientras no sea más viejo que el .joblib
+            return Path(self.compiled_path).stat().st_mtime_ns >= Path(self.model_path).stat().st_mtime_ns
+        return source == file_fingerprint(self.model_path)
+    
+    def _model_file_changed(self, active: LoadedModel) -> bool:
+        """Revisa (a lo sumo cada MODEL_CHECK_INTERVAL s) si los archivos del modelo cambiaron"""
+        now = time.monotonic()
+        if now - self._last_model_check < MODEL_CHECK_INTERVAL:
+            return False
+        self._last_model_check = now
+        version = self._current_version()
+        return version != active.version and version != self._rejected_version
+    
+    @staticmethod
+    def cache_key(text: str) -> str:
+        """
+        Normaliza un texto para el caché
+        
+        Solo minúsculas y espacios colapsados: el vectorizador ya ignora ambas
+        diferencias, así que textos con la misma clave tienen la misma predicción.
+        """
+        return " ".join(text.lower().split())
+    
+    def _top_predictions(self, active: LoadedModel, texts: List[str],
+                         timer=NULL_TIMER) -> List[List[tuple]]:
+        """Top-k de cada texto, consultando el caché y puntuando solo los fallos en lote"""
+        with timer.stage('normalize'):
+            keys = [(active.version, self.cache_key(text)) for text in texts]
+        with timer.stage('cache'):
+            results = [self.cache.get(key) for key in keys]
+        missing = [i for i, cached in enumerate(results) if cached is MISSING]
+        if missing:
+            computed = predict_batch(active.model, [texts[i] for i in missing], top_k=3, timer=timer)
+            for i, top_predictions in zip(missing, computed):
+                results[i] = top_predictions
+                self.cache.put(keys[i], top_predictions)
+        return results
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Contadores del caché de predicciones y del de pictogramas (None si aún no se construyó)"""
+        mapper = peek_shared_mapper()
+        return {
+            'predictions': self.cache.stats(),
+            'pictos': mapper.cache_stats() if mapper is not None else None,
+            'model_version': self.model_version
+        }
+    
+    @staticmethod
+    def _pictos_index_size() -> int:
+        """Términos del mapeador compartido; 0 mientras no se construya (no lo construye)"""
+        mapper = peek_shared_mapper()
+        return len(mapper.mapping) if mapper is not None else 0
+    
+    def _start_timer(self, debug: bool):
+        """StageTimer si se pidió debug o la medición está activa; si no, el timer nulo"""
+        return StageTimer() if debug or self.stage_timing else NULL_TIMER
+    
+    def _finish_timer(self, timer, result: Dict[str, Any], debug: bool) -> Dict[str, Any]:
+        """Vuelca las duraciones a los histogramas y, con debug, al resultado"""
+        if not timer.enabled:
+            return result
+        timings = timer.as_ms()
+        for stage, ms in timings.items():
+            histogram = self.stage_histograms.get(stage)
+            if histogram is not None:
+                histogram.observe(ms / 1000)
+        if timings['total'] >= SLOW_REQUEST_MS:
+            breakdown = ", ".join(f"{stage}={ms:.2f}ms" for stage, ms in timings.items())
+            print(f"Mensaje lento ({result.get('decided_intent')}): {breakdown}")
+        if debug:
+            result['timings_ms'] = timings
+        return result
+    
+    def register_metrics(self, registry: MetricsRegistry, prefix: str = 'chat_'):
+        """Registra en `registry` las métricas del predictor (se leen al hacer scrape)"""
+        registry.counter(f'{prefix}predictions_total', 'Predicciones por intención decidida',
+                         ('intent',), counter=self.intent_counter)
+        registry.gauge(f'{prefix}fallback_ratio', 'Fracción de predicciones que terminaron en FALLBACK',
+                       self._fallback_ratio)
+        
+        def caches():
+            # El scrape no construye el mapeador: sin él solo se informa el caché de predicciones
+            stats = {'predictions': self.cache.stats()}
+            mapper = peek_shared_mapper()
+            if mapper is not None:
+                stats['pictos'] = mapper.cache_stats()
+            return stats
+        
+        def per_cache(field):
+            return lambda: {name: stats[field] for name, stats in caches().items()}
+        
+        registry.counter_function(f'{prefix}cache_hits_total', 'Aciertos de caché',
+                                  per_cache('hits'), ('cache',))
+        registry.counter_function(f'{prefix}cache_misses_total', 'Fallos de caché',
+                                  per_cache('misses'), ('cache',))
+        registry.gauge(f'{prefix}cache_hit_ratio', 'Tasa de aciertos de caché desde el arranque',
+                       per_cache('hit_rate'), ('cache',))
+        registry.gauge(f'{prefix}cache_entries', 'Entradas en caché', per_cache('size'), ('cache',))
+        registry.gauge(f'{prefix}model_loaded', 'Modelo cargado (1) o en frío (0)',
+                       lambda: self.model is not None)
+        registry.gauge(f'{prefix}model_load_seconds', 'Duración de la última carga del modelo',
+                       lambda: self.load_seconds)
+        registry.gauge(f'{prefix}model_info', 'Backend y versión del modelo cargado',
+                       lambda: {(self.backend, self.model_version or ''): 1}, ('backend', 'version'))
+        registry.counter(f'{prefix}model_reloads_total', 'Recargas del modelo por resultado',
+                         ('result',), counter=self.reload_counter)
+        registry.gauge(f'{prefix}pictos_index_size', 'Términos en el índice de pictogramas',
+                       self._pictos_index_size)
+        registry.histograms(f'{prefix}stage_duration_seconds',
+                            'Duración por etapa (solo peticiones medidas, ver CHAT_STAGE_TIMING)',
+                            'stage', lambda: self.stage_histograms)
+    
+    def _fallback_ratio(self) -> Optional[float]:
+        counts = self.intent_counter.values()
+        total = sum(counts.values())
+        return counts.get(('FALLBACK',), 0) / total if total else None
+    
+    def stage_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Resumen (conteo, media, p50/p95/p99 en ms) de cada etapa medida"""
+        return {stage: histogram.summary() for stage, histogram in self.stage_histograms.items()}
+    
+    def predict_intent(self, text: str, include_pictos: bool = True, debug: bool = False) -> Dict[str, Any]:
         """
         Predice la intención de un texto y opcionalmente incluye pictogramas
         
         Args:
             text: Texto a analizar
             include_pictos: Si incluir pictogramas en la respuesta
+            debug: Si agregar al resultado la duración de cada etapa ('timings_ms')
             
         Returns:
             Dict con predicción, probabilidades y pictogramas
         """
-        self.load_model()
+        timer = self._start_timer(debug)
+        result = self._predict_one(text, include_pictos, timer)
+        return self._finish_timer(timer, result, debug)
+    
+    def _predict_one(self, text: str, include_pictos: bool, timer) -> Dict[str, Any]:
+        """Predicción de un texto midiendo cada etapa con `timer`"""
+        active = self.load_model()
+        
+        # Obtener predicciones (las frases repetidas salen del caché)
+        top_predictions = self._top_predictions(active, [text], timer)[0]
+        return self._build_result(text, top_predictions, include_pictos, timer)
+    
+    def predict_intents(self, texts: List[str], include_pictos: bool = True) -> List[Dict[str, Any]]:
+        """
+        Predice la intención de varios textos vectorizándolos en un solo paso
         
-        # Obtener predicciones
-        top_predictions = predict(self.model, text, top_k=3)
+        Args:
+            texts: Lista de textos a analizar
+            include_pictos: Si incluir pictogramas en cada resultado
+            
+        Returns:
+            Lista de resultados en el mismo orden que los textos
+        """
+        active = self.load_model()
+        
+        batch_predictions = self._top_predictions(active, texts)
+        return [
+            self._build_result(text, top_predictions, include_pictos)
+            for text, top_predictions in zip(texts, batch_predictions)
+        ]
+    
+    def _build_result(self, text: str, top_predictions: List[tuple], include_pictos: bool,
+                      timer=NULL_TIMER, count: bool = True) -> Dict[str, Any]:
+        """Construye el resultado de un texto a partir de su top-k (count=False no lo suma a las métricas)"""
         best_intent, best_prob = top_predictions[0]
         
         # Determinar si es fallback
         status = 'OK' if best_prob >= self.fallback_threshold else 'FALLBACK'
         decided_intent = best_intent if status == 'OK' else 'FALLBACK'
+        if count:
+            self.intent_counter.inc((decided_intent,))
         
         # Construir respuesta
         result = {
@@ -70,7 +589,12 @@ class ChatPredictor:
         
         # Agregar pictogramas si se solicita
         if include_pictos:
-            result['pictos'] = self.picto_mapper.map_text(text)
+            with timer.stage('pictos'):
+                pictos, corrections = self.picto_mapper.map_text_detailed(text)
+            result['pictos'] = pictos
+            # Palabras mal escritas que se corrigieron para encontrar pictogramas
+            if corrections:
+                result['corrections'] = corrections
         
         return result
     
@@ -100,19 +624,49 @@ class ChatPredictor:
         
         return responses.get(intent, "No estoy seguro de cómo ayudarte.")
     
-    def process_message(self, text: str) -> Dict[str, Any]:
+    def process_message(self, text: str, debug: bool = False) -> Dict[str, Any]:
         """
         Procesa un mensaje completo y retorna respuesta del asistente
         
         Args:
             text: Mensaje del usuario
+            debug: Si agregar al resultado la duración de cada etapa ('timings_ms')
             
         Returns:
             Dict con predicción, respuesta y pictogramas
         """
+        timer = self._start_timer(debug)
+        
         # Obtener predicción
-        prediction_result = self.predict_intent(text, include_pictos=True)
+        prediction_result = self._predict_one(text, True, timer)
+        with timer.stage('response'):
+            result = self._with_response(prediction_result)
+        return self._finish_timer(timer, result, debug)
+    
+    def process_messages(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Procesa un lote de mensajes con una sola pasada del modelo
         
+        Args:
+            texts: Mensajes del usuario (por ejemplo, encolados sin conexión)
+            
+        Returns:
+            Lista de resultados por mensaje, en el mismo orden
+        """
+        prediction_results = self.predict_intents(texts, include_pictos=True)
+        return [self._with_response(result) for result in prediction_results]
+    
+    def suggest_pictos(self, text: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        Autocompletado de pictogramas para `text`
+        
+        La primera llamada construye el mapeador y su índice de prefijos, por eso
+        los endpoints la corren en el pool de predicción y no en el loop.
+        """
+        return self.picto_mapper.suggest(text, limit=limit)
+    
+    def _with_response(self, prediction_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Agrega la respuesta del asistente a un resultado de predicción"""
         # Generar respuesta
         response = self.get_response_for_intent(prediction_result['decided_intent'])
         
@@ -124,7 +678,8 @@ class ChatPredictor:
         }
     
     def _create_basic_model(self):
-        """Crea un modelo básico para casos donde no existe el modelo entrenado"""
+        """Crea, guarda y retorna un modelo básico para casos donde no existe el modelo entrenado"""
+        import joblib
         from sklearn.feature_extraction.text import TfidfVectorizer
         from sklearn.naive_bayes import MultinomialNB
         from sklearn.pipeline import Pipeline
@@ -159,5 +714,5 @@ class ChatPredictor:
         Path(self.model_path).parent.mkdir(parents=True, exist_ok=True)
         joblib.dump(pipeline, self.model_path)
         
-        self.model = pipeline
         print("Modelo básico creado y guardado exitosamente")
+        return CompiledNB.from_pipeline(pipeline) if self.backend == 'compiled' else pipeline
@@ -3,14 +3,14 @@ Predictor simple basado en reglas para reducir el tamaño del deploy
 """
 import json
 from typing import List, Dict, Any
-from utils.pictos_mapping import PictoMapper
+from utils.pictos_mapping import PictosMapper, get_shared_mapper
+from utils.token_automaton import TokenAutomaton
 
 
 class SimpleChatPredictor:
     """Predictor simple basado en reglas para Vercel"""
     
     def __init__(self):
-        self.picto_mapper = PictoMapper()
         self.fallback_threshold = 0.45
         
         # Diccionario de reglas simples
@@ -71,6 +71,34 @@ class SimpleChatPredictor:
             "PEDIR_OBJETO": "Entiendo que necesitas algo. ¿Qué es lo que buscas?",
             "FALLBACK": "No estoy seguro de entenderte completamente. ¿Puedes explicarme mejor?"
         }
+        
+        self.compile_rules()
+    
+    @property
+    def picto_mapper(self) -> PictosMapper:
+        """Mapeador compartido vigente (reload_shared_mapper lo reemplaza en caliente)"""
+        return get_shared_mapper()
+    
+    def compile_rules(self):
+        """
+        Compila intent_rules en un autómata multipatrón sobre tokens
+        
+        Las keywords se normalizan igual que el texto (minúsculas, sin acentos
+        ni signos), así que "sí" y "si" son la misma regla. La búsqueda trabaja
+        con palabras completas: "no" ya no coincide dentro de "nombre".
+        Debe volver a llamarse si se modifica intent_rules.
+        """
+        self._automaton = TokenAutomaton()
+        for intent, keywords in self.intent_rules.items():
+            normalized_keywords = {PictosMapper.normalize_phrase(kw) for kw in keywords}
+            normalized_keywords.discard("")
+            for keyword in normalized_keywords:
+                self._automaton.add(keyword.split(" "), (intent, keyword))
+        self._automaton.build()
+    
+    def _tokenize(self, text: str) -> List[str]:
+        """Tokens normalizados del texto, con la misma normalización que las reglas"""
+        return [t for t in (PictosMapper.normalize(tok) for tok in text.split()) if t]
     
     def predict_intent(self, text: str, include_pictos: bool = True) -> Dict[str, Any]:
         """
@@ -83,25 +111,22 @@ class SimpleChatPredictor:
         Returns:
             Dict con predicción y probabilidades
         """
-        text_lower = text.lower().strip()
+        # Buscar coincidencias en las reglas: una sola pasada del autómata
+        # emite cada par (intención, keyword) presente en el texto
+        hits: Dict[str, set] = {}
+        for _, _, (intent, keyword) in self._automaton.iter_matches(self._tokenize(text)):
+            hits.setdefault(intent, set()).add(keyword)
         
-        # Buscar coincidencias en las reglas
         best_intent = "FALLBACK"
         best_score = 0.0
         all_scores = []
         
-        for intent, keywords in self.intent_rules.items():
-            score = 0.0
-            matches = 0
-            
-            for keyword in keywords:
-                if keyword in text_lower:
-                    matches += 1
-                    score += 1.0
+        for intent in self.intent_rules:
+            matches = len(hits.get(intent, ()))
             
             if matches > 0:
                 # Normalizar score por número de keywords
-                score = score / len(keywords)
+                score = matches / len(self.intent_rules[intent])
                 all_scores.append((intent, score))
                 
                 if score > best_score:
@@ -128,7 +153,7 @@ class SimpleChatPredictor:
         # Obtener pictogramas si se solicitan
         pictos = []
         if include_pictos:
-            pictos = self.picto_mapper.get_pictos_for_text(text)
+            pictos = self.picto_mapper.map_text(text)
         
         return {
             'input': text,
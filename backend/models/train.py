@@ -1,8 +1,14 @@
-import argparse, json, random
+import argparse, itertools, json, os, random, sys, time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
-from dataset_utils import load_dataset, dataset_stats
-from sklearn.feature_extraction.text import TfidfVectorizer
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.dataset_utils import COMPACT_SCHEMA_FILE, load_dataset, dataset_stats, iter_split, split_paths
+from utils.feature_cache import file_fingerprint, load_or_build_features
+from models.compiled_nb import export_model
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import classification_report, accuracy_score, f1_score, confusion_matrix
@@ -10,33 +16,310 @@ import joblib
 import numpy as np
 
 
-def build_pipeline(max_features: int = 30000) -> Pipeline:
+# Espacio de búsqueda del modo --sweep (grilla completa o muestreo aleatorio)
+SWEEP_GRID: Dict[str, List[Any]] = {
+    'max_features': [5000, 30000, None],
+    'alpha': [0.1, 0.5, 1.0],
+    'ngram_range': [(1, 1), (1, 2), (1, 3)],
+    'min_df': [1, 2],
+    'max_df': [0.9, 1.0],
+    'sublinear_tf': [False, True],
+}
+# Textos de validación puntuados de a uno para medir la latencia por predicción
+LATENCY_SAMPLE = 200
+# Modo --stream: filas leídas por bloque y columnas del espacio hasheado
+STREAM_CHUNK_SIZE = 10000
+HASH_FEATURES = 2 ** 18
+
+
+def build_pipeline(max_features: Optional[int] = 30000, alpha: float = 0.5,
+                   ngram_range: Tuple[int, int] = (1, 2), min_df: int = 2,
+                   max_df: float = 0.95, sublinear_tf: bool = False) -> Pipeline:
     return Pipeline([
         ('tfidf', TfidfVectorizer(
             lowercase=True,
             strip_accents='unicode',
-            ngram_range=(1,2),
+            ngram_range=tuple(ngram_range),
             max_features=max_features,
-            min_df=2,
-            max_df=0.95
+            min_df=min_df,
+            max_df=max_df,
+            sublinear_tf=sublinear_tf
         )),
-        ('clf', MultinomialNB(alpha=0.5))
+        ('clf', MultinomialNB(alpha=alpha))
     ])
 
 
+def sweep_configs(mode: str, trials: int, seed: int) -> List[Dict[str, Any]]:
+    """Configuraciones a evaluar: toda la grilla o `trials` combinaciones al azar"""
+    names = list(SWEEP_GRID)
+    configs = [dict(zip(names, values)) for values in itertools.product(*SWEEP_GRID.values())]
+    if mode == 'random' and trials < len(configs):
+        configs = random.Random(seed).sample(configs, trials)
+    return configs
+
+
+def tokenize_texts(texts: List[str]) -> List[List[str]]:
+    """
+    Tokens (unigramas) de cada texto con el mismo preprocesado que build_pipeline
+
+    Se calcula una sola vez por split y se comparte con los procesos del
+    barrido: cada configuración solo arma sus n-gramas a partir de los tokens.
+    """
+    analyzer = TfidfVectorizer(lowercase=True, strip_accents='unicode').build_analyzer()
+    return [analyzer(text) for text in texts]
+
+
+def ngram_analyzer(ngram_range: Tuple[int, int]):
+    """Analizador sobre textos ya tokenizados, equivalente al de TfidfVectorizer con ese ngram_range"""
+    min_n, max_n = ngram_range
+
+    def analyze(tokens: List[str]) -> List[str]:
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                ngrams.append(" ".join(tokens[i:i + n]))
+        return ngrams
+    return analyze
+
+
+# Splits tokenizados de cada proceso del barrido (se envían una vez por proceso)
+_sweep_data: Dict[str, Any] = {}
+
+
+def _init_sweep_worker(train_tokens, y_train, val_tokens, y_val):
+    _sweep_data.update(train_tokens=train_tokens, y_train=y_train,
+                       val_tokens=val_tokens, y_val=y_val)
+
+
+def evaluate_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Entrena una configuración sobre los tokens en caché y la mide en validación"""
+    start = time.perf_counter()
+    vectorizer = TfidfVectorizer(
+        analyzer=ngram_analyzer(config['ngram_range']),
+        max_features=config['max_features'],
+        min_df=config['min_df'],
+        max_df=config['max_df'],
+        sublinear_tf=config['sublinear_tf']
+    )
+    clf = MultinomialNB(alpha=config['alpha'])
+    clf.fit(vectorizer.fit_transform(_sweep_data['train_tokens']), _sweep_data['y_train'])
+    fit_seconds = time.perf_counter() - start
+
+    val_tokens = _sweep_data['val_tokens']
+    pred = clf.predict(vectorizer.transform(val_tokens))
+    # Latencia como en el servicio: un mensaje por llamada (n-gramas + tf-idf + NB)
+    # (mediana, menos sensible a otros procesos del barrido compitiendo por la CPU)
+    timings = []
+    for tokens in val_tokens[:LATENCY_SAMPLE]:
+        start = time.perf_counter()
+        clf.predict_proba(vectorizer.transform([tokens]))
+        timings.append(time.perf_counter() - start)
+    latency_us = float(np.median(timings)) * 1e6 if timings else 0.0
+
+    return {
+        'params': config,
+        'val_f1_macro': f1_score(_sweep_data['y_val'], pred, average='macro'),
+        'val_accuracy': accuracy_score(_sweep_data['y_val'], pred),
+        'latency_us': latency_us,
+        'n_features': len(vectorizer.vocabulary_),
+        'fit_seconds': fit_seconds,
+    }
+
+
+def run_sweep(X_train: List[str], y_train: List[str], X_val: List[str], y_val: List[str],
+              configs: List[Dict[str, Any]], jobs: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Evalúa las configuraciones en un pool de procesos
+
+    Returns:
+        Resultados ordenados por F1 macro de validación (descendente) y, a igual
+        F1 (4 decimales), por latencia por predicción (ascendente)
+    """
+    train_tokens = tokenize_texts(X_train)
+    val_tokens = tokenize_texts(X_val)
+    jobs = jobs or os.cpu_count() or 1
+    print(f'Barrido: {len(configs)} configuraciones en {jobs} procesos')
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_sweep_worker,
+                             initargs=(train_tokens, y_train, val_tokens, y_val)) as pool:
+        results = list(pool.map(evaluate_config, configs))
+    results.sort(key=lambda r: (-round(r['val_f1_macro'], 4), r['latency_us']))
+    return results
+
+
+def hashing_vectorizer(ngram_range: Tuple[int, int] = (1, 2),
+                       n_features: int = HASH_FEATURES) -> HashingVectorizer:
+    """Vectorizador sin estado con el preprocesado de build_pipeline; devuelve conteos crudos"""
+    return HashingVectorizer(
+        lowercase=True,
+        strip_accents='unicode',
+        ngram_range=tuple(ngram_range),
+        n_features=n_features,
+        alternate_sign=False,
+        norm=None
+    )
+
+
+def _take(chunks, limit: Optional[int]):
+    """Bloques (textos, intents) hasta completar `limit` filas"""
+    remaining = limit
+    for texts, intents in chunks:
+        if remaining is not None:
+            if remaining <= 0:
+                return
+            texts, intents = texts[:remaining], intents[:remaining]
+            remaining -= len(texts)
+        yield texts, intents
+
+
+def train_streaming(train_path: str, chunk_size: int = STREAM_CHUNK_SIZE, alpha: float = 0.5,
+                    ngram_range: Tuple[int, int] = (1, 2), n_features: int = HASH_FEATURES,
+                    sublinear_tf: bool = False,
+                    limit: Optional[int] = None) -> Tuple[Pipeline, Dict[str, int]]:
+    """
+    Entrena hashing + tf-idf + MultinomialNB leyendo el CSV por bloques
+
+    Primera pasada: frecuencia de documento de cada columna hasheada y las
+    clases; con ella se calcula el idf igual que TfidfTransformer (smooth_idf).
+    Segunda pasada: cada bloque se vectoriza, se repondera con ese idf
+    (normalización L2) y se acumula en el clasificador con partial_fit, que
+    suma conteos: el resultado no depende del tamaño ni del orden de los
+    bloques. La memoria depende de chunk_size y n_features, no del archivo.
+
+    Returns:
+        (Pipeline hashing -> tfidf -> clf, conteo de intents del train)
+    """
+    hasher = hashing_vectorizer(ngram_range, n_features)
+    df = np.zeros(n_features, dtype=np.int64)
+    n_docs = 0
+    counts: Dict[str, int] = {}
+    for texts, intents in _take(iter_split(train_path, chunk_size), limit):
+        # HashingVectorizer suma duplicados: cada columna aparece una vez por fila
+        df += np.bincount(hasher.transform(texts).indices, minlength=n_features)
+        n_docs += len(texts)
+        for intent in intents:
+            counts[intent] = counts.get(intent, 0) + 1
+    if not n_docs:
+        raise ValueError(f"Split de entrenamiento vacío: {train_path}")
+
+    tfidf = TfidfTransformer(sublinear_tf=sublinear_tf)
+    tfidf.idf_ = np.log((1 + n_docs) / (1 + df)) + 1
+    clf = MultinomialNB(alpha=alpha)
+    classes = np.array(sorted(counts))
+    for i, (texts, intents) in enumerate(_take(iter_split(train_path, chunk_size), limit), 1):
+        clf.partial_fit(tfidf.transform(hasher.transform(texts)), intents, classes=classes)
+        if i % 10 == 0:
+            print(f'  Entrenados {min(i * chunk_size, n_docs)}/{n_docs} ejemplos...')
+    return Pipeline([('hash', hasher), ('tfidf', tfidf), ('clf', clf)]), counts
+
+
+def metrics_from_pairs(pairs: Dict[Tuple[str, str], int]) -> Dict[str, Any]:
+    """
+    Métricas con el mismo formato que evaluate() a partir de conteos (real, predicho)
+
+    Equivalente a accuracy_score, f1_score(average='macro'), classification_report
+    y confusion_matrix, pero acumulable por bloques sin guardar las predicciones.
+    """
+    true_labels = sorted({t for t, _ in pairs})
+    labels = sorted({label for pair in pairs for label in pair})
+    total = sum(pairs.values())
+    report: Dict[str, Any] = {}
+    for label in labels:
+        tp = pairs.get((label, label), 0)
+        predicted = sum(n for (_, p), n in pairs.items() if p == label)
+        support = sum(n for (t, _), n in pairs.items() if t == label)
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / support if support else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        report[label] = {'precision': precision, 'recall': recall, 'f1-score': f1, 'support': float(support)}
+    accuracy = sum(n for (t, p), n in pairs.items() if t == p) / total if total else 0.0
+    per_class = [report[label] for label in labels]
+    report['accuracy'] = accuracy
+    report['macro avg'] = {
+        field: float(np.mean([r[field] for r in per_class])) for field in ('precision', 'recall', 'f1-score')
+    }
+    report['macro avg']['support'] = float(total)
+    report['weighted avg'] = {
+        field: sum(r[field] * r['support'] for r in per_class) / total if total else 0.0
+        for field in ('precision', 'recall', 'f1-score')
+    }
+    report['weighted avg']['support'] = float(total)
+    return {
+        'accuracy': accuracy,
+        'f1_macro': report['macro avg']['f1-score'],
+        'report': report,
+        'labels': true_labels,
+        'confusion_matrix': [[pairs.get((t, p), 0) for p in true_labels] for t in true_labels]
+    }
+
+
+def evaluate_streaming(pipe: Pipeline, path: str, chunk_size: int = STREAM_CHUNK_SIZE,
+                       limit: Optional[int] = None) -> Dict[str, Any]:
+    """Métricas de un split leído por bloques (solo se acumulan conteos por par de etiquetas)"""
+    pairs: Dict[Tuple[str, str], int] = {}
+    for texts, intents in _take(iter_split(path, chunk_size), limit):
+        for pair in zip(intents, pipe.predict(texts)):
+            pairs[pair] = pairs.get(pair, 0) + 1
+    return metrics_from_pairs({(t, str(p)): n for (t, p), n in pairs.items()})
+
+
+def main_streaming(args):
+    """Modo --stream: entrenamiento y evaluación fuera de memoria"""
+    train_file, val_file, test_file = split_paths(args.data_dir)
+    ngram_range = (1, args.max_ngram)
+    pipe, counts = train_streaming(str(train_file), args.chunk_size, args.alpha, ngram_range,
+                                   args.hash_features, limit=args.limit_train)
+    metrics = {
+        'train': evaluate_streaming(pipe, str(train_file), args.chunk_size, args.limit_train),
+        'val': evaluate_streaming(pipe, str(val_file), args.chunk_size),
+        'test': evaluate_streaming(pipe, str(test_file), args.chunk_size),
+        'train_intent_distribution': counts,
+        'params': {
+            'stream': True,
+            'hash_features': args.hash_features,
+            'ngram_range': list(ngram_range),
+            'alpha': args.alpha,
+            'chunk_size': args.chunk_size,
+            'limit_train': args.limit_train,
+            'seed': args.seed
+        }
+    }
+    return pipe, metrics
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--data-dir', type=str, default='data/processed')
     parser.add_argument('--model-out', type=str, default='models/baseline_nb.joblib')
     parser.add_argument('--max-features', type=int, default=30000)
+    parser.add_argument('--alpha', type=float, default=0.5)
     parser.add_argument('--limit-train', type=int, default=None, help='Número total de ejemplos (balanceado) para entrenamiento rápido')
     parser.add_argument('--seed', type=int, default=42)
     parser.add_argument('--balance', action='store_true', help='Forzar muestreo balanceado por intent cuando se limite el train')
+    parser.add_argument('--sweep', choices=['grid', 'random'], default=None,
+                        help='Barrido de hiperparámetros (SWEEP_GRID); guarda la mejor configuración')
+    parser.add_argument('--trials', type=int, default=24, help='Configuraciones a probar con --sweep random')
+    parser.add_argument('--jobs', type=int, default=None, help='Procesos del barrido (por defecto, todos los núcleos)')
+    parser.add_argument('--metrics-out', type=str, default='metrics_baseline.json')
+    parser.add_argument('--feature-cache-dir', type=str, default='data/feature_cache',
+                        help='Caché de matrices TF-IDF por datos y parámetros del vectorizador')
+    parser.add_argument('--no-feature-cache', action='store_true', help='Vectorizar sin leer ni escribir el caché')
+    parser.add_argument('--stream', action='store_true',
+                        help='Entrenar por bloques (HashingVectorizer + partial_fit) sin cargar los CSV en memoria')
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE, help='Filas por bloque con --stream')
+    parser.add_argument('--hash-features', type=int, default=HASH_FEATURES, help='Columnas del hashing con --stream')
+    parser.add_argument('--max-ngram', type=int, default=2, help='N-grama máximo con --stream')
     args = parser.parse_args()
+    if args.stream and (args.sweep or args.balance):
+        parser.error('--stream no admite --sweep ni --balance')
 
     random.seed(args.seed)
     np.random.seed(args.seed)
 
+    if args.stream:
+        pipe, metrics = main_streaming(args)
+        save_model(pipe, metrics, args)
+        return
+
     (X_train, y_train), (X_val, y_val), (X_test, y_test) = load_dataset(args.data_dir)
 
     # Barajar entrenamiento completo primero
@@ -68,11 +351,48 @@ def main():
             X_train = X_train[:args.limit_train]
             y_train = y_train[:args.limit_train]
 
-    pipe = build_pipeline(args.max_features)
-    pipe.fit(X_train, y_train)
+    sweep_results = None
+    if args.sweep:
+        configs = sweep_configs(args.sweep, args.trials, args.seed)
+        sweep_results = run_sweep(X_train, y_train, X_val, y_val, configs, args.jobs)
+        print('Mejores configuraciones (F1 macro val, latencia por predicción):')
+        for result in sweep_results[:10]:
+            print(f"  {result['val_f1_macro']:.4f}  {result['latency_us']:7.1f} µs  {result['params']}")
+        params = dict(sweep_results[0]['params'])
+    else:
+        params = {'max_features': args.max_features, 'alpha': args.alpha}
+
+    # La configuración elegida se reentrena sobre el texto crudo: el artefacto
+    # es el mismo Pipeline que carga el servicio (y que exporta compiled_nb).
+    # Cada split se vectoriza una sola vez (o se lee del caché de features) y
+    # el entrenamiento y la evaluación trabajan sobre esas matrices
+    pipe = build_pipeline(**params)
+    vectorizer, clf = pipe.named_steps['tfidf'], pipe.named_steps['clf']
+    splits = {'train': (X_train, y_train), 'val': (X_val, y_val), 'test': (X_test, y_test)}
+    feature_cache = None
+    if args.no_feature_cache:
+        matrices = {'train': vectorizer.fit_transform(X_train)}
+        matrices.update({name: vectorizer.transform(X) for name, (X, _) in splits.items() if name != 'train'})
+    else:
+        # Los splits salen de los CSV más el barajado y el recorte: eso identifica los datos
+        data_files = [str(path) for path in split_paths(args.data_dir)]
+        schema_file = Path(args.data_dir) / COMPACT_SCHEMA_FILE
+        if schema_file.exists():
+            data_files.append(str(schema_file))
+        sources = {
+            'files': [file_fingerprint(path) for path in data_files],
+            'seed': args.seed,
+            'limit_train': args.limit_train,
+            'balance': args.balance
+        }
+        features = load_or_build_features(vectorizer, splits, args.feature_cache_dir, sources=sources)
+        vectorizer, matrices = features.vectorizer, features.matrices
+        feature_cache = {'key': features.key, 'hit': features.cached}
+    clf.fit(matrices['train'], y_train)
+    pipe = Pipeline([('tfidf', vectorizer), ('clf', clf)])
 
-    def evaluate(split_name: str, X, y):
-        pred = pipe.predict(X)
+    def evaluate(split_name: str, y):
+        pred = clf.predict(matrices[split_name])
         acc = accuracy_score(y, pred)
         f1m = f1_score(y, pred, average='macro')
         rpt = classification_report(y, pred, output_dict=True, zero_division=0)
@@ -87,22 +407,40 @@ def main():
         }
 
     metrics = {
-        'train': evaluate('train', X_train, y_train),
-        'val': evaluate('val', X_val, y_val),
-        'test': evaluate('test', X_test, y_test),
+        'train': evaluate('train', y_train),
+        'val': evaluate('val', y_val),
+        'test': evaluate('test', y_test),
         'train_intent_distribution': dataset_stats(y_train),
         'params': {
-            'max_features': args.max_features,
+            **params,
+            'alpha': pipe.named_steps['clf'].alpha,
             'limit_train': args.limit_train,
             'balanced': args.balance,
             'seed': args.seed
-        }
+        },
+        'feature_cache': feature_cache
     }
+    if sweep_results is not None:
+        metrics['sweep'] = sweep_results
+    save_model(pipe, metrics, args)
+
 
-    Path('models').mkdir(exist_ok=True)
+def save_model(pipe: Pipeline, metrics: Dict[str, Any], args):
+    """Guarda el modelo, su exportación para el backend 'compiled' y sus métricas"""
+    Path(args.model_out).parent.mkdir(parents=True, exist_ok=True)
     joblib.dump(pipe, args.model_out)
 
-    with open('metrics_baseline.json', 'w', encoding='utf-8') as f:
+    # El backend 'compiled' lee el .npz: exportarlo siempre junto al .joblib
+    compiled_out = Path(args.model_out).with_suffix('.npz')
+    try:
+        export_model(args.model_out, str(compiled_out), pipeline=pipe)
+        print('Guardado modelo compilado en', compiled_out)
+    except ValueError as e:
+        # Un .npz anterior seguiría sirviendo el modelo viejo
+        compiled_out.unlink(missing_ok=True)
+        print(f'Modelo sin exportación compilada ({e}); servir con CHAT_PREDICTOR_BACKEND=sklearn')
+
+    with open(args.metrics_out, 'w', encoding='utf-8') as f:
         json.dump(metrics, f, ensure_ascii=False, indent=2)
 
     print('Guardado modelo en', args.model_out)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia y throughput del pipeline de /chat
+
+Mide, con un corpus realista muestreado de dialogos_test_kids.csv:
+  - ChatPredictor.process_message (backends 'sklearn' y 'compiled')
+  - SimpleChatPredictor.process_message
+  - PictosMapper.map_text
+  - La app FastAPI en proceso, vía httpx.AsyncClient + ASGITransport
+
+Para cada objetivo y nivel de concurrencia reporta p50/p95/p99 (ms),
+mensajes por segundo y memoria (RSS), y escribe un JSON con claves
+ordenadas para poder comparar resultados entre commits.
+
+Uso (desde backend/):
+    python scripts/benchmark_chat.py --samples 2000 --concurrency 1 4 16 --out bench_results.json
+    python scripts/benchmark_chat.py --out nuevo.json --compare bench_results.json
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from models.predict import ChatPredictor
+from models.simple_predictor import SimpleChatPredictor
+from utils.lru_cache import LRUCache
+from utils.pictos_mapping import get_shared_mapper
+
+DEFAULT_CORPUS = BACKEND_DIR.parent / "data" / "processed" / "dialogos_test_kids.csv"
+
+
+def load_corpus(path: str, samples: int, seed: int) -> List[str]:
+    """Muestra reproducible de textos del split de prueba"""
+    with open(path, encoding='utf-8') as f:
+        texts = [row['texto'] for row in csv.DictReader(f)]
+    rng = random.Random(seed)
+    if samples <= len(texts):
+        return rng.sample(texts, samples)
+    return [rng.choice(texts) for _ in range(samples)]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre valores ya ordenados"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def rss_mb() -> Dict[str, float]:
+    """RSS actual (si /proc está disponible) y pico del proceso, en MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta ru_maxrss en KB y macOS en bytes
+    peak_mb = peak / 1024 if sys.platform != 'darwin' else peak / (1024 * 1024)
+    current_mb = None
+    try:
+        with open('/proc/self/statm') as f:
+            current_mb = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        pass
+    return {'rss_mb': current_mb, 'peak_rss_mb': peak_mb}
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, Any]:
+    """Resumen de una corrida: percentiles en ms, throughput y memoria"""
+    ordered = sorted(latencies)
+    return {
+        'messages': len(latencies),
+        'errors': errors,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'mean_ms': (sum(ordered) / len(ordered) * 1000) if ordered else 0.0,
+        'messages_per_sec': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        **rss_mb(),
+    }
+
+
+def bench_callable(fn: Callable[[str], Any], corpus: List[str], concurrency: int) -> Dict[str, Any]:
+    """Ejecuta fn sobre el corpus con `concurrency` hilos y mide cada llamada"""
+    def timed(text: str) -> float:
+        start = time.perf_counter()
+        fn(text)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        latencies = [timed(text) for text in corpus]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, corpus))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def _bench_asgi_async(app, corpus: List[str], concurrency: int) -> Dict[str, Any]:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url="http://bench") as client:
+        async def send(text: str):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/chat", json={"text": text, "include_pictos": True})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(text) for text in corpus))
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, elapsed, errors)
+
+
+def bench_asgi(app, corpus: List[str], concurrency: int) -> Dict[str, Any]:
+    """POST /chat a la app en proceso con `concurrency` peticiones simultáneas"""
+    return asyncio.run(_bench_asgi_async(app, corpus, concurrency))
+
+
+def disable_caches(*predictors):
+    """Desactiva los cachés para medir el costo real de cada mensaje"""
+    for predictor in predictors:
+        if hasattr(predictor, 'cache'):
+            predictor.cache = LRUCache(maxsize=0)
+    get_shared_mapper()._pictos_cache = LRUCache(maxsize=0)
+
+
+def git_commit() -> str:
+    """Commit actual, para poder comparar resultados entre versiones"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconocido'
+
+
+def compare_reports(base: Dict[str, Any], current: Dict[str, Any]):
+    """Imprime la variación de p50/p95 y throughput respecto de un reporte anterior"""
+    print(f"\nComparación con {base.get('commit', '?')} -> {current.get('commit', '?')}")
+    for target, runs in current['results'].items():
+        for level, summary in runs.items():
+            previous = base.get('results', {}).get(target, {}).get(level)
+            if not previous:
+                continue
+            deltas = []
+            for key in ('p50_ms', 'p95_ms', 'messages_per_sec'):
+                if previous[key]:
+                    deltas.append(f"{key} {(summary[key] / previous[key] - 1) * 100:+.1f}%")
+            print(f"{target:>14} {level:<4} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de /chat")
+    parser.add_argument('--corpus', type=str, default=str(DEFAULT_CORPUS))
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--targets', nargs='+',
+                        default=['chat_sklearn', 'chat_compiled', 'simple', 'pictos', 'asgi'],
+                        help='Objetivos a medir')
+    parser.add_argument('--app', choices=['simple', 'full'], default='simple',
+                        help='App FastAPI para el objetivo asgi (simple_api o api)')
+    parser.add_argument('--with-cache', action='store_true',
+                        help='Mantener los cachés activos (por defecto se desactivan)')
+    parser.add_argument('--out', type=str, default='bench_results.json')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Reporte JSON anterior contra el cual comparar')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.samples, args.seed)
+    model_path = str(BACKEND_DIR / "models" / "baseline_nb.joblib")
+
+    predictors: Dict[str, Any] = {}
+    if 'chat_sklearn' in args.targets:
+        predictors['chat_sklearn'] = ChatPredictor(model_path=model_path, backend='sklearn')
+    if 'chat_compiled' in args.targets:
+        predictors['chat_compiled'] = ChatPredictor(model_path=model_path, backend='compiled')
+    if 'simple' in args.targets:
+        predictors['simple'] = SimpleChatPredictor()
+
+    app = None
+    if 'asgi' in args.targets:
+        os.environ.setdefault('CHAT_QUEUE_DEPTH', str(max(args.concurrency) * 2))
+        if args.app == 'simple':
+            import simple_api as app_module
+        else:
+            import api as app_module
+        app = app_module.app
+        # ASGITransport no ejecuta el lifespan: calentar el predictor a mano
+        app_module.predictor.warmup()
+        predictors['asgi'] = app_module.predictor
+
+    for predictor in predictors.values():
+        if hasattr(predictor, 'load_model'):
+            predictor.load_model()
+    if not args.with_cache:
+        disable_caches(*predictors.values())
+
+    mapper = get_shared_mapper()
+    runners: Dict[str, Callable[[int], Dict[str, Any]]] = {}
+    for name in ('chat_sklearn', 'chat_compiled', 'simple'):
+        if name in predictors:
+            runners[name] = (lambda p: lambda c: bench_callable(p.process_message, corpus, c))(predictors[name])
+    if 'pictos' in args.targets:
+        runners['pictos'] = lambda c: bench_callable(mapper.map_text, corpus, c)
+    if app is not None:
+        runners['asgi'] = lambda c: bench_asgi(app, corpus, c)
+
+    results: Dict[str, Any] = {}
+    for name, run in runners.items():
+        results[name] = {}
+        for concurrency in args.concurrency:
+            summary = run(concurrency)
+            results[name][f"c{concurrency}"] = summary
+            print(f"{name:>14} c={concurrency:<3} p50={summary['p50_ms']:.3f}ms "
+                  f"p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms "
+                  f"{summary['messages_per_sec']:.0f} msg/s errores={summary['errors']}")
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {
+            'corpus': Path(args.corpus).name,
+            'samples': args.samples,
+            'seed': args.seed,
+            'concurrency': args.concurrency,
+            'app': args.app,
+            'with_cache': args.with_cache,
+        },
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"Resultados guardados en {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
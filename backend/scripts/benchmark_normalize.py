@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark de PictosMapper.normalize sobre el vocabulario de dataset_words.json
+
+Compara la implementación anterior (lower + strip + unidecode + re.sub sin
+compilar) con la actual (tabla de traducción para el rango latino, unidecode
+solo para caracteres exóticos y memo acotado) en dos escenarios:
+  - construcción del índice: cada palabra del vocabulario una vez, memo vacío
+  - por petición: tokens de mensajes reales, con el memo ya caliente
+
+También verifica que ambas den exactamente el mismo resultado.
+
+Uso (desde backend/):
+    python scripts/benchmark_normalize.py --repeats 5
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from unidecode import unidecode
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.pictos_mapping import DATASET_WORDS_FILE, normalize_token
+
+DEFAULT_CORPUS = BACKEND_DIR.parent / "data" / "processed" / "dialogos_test_kids.csv"
+
+
+def legacy_normalize(token: str) -> str:
+    """Implementación anterior de PictosMapper.normalize"""
+    token = token.lower().strip()
+    token = unidecode(token)
+    token = re.sub(r"[^a-z0-9áéíóúñ]", "", token)
+    return token
+
+
+def load_vocabulary(path: str):
+    """Tokens de todas las palabras y frases del vocabulario ARASAAC"""
+    with open(path, encoding='utf-8') as f:
+        words = json.load(f)['words']
+    return [token for word in words for token in str(word).split()]
+
+
+def load_message_tokens(path: str, limit: int):
+    """Tokens de los primeros `limit` mensajes del corpus de prueba"""
+    tokens = []
+    with open(path, encoding='utf-8') as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if i >= limit:
+                break
+            tokens.extend(row['texto'].split())
+    return tokens
+
+
+def best_time(fn, tokens, repeats: int, before=None) -> float:
+    """Mejor tiempo total (s) de aplicar fn a todos los tokens"""
+    best = float('inf')
+    for _ in range(repeats):
+        if before:
+            before()
+        start = time.perf_counter()
+        for token in tokens:
+            fn(token)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(name: str, tokens, legacy_s: float, current_s: float):
+    per_token = lambda seconds: seconds / len(tokens) * 1e6
+    print(f"{name:<28} {len(tokens):>8} tokens  anterior {per_token(legacy_s):6.2f} µs/token  "
+          f"actual {per_token(current_s):6.2f} µs/token  x{legacy_s / current_s:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de normalize()")
+    parser.add_argument('--words', type=str, default=DATASET_WORDS_FILE)
+    parser.add_argument('--corpus', type=str, default=str(DEFAULT_CORPUS))
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    vocabulary = load_vocabulary(args.words)
+    mismatches = [t for t in vocabulary if normalize_token(t) != legacy_normalize(t)]
+    print(f"Vocabulario: {len(vocabulary)} tokens, diferencias con la versión anterior: {len(mismatches)}")
+    if mismatches:
+        print(f"  ejemplos: {mismatches[:10]}")
+
+    # Construcción del índice: memo vacío en cada corrida
+    legacy_s = best_time(legacy_normalize, vocabulary, args.repeats)
+    current_s = best_time(normalize_token, vocabulary, args.repeats, before=normalize_token.cache_clear)
+    report("construcción (memo frío)", vocabulary, legacy_s, current_s)
+    uncached_s = best_time(normalize_token.__wrapped__, vocabulary, args.repeats)
+    report("construcción (sin memo)", vocabulary, legacy_s, uncached_s)
+
+    if Path(args.corpus).exists():
+        tokens = load_message_tokens(args.corpus, args.messages)
+        legacy_s = best_time(legacy_normalize, tokens, args.repeats)
+        normalize_token.cache_clear()
+        current_s = best_time(normalize_token, tokens, args.repeats)
+        report("por petición (memo caliente)", tokens, legacy_s, current_s)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark del motor de reglas de SimpleChatPredictor
+
+Compara el costo por mensaje del autómata de keywords contra el escaneo
+original (`keyword in texto` por cada keyword de cada intención) a medida
+que crece el número de reglas. Con el autómata el costo debe mantenerse
+prácticamente plano.
+
+Uso (desde backend/):
+    python scripts/benchmark_rules.py --sizes 10 100 1000 5000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.simple_predictor import SimpleChatPredictor
+
+MESSAGES = [
+    "hola quiero jugar", "tengo hambre", "me duele la cabeza", "mi nombre es ana",
+    "quiero agua por favor", "estoy triste", "adiós mamá", "sí, claro",
+    "no quiero dormir", "necesito ayuda con mi tarea",
+]
+
+SYLLABLES = ["pa", "lo", "mi", "ta", "ru", "se", "ca", "no", "be", "di", "fo", "gu"]
+
+
+def synthetic_keyword(rng: random.Random) -> str:
+    """Keyword sintética de una o dos palabras"""
+    words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+             for _ in range(rng.randint(1, 2))]
+    return " ".join(words)
+
+
+def build_predictor(extra_keywords: int, seed: int) -> SimpleChatPredictor:
+    """Predictor con las reglas base más keywords sintéticas repartidas entre intenciones"""
+    rng = random.Random(seed)
+    predictor = SimpleChatPredictor()
+    intents = list(predictor.intent_rules)
+    for i in range(extra_keywords):
+        predictor.intent_rules[intents[i % len(intents)]].append(synthetic_keyword(rng))
+    predictor.compile_rules()
+    return predictor
+
+
+def naive_scan(intent_rules, text: str) -> int:
+    """Escaneo original por subcadenas (solo cuenta coincidencias)"""
+    text_lower = text.lower().strip()
+    matches = 0
+    for keywords in intent_rules.values():
+        for keyword in keywords:
+            if keyword in text_lower:
+                matches += 1
+    return matches
+
+
+def time_per_message(fn, repeats: int) -> float:
+    """Microsegundos promedio por mensaje"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for message in MESSAGES:
+            fn(message)
+    return (time.perf_counter() - start) / (repeats * len(MESSAGES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark del motor de reglas")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 100, 1000, 5000, 20000],
+                        help='Keywords sintéticas adicionales por corrida')
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'keywords':>10} {'autómata (µs/msg)':>18} {'escaneo (µs/msg)':>17}")
+    for size in args.sizes:
+        predictor = build_predictor(size, args.seed)
+        total_keywords = sum(len(kws) for kws in predictor.intent_rules.values())
+        automaton_us = time_per_message(
+            lambda text: predictor.predict_intent(text, include_pictos=False), args.repeats)
+        naive_us = time_per_message(
+            lambda text: naive_scan(predictor.intent_rules, text), args.repeats)
+        print(f"{total_keywords:>10} {automaton_us:>18.1f} {naive_us:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,14 +4,151 @@ Generador de diálogos sintéticos optimizado para niños
 Utiliza los datasets completos de ARASAAC (palabras y pictogramas)
 """
 
-import json
 import csv
+import hashlib
+import json
+import os
 import random
+import re
 import argparse
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, NamedTuple, Optional, Tuple
 import itertools
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.dataset_utils import COMPACT_SCHEMA_FILE
+from utils.json_stream import iter_json_array
+
+# Columnas de los CSV generados
+FIELDNAMES = ['id', 'texto', 'intent', 'original', 'template', 'is_kid_optimized']
+# Formato compacto: ids de intención y template (ver COMPACT_SCHEMA_FILE) y el texto
+COMPACT_FIELDNAMES = ['intent_id', 'template_id', 'texto']
+OUTPUT_FORMATS = ('full', 'compact')
+SPLIT_FILES = {
+    'train': "dialogos_train_kids.csv",
+    'val': "dialogos_val_kids.csv",
+    'test': "dialogos_test_kids.csv",
+}
+# Diálogos por shard: define las semillas, así que la salida no depende de los procesos
+SHARD_SIZE = 100000
+
+# Reglas de add_kid_variations, preparadas una vez
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+MULETILLA_PREFIXES = ("eh ", "mm ", "este ", "bueno ")
+REQUEST_WORDS = ("quiero", "dame", "necesito")
+SIMPLIFY_RULES = {"estoy muy": "muy", "me siento": "soy"}
+# Todas las reglas de simplificación en una sola pasada (no se solapan entre sí,
+# así que equivale a aplicarlas una tras otra)
+_SIMPLIFY_RE = re.compile("|".join(re.escape(old) for old in SIMPLIFY_RULES))
+
+
+class CompiledTemplate(NamedTuple):
+    """
+    Template parseado una vez: segmentos literales y huecos a llenar
+    
+    `slots` tiene una entrada por categoría del template, en el orden del
+    vocabulario (el mismo orden de sorteos que el reemplazo con str.replace):
+    la lista de opciones y las posiciones de `parts` donde va la palabra.
+    """
+    parts: Tuple[str, ...]
+    slots: Tuple[Tuple[List[str], Tuple[int, ...]], ...]
+    # Algún literal ya contiene "quiero", "dame" o "necesito"
+    has_request_word: bool
+
+
+def compile_template(template: str, vocabulary: Dict[str, List[str]]) -> CompiledTemplate:
+    """Parte el template en literales y huecos; un {nombre} fuera del vocabulario queda literal"""
+    parts: List[str] = []
+    positions: Dict[str, List[int]] = {}
+    last = 0
+    for match in _PLACEHOLDER_RE.finditer(template):
+        name = match.group(1)
+        if name not in vocabulary:
+            continue
+        if match.start() > last:
+            parts.append(template[last:match.start()])
+        positions.setdefault(name, []).append(len(parts))
+        parts.append(match.group(0))
+        last = match.end()
+    if last < len(template) or not parts:
+        parts.append(template[last:])
+    # Las listas del vocabulario se referencian (no se copian): lo que agregue
+    # expand_vocabulary_with_arasaac también entra en el sorteo
+    slots = tuple((vocabulary[name], tuple(positions[name])) for name in vocabulary if name in positions)
+    slot_positions = {i for pos in positions.values() for i in pos}
+    has_request_word = any(word in part for i, part in enumerate(parts) if i not in slot_positions
+                           for word in REQUEST_WORDS)
+    return CompiledTemplate(tuple(parts), slots, has_request_word)
+
+
+class SplitWriters:
+    """
+    Escritores CSV de cada split que reciben los diálogos a medida que se generan
+    
+    En formato 'full' cada fila lleva todas las columnas de FIELDNAMES; en
+    'compact' solo intent_id, template_id y texto (los nombres quedan en el
+    esquema que escribe write_schema).
+    """
+    
+    def __init__(self, paths: Dict[str, Path], intents: Dict[str, Dict[str, Any]],
+                 output_format: str = 'full', header: bool = True):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Formato de salida desconocido: {output_format}")
+        self.compact = output_format == 'compact'
+        self.intent_ids = {intent: idx for idx, intent in enumerate(intents)}
+        self.counts = {name: 0 for name in paths}
+        self.files = {}
+        self.writers = {}
+        try:
+            for name, path in paths.items():
+                self.files[name] = open(path, 'w', newline='', encoding='utf-8')
+                self.writers[name] = csv.writer(self.files[name])
+                if header:
+                    self.writers[name].writerow(COMPACT_FIELDNAMES if self.compact else FIELDNAMES)
+        except OSError:
+            self.close()
+            raise
+    
+    def write(self, split: str, index: int, intent: str, template_id: int, template: str, text: str):
+        """Escribe un diálogo en su split (mismo orden de columnas que el formato)"""
+        if self.compact:
+            self.writers[split].writerow((self.intent_ids[intent], template_id, text))
+        else:
+            self.writers[split].writerow((f"kid_{intent.lower()}_{index}", text, intent,
+                                          text, template, True))
+        self.counts[split] += 1
+    
+    def close(self):
+        for f in self.files.values():
+            f.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_schema(output_dir: str, intents: Dict[str, Dict[str, Any]], output_format: str):
+    """Guarda los nombres de intenciones y templates del formato compacto (o borra uno viejo)"""
+    path = Path(output_dir) / COMPACT_SCHEMA_FILE
+    if output_format != 'compact':
+        path.unlink(missing_ok=True)
+        return
+    schema = {
+        'format': 'compact',
+        'intents': list(intents),
+        'templates': {intent: data['templates'] for intent, data in intents.items()},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+
+
 class DialogueGeneratorForKids:
     """Generador de diálogos sintéticos específico para niños usando ARASAAC"""
     
@@ -20,6 +157,10 @@ class DialogueGeneratorForKids:
         self.pictos_file = pictos_file
         self.available_words = []
         self.pictogram_mapping = {}
+        # Fuente de aleatoriedad (cada shard usa su propio random.Random con semilla fija)
+        self.rng = random
+        # Templates ya parseados (se compilan la primera vez que se usan)
+        self.compiled_templates: Dict[str, CompiledTemplate] = {}
         self.load_datasets()
         
         # Intenciones específicas para niños
@@ -120,27 +261,22 @@ class DialogueGeneratorForKids:
     def load_datasets(self):
         """Cargar datasets de ARASAAC"""
         try:
-            # Cargar palabras
+            # Cargar palabras (en streaming: el filtro se detiene al juntar las
+            # que necesita y el resto del archivo no se llega a leer)
             if Path(self.words_file).exists() and Path(self.words_file).stat().st_size > 0:
-                with open(self.words_file, 'r', encoding='utf-8') as f:
-                    words_data = json.load(f)
-                
-                if isinstance(words_data, dict) and 'words' in words_data:
-                    all_words = words_data['words']
+                try:
+                    all_words = iter_json_array(self.words_file, key='words')
                     # Filtrar palabras apropiadas para niños
                     self.available_words = self.filter_kid_friendly_words(all_words)
                     print(f"✅ Cargadas {len(self.available_words)} palabras apropiadas para niños")
-                else:
+                except ValueError:
                     print("⚠️ Formato de palabras inesperado, usando vocabulario base")
             else:
                 print("⚠️ Archivo de palabras no disponible, usando vocabulario base")
                 
-            # Cargar pictogramas  
+            # Cargar pictogramas de a uno, construyendo el mapeo sobre la marcha
             if Path(self.pictos_file).exists() and Path(self.pictos_file).stat().st_size > 0:
-                with open(self.pictos_file, 'r', encoding='utf-8') as f:
-                    pictos_data = json.load(f)
-                
-                self.pictogram_mapping = self.build_picto_mapping(pictos_data)
+                self.pictogram_mapping = self.build_picto_mapping(iter_json_array(self.pictos_file))
                 print(f"✅ Cargados {len(self.pictogram_mapping)} pictogramas")
             else:
                 print("⚠️ Archivo de pictogramas no disponible")
@@ -149,7 +285,7 @@ class DialogueGeneratorForKids:
             print(f"⚠️ Error cargando datasets: {e}")
             print("Usando vocabulario base predefinido")
     
-    def filter_kid_friendly_words(self, words: List[str]) -> List[str]:
+    def filter_kid_friendly_words(self, words: Iterable[str], limit: int = 500) -> List[str]:
         """Filtrar palabras apropiadas para niños desde los datasets ARASAAC"""
         kid_friendly = []
         
@@ -188,15 +324,17 @@ class DialogueGeneratorForKids:
                 any(kw in word_clean for kw in kid_keywords) or
                 any(common in word_clean for common in ['niño', 'niña', 'bebé', 'hijo', 'hija'])):
                 kid_friendly.append(word_clean)
+                # Tomar máximo `limit` palabras apropiadas
+                if len(kid_friendly) >= limit:
+                    break
         
-        # Tomar máximo 500 palabras apropiadas
-        return kid_friendly[:500]
+        return kid_friendly
     
-    def build_picto_mapping(self, pictos_data: List[Dict]) -> Dict[str, List[int]]:
-        """Construir mapeo de palabras a pictogramas"""
+    def build_picto_mapping(self, pictos_data: Iterable[Dict]) -> Dict[str, List[int]]:
+        """Construir mapeo de palabras a pictogramas (acepta una lista o un iterador de pictogramas)"""
         mapping = {}
         
-        if not isinstance(pictos_data, list):
+        if isinstance(pictos_data, (dict, str)):
             return mapping
             
         for picto in pictos_data:
@@ -249,141 +387,186 @@ class DialogueGeneratorForKids:
     
     def generate_kid_dialogue(self, intent: str, template: str) -> str:
         """Generar un diálogo específico para niños"""
-        dialogue = template
+        compiled = self.compiled_templates.get(template)
+        if compiled is None:
+            compiled = self.compiled_templates[template] = compile_template(template, self.vocabulary)
         
-        # Reemplazar placeholders con vocabulario apropiado
-        for placeholder, options in self.vocabulary.items():
-            if f"{{{placeholder}}}" in dialogue:
-                chosen = random.choice(options)
-                dialogue = dialogue.replace(f"{{{placeholder}}}", chosen)
+        # Llenar los huecos con vocabulario apropiado: un sorteo por categoría y un solo join
+        if compiled.slots:
+            parts = list(compiled.parts)
+            for options, positions in compiled.slots:
+                chosen = self.rng.choice(options)
+                for position in positions:
+                    parts[position] = chosen
+            dialogue = "".join(parts)
+        else:
+            dialogue = compiled.parts[0]
         
         # Agregar variaciones naturales de niños
-        dialogue = self.add_kid_variations(dialogue)
+        dialogue = self.add_kid_variations(dialogue, compiled.has_request_word)
         
         return dialogue
     
-    def add_kid_variations(self, text: str) -> str:
-        """Agregar variaciones naturales del habla infantil"""
-        variations = []
+    def add_kid_variations(self, text: str, has_request_word: bool = False) -> str:
+        """
+        Agregar variaciones naturales del habla infantil
         
+        Args:
+            text: Diálogo ya armado
+            has_request_word: El template ya contiene una palabra de pedido
+                (evita buscarla en el texto)
+        """
         # 20% de probabilidad de agregar muletillas
-        if random.random() < 0.2:
-            muletillas = ["eh", "mm", "este", "bueno"]
-            text = random.choice(muletillas) + " " + text
+        if self.rng.random() < 0.2:
+            text = self.rng.choice(MULETILLA_PREFIXES) + text
         
         # 15% de probabilidad de repetir palabras importantes
-        if random.random() < 0.15:
+        if self.rng.random() < 0.15:
+            # Depende de la palabra sorteada: un split y un único reemplazo, solo en esta rama
             words = text.split()
             if len(words) > 1:
-                important_word = random.choice(words)
+                important_word = self.rng.choice(words)
                 if len(important_word) > 3:
                     text = text.replace(important_word, important_word + " " + important_word, 1)
         
         # 10% de probabilidad de agregar "por favor"
-        if random.random() < 0.1 and any(word in text for word in ["quiero", "dame", "necesito"]):
+        if self.rng.random() < 0.1 and (has_request_word or any(word in text for word in REQUEST_WORDS)):
             text = text + " por favor"
         
         # 10% de probabilidad de simplificar gramática
-        if random.random() < 0.1:
-            text = text.replace("estoy muy", "muy")
-            text = text.replace("me siento", "soy")
+        if self.rng.random() < 0.1:
+            text = _SIMPLIFY_RE.sub(lambda match: SIMPLIFY_RULES[match.group()], text)
         
         return text
     
-    def generate_dialogue_dataset(self, 
-                                num_samples: int = 50000,
-                                train_split: float = 0.7,
-                                val_split: float = 0.15,
-                                test_split: float = 0.15) -> Tuple[List[Dict], List[Dict], List[Dict]]:
-        """Generar dataset completo de diálogos para niños"""
+    def generate_shard(self, shard: int, start: int, end: int, seed: int, part_dir: str,
+                       train_split: float = 0.7, val_split: float = 0.15,
+                       output_format: str = 'full') -> Dict[str, Dict[str, int]]:
+        """
+        Genera los diálogos [start, end) y los escribe en archivos parciales por split
+        
+        La semilla del shard sale de (seed, shard), así que el contenido es el
+        mismo con cualquier cantidad de procesos. Cada diálogo va a su split
+        según el hash de su índice global: no hace falta barajar una lista.
         
+        Returns:
+            Conteos {'intents': {...}, 'splits': {...}} del shard
+        """
+        self.rng = random.Random(f"{seed}-{shard}")
+        intent_counts: Dict[str, int] = {}
+        paths = {name: Path(part_dir) / f"{name}-{shard:06d}.csv" for name in SPLIT_FILES}
+        # Pesos acumulados calculados una vez por shard (rng.choices con los pesos de cada intención)
+        intents = list(self.intents.keys())
+        cum_weights = list(itertools.accumulate(self.intents[intent]["weight"] for intent in intents))
+        with SplitWriters(paths, self.intents, output_format, header=False) as writers:
+            for i in range(start, end):
+                intent = self.rng.choices(intents, cum_weights=cum_weights)[0]
+                templates = self.intents[intent]["templates"]
+                # randrange(n) consume la misma fuente que choice(): mismo template, y con su id
+                template_id = self.rng.randrange(len(templates))
+                template = templates[template_id]
+                dialogue_text = self.generate_kid_dialogue(intent, template)
+                split = split_for_index(i, seed, train_split, val_split)
+                writers.write(split, i, intent, template_id, template, dialogue_text)
+                intent_counts[intent] = intent_counts.get(intent, 0) + 1
+        return {'intents': intent_counts, 'splits': writers.counts}
+    
+    def generate_sharded(self, num_samples: int, output_dir: str = "data/processed",
+                         workers: Optional[int] = None, shard_size: int = SHARD_SIZE, seed: int = 42,
+                         train_split: float = 0.7, val_split: float = 0.15,
+                         output_format: str = 'full') -> Dict[str, Dict[str, int]]:
+        """
+        Genera el dataset en shards repartidos en un pool de procesos
+        
+        Cada shard escribe sus archivos parciales y al final se concatenan en
+        orden de shard en los CSV de cada split; en memoria solo queda un
+        diálogo por proceso. El resultado es reproducible para una misma
+        semilla y shard_size, sin importar `workers`.
+        
+        Con output_format='compact' las filas guardan solo los ids de
+        intención y template más el texto, y los nombres van al esquema
+        COMPACT_SCHEMA_FILE del mismo directorio.
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Formato de salida desconocido: {output_format}")
         print(f"🎭 Generando {num_samples} diálogos para niños...")
         
-        # Expandir vocabulario con ARASAAC si está disponible
+        # El vocabulario se expande una vez y viaja a cada proceso con el generador
         self.expand_vocabulary_with_arasaac()
         
-        dialogues = []
-        intent_counts = {intent: 0 for intent in self.intents.keys()}
+        tasks = [(shard, start, min(start + shard_size, num_samples))
+                 for shard, start in enumerate(range(0, num_samples, shard_size))]
+        workers = max(1, min(workers or os.cpu_count() or 1, len(tasks) or 1))
+        print(f"  {len(tasks)} shards de hasta {shard_size} diálogos en {workers} procesos")
         
-        # Generar diálogos
-        for i in range(num_samples):
-            # Seleccionar intención basada en pesos
-            intent = self.select_weighted_intent()
-            intent_counts[intent] += 1
-            
-            # Seleccionar template
-            template = random.choice(self.intents[intent]["templates"])
-            
-            # Generar diálogo
-            dialogue_text = self.generate_kid_dialogue(intent, template)
-            
-            # Crear entrada
-            dialogue_entry = {
-                'id': f"kid_{intent.lower()}_{i}",
-                'texto': dialogue_text,
-                'intent': intent,
-                'original': dialogue_text,
-                'template': template,
-                'is_kid_optimized': True
-            }
-            
-            dialogues.append(dialogue_entry)
-            
-            if (i + 1) % 10000 == 0:
-                print(f"  Generados {i + 1}/{num_samples} diálogos...")
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        part_dir = tempfile.mkdtemp(prefix=".shards-", dir=output_dir)
+        try:
+            args = [(shard, start, end, seed, part_dir, train_split, val_split, output_format)
+                    for shard, start, end in tasks]
+            # Cada shard reemplaza la fuente por la suya; el módulo random no se puede enviar
+            self.rng = random.Random(seed)
+            if workers == 1:
+                _init_shard_worker(self)
+                results = [_run_shard(task) for task in args]
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+                                         initargs=(self,)) as pool:
+                    results = list(pool.map(_run_shard, args))
+            self.merge_shards(part_dir, output_dir, len(tasks), output_format)
+            write_schema(output_dir, self.intents, output_format)
+        finally:
+            shutil.rmtree(part_dir, ignore_errors=True)
+        
+        intent_counts: Dict[str, int] = {intent: 0 for intent in self.intents}
+        split_counts = {name: 0 for name in SPLIT_FILES}
+        for result in results:
+            for intent, count in result['intents'].items():
+                intent_counts[intent] += count
+            for name, count in result['splits'].items():
+                split_counts[name] += count
         
-        # Mostrar estadísticas
         print(f"\n📊 Distribución de intenciones:")
         for intent, count in intent_counts.items():
-            percentage = (count / num_samples) * 100
+            percentage = (count / num_samples) * 100 if num_samples else 0.0
             print(f"  {intent}: {count} ({percentage:.1f}%)")
         
-        # Dividir dataset
-        random.shuffle(dialogues)
-        
-        train_end = int(num_samples * train_split)
-        val_end = train_end + int(num_samples * val_split)
-        
-        train_set = dialogues[:train_end]
-        val_set = dialogues[train_end:val_end]
-        test_set = dialogues[val_end:]
-        
         print(f"\n📋 División del dataset:")
-        print(f"  Entrenamiento: {len(train_set)} diálogos")
-        print(f"  Validación: {len(val_set)} diálogos")
-        print(f"  Prueba: {len(test_set)} diálogos")
-        
-        return train_set, val_set, test_set
-    
-    def select_weighted_intent(self) -> str:
-        """Seleccionar intención basada en pesos"""
-        intents = list(self.intents.keys())
-        weights = [self.intents[intent]["weight"] for intent in intents]
-        return random.choices(intents, weights=weights)[0]
+        for name, filename in SPLIT_FILES.items():
+            print(f"💾 Guardado: {Path(output_dir) / filename} ({split_counts[name]} registros)")
+        return {'intents': intent_counts, 'splits': split_counts}
     
-    def save_datasets(self, train_set: List[Dict], val_set: List[Dict], test_set: List[Dict], 
-                     output_dir: str = "data/processed"):
-        """Guardar datasets en archivos CSV"""
-        
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
-        
-        datasets = [
-            (train_set, "dialogos_train_kids.csv"),
-            (val_set, "dialogos_val_kids.csv"),
-            (test_set, "dialogos_test_kids.csv")
-        ]
-        
-        for dataset, filename in datasets:
-            filepath = Path(output_dir) / filename
-            
-            with open(filepath, 'w', newline='', encoding='utf-8') as f:
-                if dataset:
-                    fieldnames = dataset[0].keys()
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(dataset)
-            
-            print(f"💾 Guardado: {filepath} ({len(dataset)} registros)")
+    def merge_shards(self, part_dir: str, output_dir: str, num_shards: int, output_format: str = 'full'):
+        """Concatena los archivos parciales de cada split en orden de shard"""
+        fieldnames = COMPACT_FIELDNAMES if output_format == 'compact' else FIELDNAMES
+        for name, filename in SPLIT_FILES.items():
+            with open(Path(output_dir) / filename, 'w', newline='', encoding='utf-8') as out:
+                csv.writer(out).writerow(fieldnames)
+                for shard in range(num_shards):
+                    with open(Path(part_dir) / f"{name}-{shard:06d}.csv", 'r', newline='', encoding='utf-8') as part:
+                        shutil.copyfileobj(part, out)
+
+def split_for_index(index: int, seed: int, train_split: float, val_split: float) -> str:
+    """Split de un diálogo según el hash de (semilla, índice): estable y sin estado global"""
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    u = int.from_bytes(digest, 'big') / 2 ** 64
+    if u < train_split:
+        return 'train'
+    return 'val' if u < train_split + val_split else 'test'
+
+
+# Generador de cada proceso del pool (se envía una vez por proceso)
+_shard_generator: Optional[DialogueGeneratorForKids] = None
+
+
+def _init_shard_worker(generator: DialogueGeneratorForKids):
+    global _shard_generator
+    _shard_generator = generator
+
+
+def _run_shard(task) -> Dict[str, Dict[str, int]]:
+    return _shard_generator.generate_shard(*task)
+
 
 def main():
     parser = argparse.ArgumentParser(description="Generar diálogos sintéticos para niños usando ARASAAC")
@@ -391,6 +574,11 @@ def main():
     parser.add_argument('--words-file', default='dataset_words.json', help='Archivo de palabras ARASAAC')
     parser.add_argument('--pictos-file', default='dataset_picto.json', help='Archivo de pictogramas ARASAAC')
     parser.add_argument('--output-dir', default='data/processed', help='Directorio de salida')
+    parser.add_argument('--workers', type=int, default=None, help='Procesos de generación (por defecto, todos los núcleos)')
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='Diálogos por shard (junto con --seed fija la salida)')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla base de los shards y de la división en splits')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='full',
+                        help="'compact' guarda solo ids de intención/template y el texto")
     
     args = parser.parse_args()
     
@@ -400,11 +588,9 @@ def main():
     # Crear generador
     generator = DialogueGeneratorForKids(args.words_file, args.pictos_file)
     
-    # Generar datasets
-    train_set, val_set, test_set = generator.generate_dialogue_dataset(args.samples)
-    
-    # Guardar datasets
-    generator.save_datasets(train_set, val_set, test_set, args.output_dir)
+    # Generar y guardar los datasets por shards, sin armar la lista completa en memoria
+    generator.generate_sharded(args.samples, args.output_dir, workers=args.workers,
+                               shard_size=args.shard_size, seed=args.seed, output_format=args.format)
     
     print(f"\n✅ Generación completada exitosamente!")
     print(f"📁 Archivos guardados en: {args.output_dir}")
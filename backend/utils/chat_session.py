@@ -0,0 +1,178 @@
+"""
+Sesiones del canal WebSocket /ws/chat
+
+Cada conexión mantiene en memoria un ChatSession (historial corto, conteos,
+preferencias) y recibe un flujo de mensajes JSON sin pagar por mensaje el
+costo de una petición HTTP ni el preflight de CORS.
+
+Protocolo (un objeto JSON por frame; también se acepta texto plano):
+    -> {"type": "message", "id": "42", "text": "quiero agua", "include_pictos": true}
+    <- {"type": "reply", "id": "42", "decided_intent": ..., "pictos": [...], "session": {...}}
+    -> {"type": "config", "include_pictos": false}
+    <- {"type": "session", ...}
+    -> {"type": "suggest", "q": "choc", "limit": 8}
+    <- {"type": "suggestions", "q": "choc", "suggestions": [{"term": ..., "pictos": [...]}]}
+    -> {"type": "ping"}
+    <- {"type": "pong"}
+Los errores se responden con {"type": "error", "id": ..., "status": ..., "detail": ...}
+sin cerrar la conexión. Un frame binario se responde con un error 415 y la
+conexión se cierra con el código 1003 (tipo de dato no soportado).
+Las opciones booleanas aceptan true/false o el texto "true"/"false", igual que
+el parámetro include_pictos de la URL.
+"""
+import json
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from utils.executor import PoolSaturated
+
+# Mensajes recientes que se recuerdan por conexión
+SESSION_HISTORY_SIZE = int(os.environ.get("CHAT_WS_HISTORY", "20"))
+# Largo máximo de un mensaje recibido por el WebSocket
+MAX_MESSAGE_CHARS = 2000
+# Código de cierre WebSocket para frames que no son texto (RFC 6455)
+UNSUPPORTED_DATA = 1003
+
+
+def parse_flag(value: Any) -> bool:
+    """
+    Interpreta una opción booleana del protocolo
+
+    Raises:
+        ValueError: Si el valor no es un booleano ni un texto
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.lower() != "false"
+    raise ValueError(f"Se esperaba true o false, se recibió {value!r}")
+
+
+class ChatSession:
+    """Estado en memoria de una conexión /ws/chat"""
+
+    def __init__(self, include_pictos: bool = True, history_size: int = SESSION_HISTORY_SIZE):
+        self.session_id = uuid.uuid4().hex
+        self.include_pictos = include_pictos
+        self.history = deque(maxlen=history_size)
+        self.messages = 0
+        self.fallbacks = 0
+        self.intent_counts: Dict[str, int] = {}
+        self.started_at = time.time()
+
+    def configure(self, options: Dict[str, Any]):
+        """Actualiza las preferencias de la sesión"""
+        if 'include_pictos' in options:
+            self.include_pictos = parse_flag(options['include_pictos'])
+
+    def record(self, text: str, result: Dict[str, Any]):
+        """Guarda el mensaje y su intención en el historial de la sesión"""
+        intent = result['decided_intent']
+        self.messages += 1
+        if intent == 'FALLBACK':
+            self.fallbacks += 1
+        self.intent_counts[intent] = self.intent_counts.get(intent, 0) + 1
+        self.history.append({'text': text, 'decided_intent': intent, 'best_prob': result['best_prob']})
+
+    def info(self) -> Dict[str, Any]:
+        """Resumen de la sesión que se envía al cliente"""
+        return {
+            'session_id': self.session_id,
+            'messages': self.messages,
+            'fallbacks': self.fallbacks,
+            'last_intent': self.history[-1]['decided_intent'] if self.history else None,
+            'include_pictos': self.include_pictos,
+        }
+
+
+def _error(status: int, detail: str, message_id: Any = None, **extra) -> Dict[str, Any]:
+    return {'type': 'error', 'id': message_id, 'status': status, 'detail': detail, **extra}
+
+
+async def receive_text_frame(websocket) -> Optional[str]:
+    """
+    Siguiente frame de texto, o None si la conexión terminó
+
+    receive_text() lanza KeyError ante un frame binario y corta la conexión
+    sin código de cierre; aquí se responde el error y se cierra con 1003.
+    """
+    message = await websocket.receive()
+    if message['type'] == 'websocket.disconnect':
+        return None
+    text = message.get('text')
+    if text is None:
+        await websocket.send_json(_error(415, "Solo se aceptan frames de texto (JSON o texto plano)"))
+        await websocket.close(code=UNSUPPORTED_DATA)
+        return None
+    return text
+
+
+async def handle_session_message(session: ChatSession, raw: str, predictor, executor,
+                                 to_response: Callable[[Dict[str, Any], bool], Any]) -> Dict[str, Any]:
+    """
+    Procesa un frame recibido y retorna la respuesta a enviar
+
+    Args:
+        session: Estado de la conexión
+        raw: Texto del frame (JSON o texto plano)
+        predictor: ChatPredictor compartido por la app
+        executor: PredictionExecutor de la app (la predicción no bloquea el loop)
+        to_response: Convierte el resultado del predictor en la respuesta de /chat
+    """
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        data = {'text': raw}
+    if not isinstance(data, dict):
+        data = {'text': raw}
+
+    message_id = data.get('id')
+    kind = data.get('type', 'message')
+    if kind == 'ping':
+        return {'type': 'pong'}
+    if kind == 'suggest':
+        query = data.get('q')
+        if not isinstance(query, str):
+            return _error(422, "La sugerencia debe incluir un campo 'q'", message_id)
+        limit = data.get('limit', 8)
+        # bool es subclase de int: {"limit": true} no es un límite
+        limit = min(max(limit, 1), 50) if isinstance(limit, int) and not isinstance(limit, bool) else 8
+        try:
+            suggestions = await executor.run(predictor.suggest_pictos, query[:MAX_MESSAGE_CHARS], limit)
+        except PoolSaturated as e:
+            return _error(503, str(e), message_id, retry_after=e.retry_after)
+        return {'type': 'suggestions', 'id': message_id, 'q': query, 'suggestions': suggestions}
+    if kind == 'config':
+        try:
+            session.configure(data)
+        except ValueError as e:
+            return _error(422, str(e), message_id)
+        return {'type': 'session', **session.info()}
+    if kind != 'message':
+        return _error(400, f"Tipo de mensaje desconocido: {kind}", message_id)
+
+    text = data.get('text')
+    if not isinstance(text, str) or not text.strip():
+        return _error(422, "El mensaje debe incluir un campo 'text' no vacío", message_id)
+    if len(text) > MAX_MESSAGE_CHARS:
+        return _error(413, f"El mensaje excede {MAX_MESSAGE_CHARS} caracteres", message_id)
+
+    try:
+        debug = parse_flag(data.get('debug', False))
+        include_pictos = parse_flag(data.get('include_pictos', session.include_pictos))
+    except ValueError as e:
+        return _error(422, str(e), message_id)
+
+    try:
+        result = await executor.run(predictor.process_message, text, debug)
+    except PoolSaturated as e:
+        return _error(503, str(e), message_id, retry_after=e.retry_after)
+    except Exception as e:
+        return _error(500, f"Error procesando mensaje: {str(e)}", message_id)
+
+    session.record(text, result)
+    reply = to_response(result, include_pictos).model_dump(exclude_none=True)
+    return {'type': 'reply', 'id': message_id, **reply, 'session': session.info()}
@@ -1,19 +1,55 @@
 import csv
+import json
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import Any, Iterator, List, Dict, Tuple
 
+# Formato compacto de generate_data.py (--format compact): cada fila guarda
+# intent_id,template_id,texto y los nombres viven en este archivo del mismo directorio
+COMPACT_SCHEMA_FILE = 'dialogos_schema_kids.json'
 
-def load_split(path: str) -> Tuple[List[str], List[str]]:
-    textos, intents = [], []
-    with open(path, encoding='utf-8') as f:
+
+def load_compact_schema(directory: str) -> Dict[str, Any]:
+    """Intenciones y templates (por id) de un dataset en formato compacto"""
+    with open(Path(directory) / COMPACT_SCHEMA_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_rows(path: str) -> Iterator[Tuple[str, str]]:
+    """(texto, intent) de cada fila de un split, en formato completo o compacto"""
+    with open(path, encoding='utf-8', newline='') as f:
         reader = csv.DictReader(f)
+        if 'intent' in (reader.fieldnames or []):
+            for row in reader:
+                yield row['texto'], row['intent']
+            return
+        intents = load_compact_schema(str(Path(path).parent))['intents']
         for row in reader:
-            textos.append(row['texto'])
-            intents.append(row['intent'])
+            yield row['texto'], intents[int(row['intent_id'])]
+
+
+def load_split(path: str) -> Tuple[List[str], List[str]]:
+    textos, intents = [], []
+    for texto, intent in iter_rows(path):
+        textos.append(texto)
+        intents.append(intent)
     return textos, intents
 
 
-def load_dataset(processed_dir: str):
+def iter_split(path: str, chunk_size: int = 10000) -> Iterator[Tuple[List[str], List[str]]]:
+    """Lee un split por bloques de `chunk_size` filas (textos, intents) sin cargarlo entero"""
+    textos, intents = [], []
+    for texto, intent in iter_rows(path):
+        textos.append(texto)
+        intents.append(intent)
+        if len(textos) >= chunk_size:
+            yield textos, intents
+            textos, intents = [], []
+    if textos:
+        yield textos, intents
+
+
+def split_paths(processed_dir: str) -> Tuple[Path, Path, Path]:
+    """Archivos de train, val y test del directorio procesado"""
     base = Path(processed_dir)
     # Usar los nuevos archivos optimizados para niños
     train_file = base / 'dialogos_train_kids.csv'
@@ -27,7 +63,11 @@ def load_dataset(processed_dir: str):
         val_file = base / 'dialogos_val.csv'
     if not test_file.exists():
         test_file = base / 'dialogos_test.csv'
-    
+    return train_file, val_file, test_file
+
+
+def load_dataset(processed_dir: str):
+    train_file, val_file, test_file = split_paths(processed_dir)
     X_train, y_train = load_split(str(train_file))
     X_val, y_val = load_split(str(val_file))
     X_test, y_test = load_split(str(test_file))
@@ -0,0 +1,96 @@
+"""
+Ejecución de predicciones fuera del event loop de asyncio
+
+Las predicciones (TF-IDF, Naive Bayes, pictogramas) son CPU y bloquearían el
+loop si se llamaran directamente desde un endpoint `async def`. Este módulo
+las envía a un pool de hilos acotado, con un límite de trabajos en espera:
+cuando el pool está saturado se rechaza el trabajo de inmediato en lugar de
+hacer esperar a todas las conexiones.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class PoolSaturated(Exception):
+    """El pool de predicción no admite más trabajos en este momento"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Servidor ocupado, intenta de nuevo en unos segundos")
+        self.retry_after = retry_after
+
+
+class PredictionExecutor:
+    """Pool de hilos acotado para predicciones, con profundidad de cola limitada"""
+
+    def __init__(self, max_workers: int = 4, queue_depth: int = 32, retry_after: int = 1):
+        """
+        Args:
+            max_workers: Predicciones ejecutándose a la vez
+            queue_depth: Predicciones que pueden esperar un hilo libre
+            retry_after: Segundos sugeridos al cliente cuando el pool está lleno
+        """
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.capacity = max_workers + queue_depth
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="predict")
+        self._pending = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "PredictionExecutor":
+        """Configura el pool con CHAT_MAX_WORKERS, CHAT_QUEUE_DEPTH y CHAT_RETRY_AFTER"""
+        return cls(
+            max_workers=int(os.environ.get("CHAT_MAX_WORKERS", min(4, os.cpu_count() or 1))),
+            queue_depth=int(os.environ.get("CHAT_QUEUE_DEPTH", "32")),
+            retry_after=int(os.environ.get("CHAT_RETRY_AFTER", "1")),
+        )
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Ejecuta fn(*args) en el pool y espera su resultado sin bloquear el loop
+
+        Raises:
+            PoolSaturated: si ya hay `capacity` trabajos en curso o en espera
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                raise PoolSaturated(self.retry_after)
+            self._pending += 1
+        future = self._pool.submit(fn, *args)
+        # El cupo se libera cuando termina el trabajo, aunque el cliente se desconecte antes
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, int]:
+        """Ocupación actual del pool"""
+        return {
+            'in_flight': self._pending,
+            'capacity': self.capacity,
+            'max_workers': self.max_workers,
+            'queue_depth': self.queue_depth,
+            'rejected': self._rejected,
+        }
+
+    def register_metrics(self, registry, prefix: str = 'chat_'):
+        """Registra la ocupación del pool en un MetricsRegistry"""
+        registry.gauge(f'{prefix}prediction_pool_in_flight',
+                       'Predicciones en curso o esperando un hilo', lambda: self._pending)
+        registry.gauge(f'{prefix}prediction_pool_capacity',
+                       'Máximo de predicciones en curso más en espera', lambda: self.capacity)
+        registry.counter_function(f'{prefix}prediction_pool_rejected_total',
+                                  'Predicciones rechazadas con 503 por pool saturado',
+                                  lambda: self._rejected)
+
+    def shutdown(self):
+        """Detiene el pool esperando los trabajos en curso"""
+        self._pool.shutdown(wait=True)
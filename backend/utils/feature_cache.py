@@ -0,0 +1,156 @@
+"""
+Caché en disco de las matrices de features del entrenamiento
+
+Vectorizar los textos (tokenizar, armar n-gramas, contar y aplicar tf-idf)
+es la parte cara de cada entrenamiento y no depende del clasificador. Este
+módulo ajusta el TfidfVectorizer sobre el split de entrenamiento, transforma
+cada split una sola vez y guarda las matrices CSR y el vocabulario (términos
+e idf) en .npz. Una corrida posterior con los mismos datos y los mismos
+parámetros del vectorizador los abre directamente y entrena otro
+clasificador (u otro alpha) sin procesar texto.
+
+Estructura en disco (un directorio por combinación de datos y parámetros):
+    v<formato>-<clave>/<split>.npz  matriz CSR de cada split (scipy.sparse.save_npz)
+    v<formato>-<clave>/vocab.npz    términos por columna, idf y parámetros del vectorizador
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Versión del formato en disco; cambiarla invalida los cachés anteriores
+FEATURE_CACHE_VERSION = 1
+
+
+class FeatureSet(NamedTuple):
+    """Vectorizador ajustado y matriz de cada split"""
+    vectorizer: TfidfVectorizer
+    matrices: Dict[str, sp.csr_matrix]
+    key: str
+    cached: bool
+
+
+def vectorizer_params(vectorizer: TfidfVectorizer) -> Dict[str, Any]:
+    """Parámetros del vectorizador en forma serializable (forman parte de la clave)"""
+    params = vectorizer.get_params()
+    return {name: (list(value) if isinstance(value, tuple) else value)
+            for name, value in sorted(params.items())
+            if value is None or isinstance(value, (bool, int, float, str, tuple))}
+
+
+def file_fingerprint(path: str) -> Dict[str, Any]:
+    """Ruta, tamaño y mtime de un archivo de datos: lo identifican sin leerlo"""
+    stat = os.stat(path)
+    return {"path": str(Path(path).resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def features_key(splits: Dict[str, Tuple[List[str], List[str]]], params: Dict[str, Any],
+                 sources: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Huella de los datos de cada split y de los parámetros del vectorizador
+
+    Con `sources` (huellas de los archivos de origen y opciones que eligen las
+    filas) la clave sale de esa descripción sin recorrer los textos; sin ella,
+    por ejemplo con splits armados en memoria, se hashea cada ejemplo.
+    """
+    digest = hashlib.blake2b(f"v{FEATURE_CACHE_VERSION}".encode(), digest_size=16)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    if sources is not None:
+        digest.update(json.dumps(sources, sort_keys=True).encode())
+    for name in sorted(splits):
+        texts, labels = splits[name]
+        digest.update(f"|{name}:{len(texts)}|".encode())
+        if sources is not None:
+            continue
+        for text, label in zip(texts, labels):
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\x1f")
+            digest.update(label.encode("utf-8"))
+            digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def _save(directory: Path, vectorizer: TfidfVectorizer, matrices: Dict[str, sp.csr_matrix],
+          params: Dict[str, Any]):
+    terms = [""] * len(vectorizer.vocabulary_)
+    for term, idx in vectorizer.vocabulary_.items():
+        terms[idx] = term
+    np.savez(
+        directory / "vocab.npz",
+        terms=np.array(terms, dtype=str),
+        idf=np.asarray(vectorizer.idf_, dtype=np.float64),
+        params=np.array(json.dumps(params)),
+    )
+    for name, matrix in matrices.items():
+        sp.save_npz(directory / f"{name}.npz", matrix)
+
+
+def _load(directory: Path, names: List[str]) -> Tuple[TfidfVectorizer, Dict[str, sp.csr_matrix]]:
+    with np.load(directory / "vocab.npz", allow_pickle=False) as data:
+        params = json.loads(str(data["params"]))
+        terms = data["terms"].tolist()
+        idf = data["idf"]
+    params["ngram_range"] = tuple(params["ngram_range"])
+    vectorizer = TfidfVectorizer(**params)
+    vectorizer.vocabulary_ = {term: idx for idx, term in enumerate(terms)}
+    vectorizer.idf_ = idf
+    matrices = {name: sp.load_npz(directory / f"{name}.npz").tocsr() for name in names}
+    if any(matrix.shape[1] != len(terms) for matrix in matrices.values()):
+        raise ValueError(f"Caché de features corrupto en {directory}")
+    return vectorizer, matrices
+
+
+def load_or_build_features(vectorizer: TfidfVectorizer,
+                           splits: Dict[str, Tuple[List[str], List[str]]],
+                           cache_dir: str, fit_split: str = "train",
+                           sources: Optional[Dict[str, Any]] = None) -> FeatureSet:
+    """
+    Matrices de features de cada split, desde el caché o calculadas y guardadas
+
+    Args:
+        vectorizer: TfidfVectorizer sin ajustar (sus parámetros forman la clave)
+        splits: {nombre: (textos, etiquetas)}; las etiquetas solo entran en la clave
+        cache_dir: Directorio base del caché
+        fit_split: Split sobre el que se ajusta el vectorizador
+        sources: Descripción serializable del origen de los splits (ver file_fingerprint);
+            si se da, la clave no depende de recorrer los textos
+
+    Returns:
+        FeatureSet con el vectorizador ajustado (reutilizable en el Pipeline final)
+    """
+    params = vectorizer_params(vectorizer)
+    key = features_key(splits, params, sources)
+    base_dir = Path(cache_dir)
+    target = base_dir / f"v{FEATURE_CACHE_VERSION}-{key}"
+
+    if target.is_dir():
+        try:
+            fitted, matrices = _load(target, list(splits))
+            print(f"Features cargadas desde el caché {target}")
+            return FeatureSet(fitted, matrices, key, cached=True)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Caché de features inválido en {target}, recalculando: {e}")
+
+    matrices = {fit_split: vectorizer.fit_transform(splits[fit_split][0]).tocsr()}
+    for name, (texts, _) in splits.items():
+        if name != fit_split:
+            matrices[name] = vectorizer.transform(texts).tocsr()
+
+    try:
+        base_dir.mkdir(parents=True, exist_ok=True)
+        # Escribir en un directorio temporal y renombrar: nunca queda un caché a medias
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=base_dir))
+        _save(tmp_dir, vectorizer, matrices, params)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp_dir, target)
+        print(f"Features guardadas en {target}")
+    except OSError as e:
+        print(f"No se pudo guardar el caché de features en {base_dir}: {e}")
+    return FeatureSet(vectorizer, matrices, key, cached=False)
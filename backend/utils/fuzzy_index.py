@@ -0,0 +1,134 @@
+"""
+Búsqueda aproximada de términos (errores de escritura) estilo SymSpell
+
+Para cada término se precalculan sus "borrados": las cadenas que resultan
+de quitarle hasta `max_distance` caracteres a su prefijo. Una palabra mal
+escrita a distancia d de un término comparte con él al menos un borrado, así
+que la búsqueda solo genera los borrados de la consulta, los cruza con el
+índice y verifica unos pocos candidatos con la distancia de edición real
+(Damerau-Levenshtein restringida: inserción, borrado, sustitución y
+transposición de letras vecinas).
+
+Indexar solo el prefijo (SymSpell usa 7 caracteres) acota la memoria sin
+perder coincidencias: los errores después del prefijo se detectan al verificar.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Distancia de edición máxima admitida
+FUZZY_MAX_DISTANCE = 2
+# Caracteres del inicio de cada término que entran al índice de borrados
+FUZZY_PREFIX_LENGTH = 7
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """La palabra y todas las cadenas que resultan de borrarle hasta max_distance caracteres"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for candidate in frontier:
+            for i in range(len(candidate)):
+                next_frontier.add(candidate[:i] + candidate[i + 1:])
+        next_frontier -= result
+        result |= next_frontier
+        frontier = next_frontier
+    return result
+
+
+def bounded_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """
+    Distancia Damerau-Levenshtein restringida (OSA) entre a y b, o None si supera max_distance
+
+    Solo se calculan las celdas a menos de max_distance de la diagonal y se
+    corta en cuanto una fila entera supera el límite.
+    """
+    if a == b:
+        return 0
+    len_a, len_b = len(a), len(b)
+    if abs(len_a - len_b) > max_distance:
+        return None
+    too_far = max_distance + 1
+    previous_previous: List[int] = []
+    previous = list(range(len_b + 1))
+    for i in range(1, len_a + 1):
+        current = [too_far] * (len_b + 1)
+        current[0] = i
+        lo = max(1, i - max_distance)
+        hi = min(len_b, i + max_distance)
+        row_min = current[0] if lo == 1 else too_far
+        for j in range(lo, hi + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return None
+        previous_previous, previous = previous, current
+    distance = previous[len_b]
+    return distance if distance <= max_distance else None
+
+
+class DeletionIndex:
+    """Índice de borrados sobre un vocabulario para corregir palabras mal escritas"""
+
+    def __init__(self, terms: Iterable[str], max_distance: int = FUZZY_MAX_DISTANCE,
+                 prefix_length: int = FUZZY_PREFIX_LENGTH):
+        self.terms: List[str] = sorted({term for term in terms if term})
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        # borrado -> índice del término, o tupla de índices si lo comparten varios
+        self._deletes: Dict[str, object] = {}
+        for position, term in enumerate(self.terms):
+            for deleted in _deletes(term[:prefix_length], max_distance):
+                current = self._deletes.get(deleted)
+                if current is None:
+                    self._deletes[deleted] = position
+                elif isinstance(current, tuple):
+                    self._deletes[deleted] = current + (position,)
+                else:
+                    self._deletes[deleted] = (current, position)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _candidates(self, word: str, distance: int) -> Set[int]:
+        candidates: Set[int] = set()
+        for deleted in _deletes(word[:self.prefix_length], distance):
+            found = self._deletes.get(deleted)
+            if found is None:
+                continue
+            if isinstance(found, tuple):
+                candidates.update(found)
+            else:
+                candidates.add(found)
+        return candidates
+
+    def lookup(self, word: str, max_distance: Optional[int] = None) -> Optional[Tuple[str, int]]:
+        """
+        Término más cercano a `word` dentro de max_distance
+
+        Se prueba primero distancia 1 y solo si no hay coincidencias se amplía:
+        la mayoría de los errores son de una letra y así se verifican menos
+        candidatos. Entre empates gana el que conserva la primera letra, luego
+        el de largo más parecido y por último el orden alfabético.
+
+        Returns:
+            (término, distancia) o None si no hay ninguno lo bastante cerca
+        """
+        limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        for distance in range(1, limit + 1):
+            best = None
+            for position in self._candidates(word, distance):
+                term = self.terms[position]
+                found = bounded_distance(word, term, distance)
+                if found is None:
+                    continue
+                rank = (found, term[:1] != word[:1], abs(len(term) - len(word)), term)
+                if best is None or rank < best:
+                    best = rank
+            if best is not None:
+                return best[3], best[0]
+        return None
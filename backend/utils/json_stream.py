@@ -0,0 +1,131 @@
+"""
+Lectura incremental de arreglos JSON grandes (exportaciones de ARASAAC)
+
+json.load materializa el archivo completo antes de poder recorrerlo: con el
+catálogo de pictogramas (keywords, synsets, tags) el pico de memoria depende
+del tamaño del JSON y no del índice que se construye con él. Este lector
+recorre el arreglo por bloques y entrega un elemento a la vez, decodificado
+con json.JSONDecoder.raw_decode, así que en memoria solo conviven el bloque
+leído, el elemento actual y lo que el llamador decida guardar.
+
+Admite el arreglo en la raíz (dataset_picto.json) o bajo una clave de un
+objeto raíz ({"words": [...]} en dataset_words.json).
+"""
+import json
+from typing import Any, Iterator, Optional
+
+# Caracteres leídos por bloque
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+
+
+class _StreamReader:
+    """Búfer sobre un archivo de texto que decodifica un valor JSON a la vez"""
+
+    def __init__(self, fileobj, chunk_size: int):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: int) -> bool:
+        """Lee al menos `size` caracteres más; False si el archivo terminó"""
+        if self.eof:
+            return False
+        chunk = self.fileobj.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Descartar lo ya consumido para que el búfer no crezca con el archivo
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Siguiente carácter que no sea espacio ('' al final del archivo)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill(self.chunk_size):
+                return ""
+
+    def expect(self, chars: str) -> str:
+        """Consume un carácter estructural que debe ser uno de `chars`"""
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else "fin de archivo"
+            raise ValueError(f"JSON inesperado: se esperaba uno de {chars!r}, se encontró {found}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """
+        Decodifica el siguiente valor completo
+
+        Si el valor queda cortado por el borde del búfer se lee más y se
+        reintenta; cada lectura es al menos tan grande como lo pendiente, así
+        que un elemento enorme se decodifica en tiempo lineal.
+        """
+        self.peek()
+        while True:
+            try:
+                result, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill(max(self.chunk_size, len(self.buffer) - self.pos)):
+                    continue
+                raise
+            # Un número al final del búfer puede seguir en el próximo bloque
+            if end == len(self.buffer) and self._fill(self.chunk_size):
+                continue
+            self.pos = end
+            return result
+
+
+def _iter_items(reader: _StreamReader) -> Iterator[Any]:
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(",]") == "]":
+            return
+
+
+def iter_json_array(path: str, key: Optional[str] = None,
+                    chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Elementos de un arreglo JSON, uno a la vez
+
+    Args:
+        path: Archivo JSON
+        key: Si se indica, el archivo es un objeto y se recorre el arreglo
+            guardado en esa clave; los demás valores del objeto se saltan
+        chunk_size: Caracteres leídos por bloque
+
+    Raises:
+        ValueError: Si el archivo no tiene la forma esperada o el JSON es inválido
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _StreamReader(f, chunk_size)
+        if key is None:
+            yield from _iter_items(reader)
+            return
+
+        reader.expect("{")
+        if reader.peek() == "}":
+            raise ValueError(f"JSON inesperado: falta la clave '{key}'")
+        while True:
+            name = reader.value()
+            reader.expect(":")
+            if name == key:
+                yield from _iter_items(reader)
+                return
+            reader.value()
+            if reader.expect(",}") == "}":
+                raise ValueError(f"JSON inesperado: falta la clave '{key}'")
@@ -0,0 +1,362 @@
+"""
+Instrumentación liviana del camino caliente del chat
+
+- Histogram / Counter: cada hilo escribe en su propio fragmento (sin locks en
+  observe/inc) y los fragmentos se suman al leerlos, es decir, al hacer scrape.
+- StageTimer: mide la duración de cada etapa de una petición
+  (normalización, TF-IDF, Naive Bayes, top-k, pictogramas, respuesta).
+  Cuando la medición está desactivada se usa NULL_TIMER, cuyas etapas son
+  un context manager vacío: el costo es prácticamente nulo.
+- MetricsRegistry: reúne contadores, histogramas y gauges calculados al
+  vuelo y los expone en el formato de texto de Prometheus.
+- MetricsMiddleware: middleware ASGI con latencia y conteo por endpoint.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Buckets en segundos, de 10 µs a 2.5 s (una etapa típica tarda decenas de µs)
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+class Histogram:
+    """Histograma acumulativo con fragmentos por hilo, agregados al leer"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._shards: List[list] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> list:
+        """Fragmento del hilo actual: [conteo por bucket..., conteo +Inf, suma]"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = [0] * (len(self.buckets) + 1) + [0.0]
+            # Solo se toma el lock la primera vez que un hilo observa un valor
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def observe(self, value: float):
+        """Registra un valor (en segundos)"""
+        shard = self._shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self) -> Dict[str, object]:
+        """Suma de todos los fragmentos: conteos por bucket (no acumulados), total y suma"""
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for shard in list(self._shards):
+            for i in range(len(counts)):
+                counts[i] += shard[i]
+            total += shard[-1]
+        return {'counts': counts, 'count': sum(counts), 'sum': total}
+
+    def quantile(self, q: float, snapshot: Optional[Dict[str, object]] = None) -> Optional[float]:
+        """Cuantil aproximado por interpolación lineal dentro del bucket"""
+        snapshot = snapshot or self.snapshot()
+        count = snapshot['count']
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        lower = 0.0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), snapshot['counts']):
+            if bucket_count and seen + bucket_count >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = bound
+        return lower
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Conteo, media y percentiles aproximados en milisegundos"""
+        snapshot = self.snapshot()
+        count = snapshot['count']
+
+        def ms(value):
+            return value * 1000 if value is not None else None
+
+        return {
+            'count': count,
+            'mean_ms': ms(snapshot['sum'] / count) if count else None,
+            'p50_ms': ms(self.quantile(0.50, snapshot)),
+            'p95_ms': ms(self.quantile(0.95, snapshot)),
+            'p99_ms': ms(self.quantile(0.99, snapshot)),
+        }
+
+
+class Counter:
+    """Contador monótono con etiquetas; un dict por hilo, sumados al leer"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        """Suma `amount` a la serie con esas etiquetas"""
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        """Total por combinación de etiquetas"""
+        totals: Dict[Tuple[str, ...], float] = {}
+        for shard in list(self._shards):
+            # copy() es atómico bajo el GIL aunque el hilo dueño agregue claves
+            for labels, value in shard.copy().items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def total(self) -> float:
+        """Suma de todas las series"""
+        return sum(self.values().values())
+
+
+class HistogramFamily:
+    """Un Histogram por valor de etiqueta (por ejemplo, por endpoint)"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value: str) -> Histogram:
+        """Histograma de `value`, creado la primera vez que aparece"""
+        histogram = self.histograms.get(value)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(value, Histogram(self.buckets))
+        return histogram
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas expuestas en /metrics
+
+    Las fuentes se leen solo al renderizar: los contadores y histogramas no
+    hacen trabajo extra en el camino caliente, y los gauges son funciones que
+    se evalúan en cada scrape.
+    """
+
+    def __init__(self):
+        self._metrics: List[tuple] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                counter: Optional[Counter] = None) -> Counter:
+        """Registra (o crea) un Counter"""
+        counter = counter or Counter()
+        self._metrics.append(('counter', name, help_text, tuple(labelnames), counter.values))
+        return counter
+
+    def counter_function(self, name: str, help_text: str, fn: Callable[[], Any],
+                         labelnames: Sequence[str] = ()):
+        """Contador cuyo valor lleva otro objeto (fn retorna un número o {etiquetas: número})"""
+        self._metrics.append(('counter', name, help_text, tuple(labelnames), fn))
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], Any],
+              labelnames: Sequence[str] = ()):
+        """Gauge calculado al vuelo (fn retorna un número, None o {etiquetas: número})"""
+        self._metrics.append(('gauge', name, help_text, tuple(labelnames), fn))
+
+    def histograms(self, name: str, help_text: str, labelname: str,
+                   source: Callable[[], Dict[str, Histogram]]):
+        """Histogramas por valor de etiqueta; source retorna {valor: Histogram}"""
+        self._metrics.append(('histogram', name, help_text, (labelname,), source))
+
+    def histogram_family(self, name: str, help_text: str, labelname: str,
+                         buckets: Sequence[float] = DEFAULT_BUCKETS) -> HistogramFamily:
+        """Crea y registra una HistogramFamily"""
+        family = HistogramFamily(buckets)
+        self.histograms(name, help_text, labelname, lambda: family.histograms)
+        return family
+
+    @staticmethod
+    def _series(value: Any) -> Iterable[Tuple[Tuple[Any, ...], Any]]:
+        if isinstance(value, dict):
+            return value.items()
+        return [((), value)]
+
+    def render(self) -> str:
+        """Texto en formato de exposición de Prometheus (versión 0.0.4)"""
+        lines: List[str] = []
+        for kind, name, help_text, labelnames, source in self._metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'histogram':
+                for label_value, histogram in sorted(source().items()):
+                    # Las series vacías (p. ej. etapas sin medir) se omiten
+                    if histogram.snapshot()['count'] == 0:
+                        continue
+                    self._render_histogram(lines, name, labelnames, (label_value,), histogram)
+                continue
+            for labels, value in self._series(source()):
+                if value is None:
+                    continue
+                if not isinstance(labels, tuple):
+                    labels = (labels,)
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(lines: List[str], name: str, labelnames: Tuple[str, ...],
+                          labels: Tuple[Any, ...], histogram: Histogram):
+        snapshot = histogram.snapshot()
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float('inf'),), snapshot['counts']):
+            cumulative += count
+            bucket_labels = _format_labels(labelnames + ('le',), labels + (_format_value(bound),))
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+        base_labels = _format_labels(labelnames, labels)
+        lines.append(f"{name}_sum{base_labels} {_format_value(snapshot['sum'])}")
+        lines.append(f"{name}_count{base_labels} {snapshot['count']}")
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: latencia por endpoint, peticiones por estado y en curso
+
+    El endpoint se etiqueta con la plantilla de la ruta ("/chat"), no con la
+    URL, para que la cardinalidad no crezca con rutas inexistentes.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry, prefix: str = 'chat_'):
+        self.app = app
+        self.requests = registry.counter(
+            f'{prefix}http_requests_total', 'Peticiones HTTP por endpoint, método y estado',
+            ('endpoint', 'method', 'status'))
+        self.latency = registry.histogram_family(
+            f'{prefix}http_request_duration_seconds', 'Latencia de las peticiones HTTP por endpoint',
+            'endpoint')
+        self._started = Counter()
+        self._finished = Counter()
+        registry.gauge(f'{prefix}http_requests_in_flight', 'Peticiones HTTP en curso',
+                       lambda: self._started.total() - self._finished.total())
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        self._started.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._finished.inc()
+            route = scope.get('route')
+            endpoint = getattr(route, 'path', None) or 'unmatched'
+            self.latency.labels(endpoint).observe(elapsed)
+            self.requests.inc((endpoint, scope.get('method', ''), str(status[0])))
+
+
+class _Stage:
+    """Context manager que suma la duración de una etapa a su StageTimer"""
+    __slots__ = ('durations', 'name', 'start')
+
+    def __init__(self, durations: Dict[str, float], name: str):
+        self.durations = durations
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.durations[self.name] = self.durations.get(self.name, 0.0) + elapsed
+        return False
+
+
+class StageTimer:
+    """Duraciones por etapa de una petición"""
+    enabled = True
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    def stage(self, name: str) -> _Stage:
+        """Context manager que mide la etapa `name` (se acumula si se repite)"""
+        return _Stage(self.durations, name)
+
+    def elapsed(self) -> float:
+        """Segundos desde que se creó el timer"""
+        return time.perf_counter() - self._start
+
+    def as_ms(self) -> Dict[str, float]:
+        """Duraciones en milisegundos, incluido el total"""
+        timings = {name: seconds * 1000 for name, seconds in self.durations.items()}
+        timings['total'] = self.elapsed() * 1000
+        return timings
+
+
+class _NullStage:
+    """Etapa vacía: no mide nada"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _NullTimer:
+    """Timer desactivado: todas las etapas comparten un context manager vacío"""
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name: str) -> _NullStage:
+        return self._stage
+
+
+NULL_TIMER = _NullTimer()
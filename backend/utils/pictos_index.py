@@ -0,0 +1,154 @@
+"""
+Índice precompilado de pictogramas en disco
+
+El mapeo término -> pictogramas construido desde los datasets ARASAAC se
+guarda una sola vez como arreglos NumPy (.npy) en un directorio versionado
+por la huella (blake2b del contenido) de los archivos fuente. Los siguientes arranques lo abren con
+mmap en milisegundos en lugar de volver a recorrer todo el corpus.
+
+Estructura en disco (un directorio por versión):
+    v<formato>-<huella>/keys.npy    términos ordenados, unidos por '\\n' (uint8)
+    v<formato>-<huella>/indptr.npy  inicio de los pictogramas de cada término
+    v<formato>-<huella>/ids.npy     ids de pictogramas concatenados
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from bisect import bisect_left
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Versión del formato en disco; cambiarla fuerza la reconstrucción del índice
+# v2: los términos de varias palabras conservan un espacio entre tokens
+INDEX_FORMAT_VERSION = 2
+
+_KEY_SEPARATOR = "\n"
+
+
+def source_fingerprint(paths: List[str]) -> str:
+    """
+    Huella del contenido de los archivos fuente
+
+    Se hashea el contenido y no (tamaño, fecha): una edición del mismo tamaño
+    que conserva la fecha (cp -p, tar, git checkout) también invalida el índice.
+    """
+    digest = hashlib.blake2b(f"v{INDEX_FORMAT_VERSION}".encode(), digest_size=8)
+    for path in paths:
+        digest.update(f"|{Path(path).name}:".encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class PictoIndex(Mapping):
+    """Mapeo de solo lectura término -> ids de pictogramas respaldado por arreglos"""
+
+    def __init__(self, keys: List[str], indptr: np.ndarray, ids: np.ndarray):
+        self.keys_sorted = keys
+        self.indptr = indptr
+        self.ids = ids
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, List[int]]) -> "PictoIndex":
+        """Compila un diccionario de mapeo al formato de arreglos ordenados"""
+        keys = sorted(mapping)
+        indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        ids: List[int] = []
+        for i, key in enumerate(keys):
+            ids.extend(mapping[key])
+            indptr[i + 1] = len(ids)
+        return cls(keys, indptr, np.array(ids, dtype=np.int64))
+
+    def _position(self, key: str) -> int:
+        i = bisect_left(self.keys_sorted, key)
+        if i < len(self.keys_sorted) and self.keys_sorted[i] == key:
+            return i
+        return -1
+
+    def __getitem__(self, key: str) -> List[int]:
+        i = self._position(key)
+        if i < 0:
+            raise KeyError(key)
+        return self.ids[self.indptr[i]:self.indptr[i + 1]].tolist()
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._position(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys_sorted)
+
+    def __len__(self) -> int:
+        return len(self.keys_sorted)
+
+    def save(self, directory: Path):
+        """Escribe los arreglos del índice en un directorio"""
+        directory.mkdir(parents=True, exist_ok=True)
+        blob = _KEY_SEPARATOR.join(self.keys_sorted).encode("utf-8")
+        np.save(directory / "keys.npy", np.frombuffer(blob, dtype=np.uint8))
+        np.save(directory / "indptr.npy", self.indptr)
+        np.save(directory / "ids.npy", self.ids)
+
+    @classmethod
+    def load(cls, directory: Path) -> "PictoIndex":
+        """Abre un índice guardado; los arreglos de ids se mapean en memoria"""
+        indptr = np.load(directory / "indptr.npy", mmap_mode="r")
+        ids = np.load(directory / "ids.npy", mmap_mode="r")
+        blob = np.load(directory / "keys.npy", mmap_mode="r")
+        keys = bytes(blob).decode("utf-8").split(_KEY_SEPARATOR) if len(indptr) > 1 else []
+        if len(keys) != len(indptr) - 1:
+            raise ValueError(f"Índice de pictogramas corrupto en {directory}")
+        return cls(keys, indptr, ids)
+
+
+def load_or_build_index(sources: List[str],
+                        build: Callable[[], Optional[Dict[str, List[int]]]],
+                        index_dir: str) -> Optional[PictoIndex]:
+    """
+    Carga el índice precompilado de los archivos fuente o lo construye y guarda
+
+    Args:
+        sources: Archivos de los que depende el índice (su huella versiona el caché)
+        build: Función que construye el mapeo desde cero; None si no es posible
+        index_dir: Directorio base donde se guardan los índices
+
+    Returns:
+        Índice listo para consultar, o None si build() no pudo construirlo
+    """
+    if not all(Path(p).exists() and Path(p).stat().st_size > 0 for p in sources):
+        return None
+
+    base_dir = Path(index_dir)
+    version_name = f"v{INDEX_FORMAT_VERSION}-{source_fingerprint(sources)}"
+    target = base_dir / version_name
+
+    if target.is_dir():
+        try:
+            return PictoIndex.load(target)
+        except (OSError, ValueError) as e:
+            print(f"Índice de pictogramas inválido en {target}, reconstruyendo: {e}")
+
+    mapping = build()
+    if not mapping:
+        return None
+
+    index = PictoIndex.from_mapping(mapping)
+    try:
+        base_dir.mkdir(parents=True, exist_ok=True)
+        # Escribir en un directorio temporal y renombrar: nunca queda un índice a medias
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=base_dir))
+        index.save(tmp_dir)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp_dir, target)
+        for stale in base_dir.glob("v*-*"):
+            if stale.name != version_name:
+                shutil.rmtree(stale, ignore_errors=True)
+        print(f"Índice de pictogramas guardado en {target}")
+    except OSError as e:
+        # Sistemas de archivos de solo lectura (p. ej. serverless): usar el índice en memoria
+        print(f"No se pudo guardar el índice de pictogramas en {base_dir}: {e}")
+    return index
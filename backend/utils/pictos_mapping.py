@@ -1,14 +1,25 @@
 import json
+import os
 import re
+import threading
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Set, Optional
+from typing import List, Dict, Mapping, Set, Optional, Tuple
 from unidecode import unidecode
+from utils.pictos_index import load_or_build_index
+from utils.json_stream import iter_json_array
+from utils.token_automaton import TokenAutomaton
+from utils.prefix_index import PrefixIndex
+from utils.fuzzy_index import DeletionIndex
+from utils.lru_cache import LRUCache, MISSING
 
 # Archivos de datasets ARASAAC - usar rutas relativas al archivo actual
 _current_dir = Path(__file__).parent.parent  # Ir al directorio backend
 DATASET_PICTO_FILE = str(_current_dir / "dataset_picto.json")
 DATASET_WORDS_FILE = str(_current_dir / "dataset_words.json")
 MAPPING_FILE = str(_current_dir / "pictos_mapping.json")  # Fallback file
+# Índice precompilado de los datasets ARASAAC (en serverless apuntar a /tmp)
+PICTOS_INDEX_DIR = os.environ.get("PICTOS_INDEX_DIR", str(_current_dir / "pictos_index"))
 
 # Mapeo de fallback para casos donde no hay archivo o falla la carga
 DEFAULT_MAPPING = {
@@ -27,6 +38,47 @@ DEFAULT_MAPPING = {
     "dormir": [2369, 6479],
 }
 
+# Caché de pictogramas por texto normalizado (0 lo desactiva)
+PICTOS_CACHE_SIZE = int(os.environ.get("PICTOS_CACHE_SIZE", "4096"))
+
+# Corrección de errores de escritura cuando la búsqueda exacta no encuentra nada
+# (PICTOS_FUZZY=0 la desactiva). Las palabras del vocabulario conocido
+# (dataset_words.json y los términos del mapeo) nunca se corrigen: "cosa" está
+# bien escrita aunque no tenga pictograma, no es un error de "casa"
+PICTOS_FUZZY = os.environ.get("PICTOS_FUZZY", "1") != "0"
+
+# Palabras finales del texto que se prueban como prefijo de un término de varias palabras
+MAX_SUGGEST_WORDS = 3
+
+# Memo de normalize() para los tokens más frecuentes
+NORMALIZE_CACHE_SIZE = int(os.environ.get("PICTOS_NORMALIZE_CACHE", "65536"))
+
+# Normalización de tokens: minúsculas, transliteración (unidecode) y solo [a-z0-9].
+# unidecode traduce carácter por carácter, así que para el rango latino (ASCII,
+# Latin-1 y Latin Extended-A/B, que cubre el español) el resultado de cada
+# carácter se precalcula en una tabla para str.translate; unidecode solo se usa
+# si el token trae caracteres fuera de ese rango.
+_TOKEN_FILTER = re.compile(r"[^a-z0-9áéíóúñ]")
+_LATIN_END = "\u0250"
+_LATIN_TABLE = {
+    cp: _TOKEN_FILTER.sub("", unidecode(chr(cp))) or None
+    for cp in range(ord(_LATIN_END))
+    if _TOKEN_FILTER.sub("", unidecode(chr(cp))) != chr(cp)
+}
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_token(token: str) -> str:
+    """
+    Normalizar un token para búsqueda ("Niño," -> "nino")
+    
+    Memoizado con functools.lru_cache (en C, sin lock de Python): el costo de
+    un acierto debe quedar por debajo del de normalizar de nuevo.
+    """
+    token = token.lower()
+    if not token or max(token) < _LATIN_END:
+        return token.translate(_LATIN_TABLE)
+    return _TOKEN_FILTER.sub("", unidecode(token))
+
 STOP_WORDS = {"por", "la", "el", "de", "a", "y", "en", "un", "una", "al", "lo", "con", "que", "es", "se"}
 
 class PictosMapper:
@@ -39,15 +91,39 @@ class PictosMapper:
         Args:
             mapping_file: Ruta al archivo JSON con el mapeo. Si None, usa MAPPING_FILE por defecto
         """
-        self.mapping = self._load_mapping(mapping_file or MAPPING_FILE)
+        self._init_state(self._load_mapping(mapping_file or MAPPING_FILE))
     
-    def _load_mapping(self, mapping_file: str) -> Dict[str, List[int]]:
+    def _init_state(self, mapping: Mapping[str, List[int]]):
+        """Mapeo, cachés e índices perezosos propios de esta instancia (con sus locks)"""
+        self.mapping = mapping
+        self._pictos_cache = LRUCache(maxsize=PICTOS_CACHE_SIZE)
+        self._corrections_cache = LRUCache(maxsize=PICTOS_CACHE_SIZE)
+        
+        # Autómata de frases (términos de varias palabras), construido en el primer uso
+        self._phrase_automaton: Optional[TokenAutomaton] = None
+        self._phrase_automaton_ready = False
+        self._phrase_lock = threading.Lock()
+        
+        # Índices de autocompletado y de corrección sobre los términos normalizados,
+        # construidos una vez; los alias llevan al término original cuando difiere
+        self._prefix_index: Optional[PrefixIndex] = None
+        self._fuzzy_index: Optional[DeletionIndex] = None
+        self._known_words: Optional[Set[str]] = None
+        self._term_aliases: Optional[Dict[str, str]] = None
+        self._index_lock = threading.Lock()
+    
+    def _load_mapping(self, mapping_file: str) -> Mapping[str, List[int]]:
         """Cargar mapeo desde archivo JSON o construir desde datasets ARASAAC"""
         
-        # Prioridad 1: Intentar cargar desde datasets ARASAAC completos
-        arasaac_mapping = self._build_from_arasaac_datasets()
+        # Prioridad 1: Índice precompilado de los datasets ARASAAC (se construye
+        # una sola vez y se reutiliza mientras los archivos fuente no cambien)
+        arasaac_mapping = load_or_build_index(
+            [DATASET_PICTO_FILE, DATASET_WORDS_FILE],
+            self._build_from_arasaac_datasets,
+            PICTOS_INDEX_DIR
+        )
         if arasaac_mapping:
-            print(f"Mapeo construido desde datasets ARASAAC: {len(arasaac_mapping)} términos")
+            print(f"Mapeo cargado desde datasets ARASAAC: {len(arasaac_mapping)} términos")
             return arasaac_mapping
         
         # Prioridad 2: Intentar cargar desde archivo de mapeo existente
@@ -81,18 +157,12 @@ class PictosMapper:
             
             print("🔍 Construyendo mapeo desde datasets ARASAAC...")
             
-            # Cargar pictogramas
-            with open(picto_file, 'r', encoding='utf-8') as f:
-                pictos_data = json.load(f)
-            
-            if not isinstance(pictos_data, list):
-                return None
-            
-            # Construir mapeo
+            # Recorrer los pictogramas uno a uno sin cargar el JSON completo:
+            # el pico de memoria queda acotado por el mapeo, no por el archivo
             mapping = {}
             processed_pictos = 0
             
-            for picto in pictos_data:
+            for picto in iter_json_array(str(picto_file)):
                 if not isinstance(picto, dict):
                     continue
                 
@@ -106,7 +176,7 @@ class PictosMapper:
                 
                 # Mapear cada keyword al pictograma
                 for keyword in keywords:
-                    keyword_clean = self.normalize(keyword)
+                    keyword_clean = self.normalize_phrase(keyword)
                     if keyword_clean and keyword_clean not in STOP_WORDS:
                         if keyword_clean not in mapping:
                             mapping[keyword_clean] = []
@@ -165,38 +235,243 @@ class PictosMapper:
     @staticmethod
     def normalize(token: str) -> str:
         """Normalizar token para búsqueda"""
-        token = token.lower().strip()
-        token = unidecode(token)
-        token = re.sub(r"[^a-z0-9áéíóúñ]", "", token)
-        return token
+        return normalize_token(token)
+    
+    @classmethod
+    def normalize_phrase(cls, phrase: str) -> str:
+        """Normalizar un término de una o varias palabras (tokens unidos por un espacio)"""
+        return " ".join(t for t in (cls.normalize(tok) for tok in phrase.split()) if t)
     
     def get_pictos(self, term: str, limit: int = 3) -> List[int]:
-        """Obtener pictogramas para un término específico"""
-        normalized = self.normalize(term)
+        """Obtener pictogramas para un término específico (con corrección si no hay coincidencia exacta)"""
+        return self.lookup(term, limit)[0]
+    
+    def lookup(self, term: str, limit: int = 3) -> Tuple[List[int], Optional[Dict[str, any]]]:
+        """
+        Pictogramas de un término y, si hubo que corregirlo, la corrección aplicada
+        
+        La búsqueda aproximada solo corre cuando la exacta no encuentra nada.
+        
+        Returns:
+            (pictogramas, corrección) donde corrección es None o
+            {'input': término normalizado, 'term': término del mapeo, 'distance': n}
+        """
+        normalized = self.normalize_phrase(term)
         if not normalized or normalized in STOP_WORDS:
-            return []
-        return self.mapping.get(normalized, [])[:limit]
+            return [], None
+        pictos = self.mapping.get(normalized)
+        if not pictos:
+            # Forma normalizada de una clave con tildes: "nino" -> "niño"
+            alias = self.get_term_aliases().get(normalized)
+            if alias is not None:
+                pictos = self.mapping.get(alias)
+        if pictos:
+            return pictos[:limit], None
+        if not PICTOS_FUZZY:
+            return [], None
+        
+        match = self.correct(normalized)
+        if match is None:
+            return [], None
+        key, distance = match
+        correction = {'input': normalized, 'term': key, 'distance': distance} if distance else None
+        return self.mapping[key][:limit], correction
+    
+    @staticmethod
+    def _max_typo_distance(token: str) -> int:
+        """Errores admitidos según el largo: ninguno hasta 3 letras, 1 hasta 5 y luego 2"""
+        if len(token) <= 3 or not token.isalpha():
+            return 0
+        return 1 if len(token) <= 5 else 2
+    
+    def correct(self, normalized: str) -> Optional[Tuple[str, int]]:
+        """Término del mapeo más cercano a una palabra mal escrita: (clave, distancia) o None"""
+        max_distance = self._max_typo_distance(normalized)
+        if not max_distance:
+            return None
+        # Las palabras desconocidas se repiten mucho ("kiero"): recordar el resultado
+        match = self._corrections_cache.get(normalized)
+        if match is MISSING:
+            index = self.get_fuzzy_index()
+            # Una palabra real sin pictograma no es un error de escritura
+            if normalized in self._known_words:
+                match = None
+            else:
+                match = index.lookup(normalized, max_distance)
+            if match is not None:
+                term, distance = match
+                match = (self._term_aliases.get(term, term), distance)
+            self._corrections_cache.put(normalized, match)
+        return match
     
     def map_tokens(self, tokens: List[str], max_pictos: int = 10) -> List[int]:
         """Mapear lista de tokens a pictogramas"""
+        return self._map_tokens_detailed(tokens, max_pictos)[0]
+    
+    def _map_tokens_detailed(self, tokens: List[str], max_pictos: int) -> Tuple[List[int], List[Dict[str, any]]]:
+        """Pictogramas de los tokens y las correcciones aplicadas"""
         results: List[int] = []
+        corrections: List[Dict[str, any]] = []
         seen: Set[int] = set()
         
         for token in tokens:
-            pictos = self.get_pictos(token)
+            pictos, correction = self.lookup(token)
+            if correction is not None:
+                corrections.append(correction)
             for picto_id in pictos:
                 if picto_id not in seen:
                     results.append(picto_id)
                     seen.add(picto_id)
                 if len(results) >= max_pictos:
-                    return results
+                    return results, corrections
         
-        return results
+        return results, corrections
     
     def map_text(self, text: str, max_pictos: int = 10) -> List[int]:
         """Mapear texto completo a pictogramas"""
-        tokens = text.split()
-        return self.map_tokens(tokens, max_pictos=max_pictos)
+        return self.map_text_detailed(text, max_pictos)[0]
+    
+    def map_text_detailed(self, text: str, max_pictos: int = 10) -> Tuple[List[int], List[Dict[str, any]]]:
+        """
+        Mapear texto a pictogramas informando las palabras corregidas
+        
+        Returns:
+            (pictogramas, correcciones) con una corrección por palabra mal escrita
+        """
+        # La normalización de tokens ignora mayúsculas y espacios repetidos
+        key = (" ".join(text.lower().split()), max_pictos)
+        cached = self._pictos_cache.get(key)
+        if cached is MISSING:
+            cached = self._map_tokens_detailed(self.segment(text), max_pictos=max_pictos)
+            self._pictos_cache.put(key, cached)
+        pictos, corrections = cached
+        return list(pictos), [dict(c) for c in corrections]
+    
+    def cache_stats(self) -> Dict[str, any]:
+        """Contadores del caché de pictogramas"""
+        return self._pictos_cache.stats()
+    
+    def segment(self, text: str) -> List[str]:
+        """
+        Dividir el texto en términos normalizados del mapeo
+        
+        Los términos de varias palabras ("chocolate caliente") se reconocen en
+        una sola pasada con el autómata de frases, eligiendo siempre la
+        coincidencia más larga; el resto del texto queda como tokens sueltos.
+        """
+        tokens = [t for t in (self.normalize(tok) for tok in text.split()) if t]
+        automaton = self._get_phrase_automaton()
+        if automaton is None or len(tokens) < 2:
+            return tokens
+        
+        terms: List[str] = []
+        position = 0
+        for start, end, phrase in automaton.longest_matches(tokens):
+            terms.extend(tokens[position:start])
+            terms.append(phrase)
+            position = end
+        terms.extend(tokens[position:])
+        return terms
+    
+    def _get_phrase_automaton(self) -> Optional[TokenAutomaton]:
+        """Construir (una vez) el autómata con los términos de varias palabras"""
+        if not self._phrase_automaton_ready:
+            with self._phrase_lock:
+                if not self._phrase_automaton_ready:
+                    automaton = TokenAutomaton()
+                    for key in self.mapping:
+                        if " " in key:
+                            automaton.add(key.split(" "), key)
+                    automaton.build()
+                    self._phrase_automaton = automaton if automaton.num_patterns else None
+                    self._phrase_automaton_ready = True
+        return self._phrase_automaton
+    
+    def _normalized_terms(self) -> List[str]:
+        """
+        Términos del mapeo normalizados; se llama con _index_lock tomado
+        
+        Los alias apuntan a la clave original cuando difiere de su forma
+        normalizada (p. ej. "niño" en el mapeo por defecto).
+        """
+        terms: List[str] = []
+        aliases: Dict[str, str] = {}
+        for key in self.mapping:
+            normalized = self.normalize_phrase(key)
+            terms.append(normalized)
+            if normalized != key:
+                aliases[normalized] = key
+        if self._term_aliases is None:
+            self._term_aliases = aliases
+        return terms
+    
+    def get_term_aliases(self) -> Dict[str, str]:
+        """Alias normalizado -> clave original del mapeo, construidos una vez"""
+        if self._term_aliases is None:
+            with self._index_lock:
+                if self._term_aliases is None:
+                    self._normalized_terms()
+        return self._term_aliases
+    
+    def get_prefix_index(self) -> PrefixIndex:
+        """Construir (una vez) el índice de autocompletado sobre los términos del mapeo"""
+        if self._prefix_index is None:
+            with self._index_lock:
+                if self._prefix_index is None:
+                    self._prefix_index = PrefixIndex(self._normalized_terms())
+        return self._prefix_index
+    
+    def get_fuzzy_index(self) -> DeletionIndex:
+        """
+        Construir (una vez) el índice de borrados de los términos de una palabra
+        
+        Junto con él se arma el vocabulario conocido que correct() no corrige.
+        """
+        if self._fuzzy_index is None:
+            with self._index_lock:
+                if self._fuzzy_index is None:
+                    terms = self._normalized_terms()
+                    self._known_words = self._load_known_words(terms)
+                    self._fuzzy_index = DeletionIndex([term for term in terms if " " not in term])
+        return self._fuzzy_index
+    
+    def _load_known_words(self, terms: List[str]) -> Set[str]:
+        """Tokens normalizados de dataset_words.json y de los términos del mapeo"""
+        known = {token for term in terms for token in term.split(" ")}
+        if Path(DATASET_WORDS_FILE).exists():
+            try:
+                for word in iter_json_array(DATASET_WORDS_FILE, key='words'):
+                    known.update(t for t in (self.normalize(tok) for tok in str(word).split()) if t)
+            except (OSError, ValueError) as e:
+                print(f"No se pudo leer el vocabulario de {DATASET_WORDS_FILE}: {e}")
+        return known
+    
+    def suggest(self, text: str, limit: int = 8, pictos_per_term: int = 3) -> List[Dict[str, any]]:
+        """
+        Sugerencias de pictogramas para un texto a medio escribir
+        
+        Completa la última palabra (o las últimas, si forman el inicio de un
+        término de varias palabras como "chocolate cal") con los términos del
+        mapeo que empiezan así, los más cortos primero.
+        
+        Args:
+            text: Texto escrito hasta ahora
+            limit: Máximo de términos sugeridos
+            pictos_per_term: Máximo de pictogramas por término
+            
+        Returns:
+            Lista de {'term', 'pictos'} en orden de relevancia
+        """
+        tokens = [t for t in (self.normalize(tok) for tok in text.split()) if t]
+        if not tokens:
+            return []
+        index = self.get_prefix_index()
+        for start in range(max(0, len(tokens) - MAX_SUGGEST_WORDS), len(tokens)):
+            terms = index.complete(" ".join(tokens[start:]), limit)
+            if terms:
+                keys = [self._term_aliases.get(term, term) for term in terms]
+                return [{'term': key, 'pictos': list(self.mapping[key][:pictos_per_term])} for key in keys]
+        return []
     
     def get_picto_url(self, picto_id: int, size: str = "300") -> str:
         """Generar URL de imagen del pictograma"""
@@ -219,7 +494,7 @@ class PictosMapper:
             'language': 'es',
             'generated_terms': len(self.mapping),
             'mapping_size': sum(len(v) for v in self.mapping.values()),
-            'mapping': self.mapping
+            'mapping': dict(self.mapping)
         }
         with open(path, 'w', encoding='utf-8') as f:
             json.dump(payload, f, ensure_ascii=False, indent=2)
@@ -253,23 +528,52 @@ class PictoMapper(PictosMapper):
                         converted_values.append(val)
                 converted_mapping[key] = converted_values
             
-            # Crear instancia temporal para extraer el mapping
-            temp_mapper = PictosMapper()
-            temp_mapper.mapping = converted_mapping
-            self.mapping = temp_mapper.mapping
+            # Usar el mapeo recibido directamente, sin reconstruir el corpus
+            self._init_state(converted_mapping)
         else:
             super().__init__()
 
+# Mapeador compartido por todo el proceso: se construye una sola vez, de forma
+# perezosa, y las consultas posteriores son solo búsquedas en el diccionario
+_shared_mapper: Optional[PictosMapper] = None
+_shared_mapper_lock = threading.Lock()
+
+def get_shared_mapper() -> PictosMapper:
+    """Retorna el mapeador compartido, creándolo en el primer uso (thread-safe)"""
+    global _shared_mapper
+    mapper = _shared_mapper
+    if mapper is None:
+        with _shared_mapper_lock:
+            if _shared_mapper is None:
+                _shared_mapper = PictosMapper()
+            mapper = _shared_mapper
+    return mapper
+
+def peek_shared_mapper() -> Optional[PictosMapper]:
+    """Mapeador compartido si ya se construyó, sin construirlo (para estado y métricas)"""
+    return _shared_mapper
+
+def reload_shared_mapper() -> PictosMapper:
+    """
+    Reconstruye el mapeador compartido (p. ej. tras actualizar los datasets)
+    
+    El nuevo mapeador se construye fuera del lock; quienes ya tienen una
+    referencia al anterior terminan de usarlo sin ver un estado intermedio.
+    """
+    global _shared_mapper
+    mapper = PictosMapper()
+    with _shared_mapper_lock:
+        _shared_mapper = mapper
+    return mapper
+
 # Funciones de compatibilidad
 def get_pictos_for_text(text: str) -> List[int]:
     """Función de compatibilidad"""
-    mapper = PictosMapper()
-    return mapper.map_text(text)
+    return get_shared_mapper().map_text(text)
 
 def get_picto_objs(text: str) -> List[Dict[str, any]]:
     """Función de compatibilidad"""
-    mapper = PictosMapper()
-    return mapper.map_text_with_urls(text)
+    return get_shared_mapper().map_text_with_urls(text)
 
 if __name__ == "__main__":
     # Prueba del mapeador
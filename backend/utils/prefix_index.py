@@ -0,0 +1,68 @@
+"""
+Índice de autocompletado por prefijo
+
+Los términos normalizados se guardan en un arreglo ordenado: todos los que
+empiezan con un prefijo forman un rango contiguo que se ubica con dos
+búsquedas binarias, sin recorrer el mapeo completo en cada tecla.
+
+Los prefijos muy cortos ("a", "ca") abarcan miles de términos, así que para
+ellos el ranking (términos más cortos primero) se precalcula al construir
+el índice; los prefijos más largos ordenan solo su rango, que es pequeño.
+"""
+from bisect import bisect_left
+from typing import Dict, Iterable, List
+
+# Largo máximo de los prefijos con ranking precalculado
+PREFIX_TABLE_DEPTH = 3
+# Términos guardados por prefijo precalculado
+PREFIX_TABLE_SIZE = 32
+# Términos revisados como máximo para rankear un prefijo largo
+MAX_SCAN = 1000
+
+# Mayor que cualquier carácter: cierra el rango de un prefijo
+_HIGHEST = chr(0x10FFFF)
+
+
+class PrefixIndex:
+    """Autocompletado sobre términos ordenados, rankeados por largo y luego alfabéticamente"""
+
+    def __init__(self, terms: Iterable[str], table_depth: int = PREFIX_TABLE_DEPTH,
+                 table_size: int = PREFIX_TABLE_SIZE, max_scan: int = MAX_SCAN):
+        self.terms: List[str] = sorted({term for term in terms if term})
+        self.table_depth = table_depth
+        self.table_size = table_size
+        self.max_scan = max_scan
+
+        self._top: Dict[str, List[str]] = {}
+        for term in self.terms:
+            for n in range(1, min(table_depth, len(term)) + 1):
+                self._top.setdefault(term[:n], []).append(term)
+        for prefix, candidates in self._top.items():
+            candidates.sort(key=self._rank)
+            del candidates[table_size:]
+
+    @staticmethod
+    def _rank(term: str):
+        return len(term), term
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def complete(self, prefix: str, limit: int = 8) -> List[str]:
+        """
+        Términos que empiezan con `prefix`, los más cortos primero
+
+        Args:
+            prefix: Prefijo ya normalizado
+            limit: Máximo de términos a retornar
+        """
+        if not prefix or limit <= 0:
+            return []
+        if len(prefix) <= self.table_depth and limit <= self.table_size:
+            return self._top.get(prefix, [])[:limit]
+
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix + _HIGHEST, lo=start)
+        candidates = self.terms[start:min(end, start + self.max_scan)]
+        candidates.sort(key=self._rank)
+        return candidates[:limit]
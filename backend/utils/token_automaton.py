@@ -0,0 +1,89 @@
+"""
+Autómata Aho-Corasick sobre secuencias de tokens
+
+Los patrones son secuencias de tokens ya normalizados (por ejemplo
+["chocolate", "caliente"]). Una sola pasada lineal sobre los tokens del
+mensaje encuentra todas las apariciones de todos los patrones, respetando
+los límites de palabra por construcción.
+"""
+from collections import deque
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+
+class TokenAutomaton:
+    """Buscador multipatrón de secuencias de tokens (Aho-Corasick)"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Por estado: patrones que terminan en él como (longitud, payload)
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+        self._built = True
+        self.num_patterns = 0
+
+    def add(self, tokens: Sequence[str], payload: Any):
+        """Agrega un patrón; requiere volver a llamar a build() antes de buscar"""
+        if not tokens:
+            return
+        state = 0
+        for token in tokens:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][token] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(tokens), payload))
+        self.num_patterns += 1
+        self._built = False
+
+    def build(self):
+        """Calcula los enlaces de fallo por BFS y propaga las salidas"""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                # Los patrones más cortos que terminan aquí vienen del estado de fallo
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        self._built = True
+
+    def iter_matches(self, tokens: Sequence[str]) -> Iterator[Tuple[int, int, Any]]:
+        """Genera cada aparición como (inicio, fin, payload), con fin exclusivo"""
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, token in enumerate(tokens, start=1):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for length, payload in output[state]:
+                yield end - length, end, payload
+
+    def longest_matches(self, tokens: Sequence[str]) -> List[Tuple[int, int, Any]]:
+        """Apariciones sin solapamiento, eligiendo la más a la izquierda y más larga"""
+        best_end: Dict[int, Tuple[int, Any]] = {}
+        for start, end, payload in self.iter_matches(tokens):
+            if start not in best_end or end > best_end[start][0]:
+                best_end[start] = (end, payload)
+
+        matches = []
+        position = 0
+        for start in sorted(best_end):
+            if start < position:
+                continue
+            end, payload = best_end[start]
+            matches.append((start, end, payload))
+            position = end
+        return matches
@@ -1,4 +1,4 @@
-import { useState, KeyboardEvent, useEffect } from "react";
+import { useState, KeyboardEvent, useEffect, useRef } from "react";
 
 interface Message {
   id: string;
@@ -31,16 +31,118 @@ const initialMessages: Record<string, Message[]> = {
 
 const pictograms = ["😊", "❤️", "🎉", "🌈", "🦄", "🎈", "⭐", "🎨"];
 
+// Detectar si estamos en producción (Vercel) o desarrollo
+const isProduction = () =>
+  window.location.hostname !== 'localhost' && window.location.hostname !== '127.0.0.1';
+
+// Canal WebSocket del backend local (Vercel no mantiene conexiones abiertas: allí se usa POST)
+const WS_CHAT_URL = 'ws://127.0.0.1:8000/ws/chat';
+
+interface AiReply {
+  response: string;
+  decided_intent: string;
+  best_prob: number;
+  pictos?: string[];
+}
+
+// Frame recibido por /ws/chat: 'reply' trae los mismos campos que POST /chat
+interface SocketFrame extends Partial<AiReply> {
+  type: string;
+  id?: string;
+  detail?: string;
+}
+
 const ChatArea = ({ friendName }: ChatAreaProps) => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputValue, setInputValue] = useState("");
   const [isLoading, setIsLoading] = useState(false);
   const [aiEnabled, setAiEnabled] = useState(true);
+  const socketRef = useRef<WebSocket | null>(null);
+  const pendingRef = useRef<Map<string, (frame: SocketFrame) => void>>(new Map());
 
   useEffect(() => {
     setMessages(initialMessages[friendName] || []);
   }, [friendName]);
 
+  // Una sola conexión por chat: cada mensaje evita la petición HTTP y el preflight de CORS
+  useEffect(() => {
+    if (!aiEnabled || isProduction() || typeof WebSocket === 'undefined') {
+      return;
+    }
+    const socket = new WebSocket(WS_CHAT_URL);
+    const pending = pendingRef.current;
+
+    socket.onmessage = (event) => {
+      const data: SocketFrame = JSON.parse(event.data);
+      const resolve = data.id ? pending.get(data.id) : undefined;
+      if (resolve) {
+        pending.delete(data.id);
+        resolve(data);
+      }
+    };
+    socket.onclose = () => {
+      if (socketRef.current === socket) {
+        socketRef.current = null;
+      }
+      // Los mensajes sin respuesta se reintentan por HTTP
+      pending.forEach((resolve) => resolve({ type: 'closed' }));
+      pending.clear();
+    };
+    socketRef.current = socket;
+
+    return () => {
+      socketRef.current = null;
+      socket.close();
+    };
+  }, [aiEnabled, friendName]);
+
+  const askViaSocket = (text: string): Promise<SocketFrame> | null => {
+    const socket = socketRef.current;
+    if (!socket || socket.readyState !== WebSocket.OPEN) {
+      return null;
+    }
+    const id = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    return new Promise((resolve) => {
+      pendingRef.current.set(id, resolve);
+      socket.send(JSON.stringify({ type: 'message', id, text, include_pictos: true }));
+    });
+  };
+
+  const askViaHttp = async (text: string): Promise<AiReply> => {
+    const apiUrl = isProduction()
+      ? '/api/chat'  // URL relativa para Vercel (mismo dominio)
+      : 'http://127.0.0.1:8000/chat';  // URL local
+
+    const response = await fetch(apiUrl, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        text,
+        include_pictos: true
+      })
+    });
+    if (!response.ok) {
+      throw new Error('Error en la API');
+    }
+    return response.json();
+  };
+
+  const askAi = async (text: string): Promise<AiReply> => {
+    const socketReply = askViaSocket(text);
+    if (socketReply) {
+      const frame = await socketReply;
+      if (frame.type === 'reply') {
+        return frame as AiReply;
+      }
+      if (frame.type === 'error') {
+        throw new Error(frame.detail || 'Error en la API');
+      }
+    }
+    return askViaHttp(text);
+  };
+
   const getCurrentTime = () => {
     const now = new Date();
     return `${now.getHours()}:${now.getMinutes().toString().padStart(2, "0")} ${
@@ -63,40 +165,19 @@ const ChatArea = ({ friendName }: ChatAreaProps) => {
 
       try {
         if (aiEnabled) {
-          // Llamar a la API de IA
-          // Detectar si estamos en producción (Vercel) o desarrollo
-          const isProduction = window.location.hostname !== 'localhost' && window.location.hostname !== '127.0.0.1';
-          const apiUrl = isProduction 
-            ? '/api/chat'  // URL relativa para Vercel (mismo dominio)
-            : 'http://127.0.0.1:8000/chat';  // URL local
-          
-          const response = await fetch(apiUrl, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-              text: currentInput,
-              include_pictos: true
-            })
-          });
-
-          if (response.ok) {
-            const aiData = await response.json();
-            
-            const aiReply: Message = {
-              id: Date.now().toString(),
-              text: aiData.response,
-              sent: false,
-              time: getCurrentTime(),
-              intent: aiData.decided_intent,
-              confidence: aiData.best_prob,
-              pictograms: aiData.pictos ? aiData.pictos.join(' ') : undefined,
-            };
-            setMessages(prevMessages => [...prevMessages, aiReply]);
-          } else {
-            throw new Error('Error en la API');
-          }
+          // Llamar a la API de IA (WebSocket si está abierto, si no POST /chat)
+          const aiData = await askAi(currentInput);
+
+          const aiReply: Message = {
+            id: Date.now().toString(),
+            text: aiData.response,
+            sent: false,
+            time: getCurrentTime(),
+            intent: aiData.decided_intent,
+            confidence: aiData.best_prob,
+            pictograms: aiData.pictos ? aiData.pictos.join(' ') : undefined,
+          };
+          setMessages(prevMessages => [...prevMessages, aiReply]);
         } else {
           // Respuesta simple sin IA
           const replies = [
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la API FastAPI en proceso (sin levantar el servidor)
+"""
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+from utils.executor import PredictionExecutor, PoolSaturated
+
+
+def test_executor_rejects_when_saturated():
+    """Con el pool y la cola llenos, los trabajos nuevos se rechazan de inmediato"""
+    executor = PredictionExecutor(max_workers=1, queue_depth=1, retry_after=7)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturated) as exc_info:
+            await executor.run(lambda: "nunca")
+        assert exc_info.value.retry_after == 7
+        assert executor.stats()['in_flight'] == 2
+
+        release.set()
+        await asyncio.gather(*running)
+        assert await executor.run(lambda: "ok") == "ok"
+
+    asyncio.run(scenario())
+    assert executor.stats()['in_flight'] == 0
+    assert executor.stats()['rejected'] == 1
+    executor.shutdown()
+
+
+def test_chat_returns_503_when_pool_is_full(monkeypatch):
+    """El endpoint /chat responde 503 con Retry-After si el pool está saturado"""
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    import simple_api
+
+    async def saturated(*args):
+        raise PoolSaturated(3)
+
+    client = TestClient(simple_api.app)
+    assert client.post("/chat", json={"text": "hola"}).status_code == 200
+
+    monkeypatch.setattr(simple_api.executor, "run", saturated)
+    response = client.post("/chat", json={"text": "hola"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
+
+
+def test_health_probes_do_not_load_the_model(monkeypatch):
+    """Liveness y readiness solo informan; la carga ocurre en el arranque"""
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    import api
+    from models.predict import ChatPredictor
+
+    cold = ChatPredictor(model_path=api.predictor.model_path)
+    monkeypatch.setattr(api, "predictor", cold)
+    monkeypatch.setattr(cold, "load_model", lambda: pytest.fail("una sonda cargó el modelo"))
+
+    client = TestClient(api.app)
+    assert client.get("/livez").json() == {"status": "alive"}
+    ready = client.get("/readyz")
+    assert ready.status_code == 503 and ready.json()["state"] == "cold"
+    assert client.get("/health").json()["model_loaded"] is False
+    assert client.get("/").json()["model_loaded"] is False
+
+    monkeypatch.undo()
+    monkeypatch.setattr(api, "predictor", ChatPredictor(model_path=api.predictor.model_path))
+    with TestClient(api.app) as warm_client:
+        ready = warm_client.get("/readyz")
+        assert ready.status_code == 200
+        assert ready.json()["state"] == "warm"
+        assert ready.json()["model_version"].startswith("baseline_nb.joblib:")
+
+
+def test_metrics_endpoint_exposes_prometheus_text():
+    """/metrics reporta latencia por endpoint, intenciones, FALLBACK, cachés y pool"""
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    import simple_api
+
+    client = TestClient(simple_api.app)
+    for text in ["hola", "hola", "zzzz qqqq"]:
+        assert client.post("/chat", json={"text": text}).status_code == 200
+    client.get("/no-existe")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'chat_http_request_duration_seconds_count{endpoint="/chat"}' in body
+    assert 'chat_http_requests_total{endpoint="/chat",method="POST",status="200"}' in body
+    assert 'endpoint="unmatched"' in body and 'endpoint="/no-existe"' not in body
+    assert 'chat_predictions_total{intent="FALLBACK"}' in body
+    assert "chat_fallback_ratio " in body
+    assert 'chat_cache_hits_total{cache="predictions"}' in body
+    assert "chat_prediction_pool_in_flight 0" in body
+    assert "chat_pictos_index_size " in body and "chat_model_load_seconds " in body
+
+
+def test_admin_reload_requires_token(monkeypatch):
+    """/admin/reload-model solo responde con el token y publica el modelo validado"""
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    import simple_api
+
+    client = TestClient(simple_api.app)
+    assert client.post("/admin/reload-model").status_code == 403
+    monkeypatch.setattr(simple_api, "ADMIN_TOKEN", "secreto")
+    assert client.post("/admin/reload-model", headers={"X-Admin-Token": "otro"}).status_code == 403
+
+    assert client.post("/chat", json={"text": "hola"}).status_code == 200
+    headers = {"X-Admin-Token": "secreto"}
+    unchanged = client.post("/admin/reload-model", headers=headers)
+    assert unchanged.status_code == 200 and unchanged.json()["result"] == "unchanged"
+    forced = client.post("/admin/reload-model", params={"force": "true"}, headers=headers)
+    assert forced.status_code == 200 and forced.json()["result"] == "ok"
+    assert forced.json()["canary"]["accuracy"] >= 0.8
+    assert client.post("/chat", json={"text": "hola"}).json()["decided_intent"] == "SALUDAR"
+
+
+def test_websocket_chat_keeps_session_state():
+    """/ws/chat responde cada mensaje por la misma conexión y acumula el estado de la sesión"""
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    import api
+
+    client = TestClient(api.app)
+    with client.websocket_connect("/ws/chat") as ws:
+        opened = ws.receive_json()
+        assert opened["type"] == "session" and opened["messages"] == 0
+        assert opened["session_id"] in api.chat_sessions
+
+        ws.send_json({"id": "1", "text": "hola"})
+        first = ws.receive_json()
+        expected = client.post("/chat", json={"text": "hola"}).json()
+        assert first["type"] == "reply" and first["id"] == "1"
+        assert first["decided_intent"] == expected["decided_intent"]
+        assert first["pictos"] == expected["pictos"]
+
+        ws.send_json({"type": "config", "include_pictos": False})
+        assert ws.receive_json()["include_pictos"] is False
+        ws.send_text("tengo hambre")
+        second = ws.receive_json()
+        assert "pictos" not in second
+        assert second["session"]["messages"] == 2
+        assert second["session"]["last_intent"] == second["decided_intent"]
+
+        ws.send_json({"id": "3", "text": "   "})
+        error = ws.receive_json()
+        assert error["type"] == "error" and error["status"] == 422 and error["id"] == "3"
+        ws.send_json({"type": "suggest", "id": "4", "q": "ag"})
+        suggestions = ws.receive_json()
+        assert suggestions["type"] == "suggestions" and suggestions["suggestions"][0]["term"] == "agua"
+        assert client.get("/pictos/suggest", params={"q": "ag"}).json()["suggestions"] == suggestions["suggestions"]
+        # true no es un límite: se usa el de por defecto, no 1
+        ws.send_json({"type": "suggest", "id": "5", "q": "a", "limit": True})
+        assert len(ws.receive_json()["suggestions"]) > 1
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+    assert opened["session_id"] not in api.chat_sessions
+
+
+def test_websocket_rejects_binary_frames_and_parses_flags():
+    """Un frame binario se responde con error y cierre 1003; "false" como texto desactiva la opción"""
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+    import api
+
+    client = TestClient(api.app)
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.receive_json()
+        ws.send_json({"id": "1", "text": "hola", "include_pictos": "false"})
+        assert "pictos" not in ws.receive_json()
+        ws.send_json({"type": "config", "include_pictos": "false"})
+        assert ws.receive_json()["include_pictos"] is False
+        ws.send_json({"type": "config", "include_pictos": 0})
+        assert ws.receive_json()["status"] == 422
+
+        ws.send_bytes(b"\x00\x01")
+        error = ws.receive_json()
+        assert error["type"] == "error" and error["status"] == 415
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            ws.receive_json()
+        assert exc_info.value.code == 1003
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Regresión de arranque en frío del handler de Vercel (api/api.py)
+
+Importa el handler en un proceso limpio, mide el tiempo de importación y
+verifica que ni scikit-learn ni joblib se carguen al importar ni al atender
+el primer mensaje en el modo de servicio compilado.
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+
+# Presupuesto de importación del handler en segundos (configurable para CI lentos)
+COLD_START_BUDGET = float(os.environ.get("COLD_START_BUDGET", "3.0"))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import api.api
+import_seconds = time.perf_counter() - start
+heavy_after_import = sorted(m for m in ('sklearn', 'joblib') if m in sys.modules)
+
+from backend.simple_api import predictor
+start = time.perf_counter()
+predictor.process_message("hola quiero agua")
+first_message_seconds = time.perf_counter() - start
+heavy_after_message = sorted(m for m in ('sklearn', 'joblib') if m in sys.modules)
+
+print(json.dumps({
+    'import_seconds': import_seconds,
+    'first_message_seconds': first_message_seconds,
+    'heavy_after_import': heavy_after_import,
+    'heavy_after_message': heavy_after_message,
+}))
+"""
+
+
+def measure_cold_start() -> dict:
+    """Ejecuta la sonda en un intérprete nuevo y retorna sus mediciones"""
+    env = {**os.environ, "PYTHONPATH": str(ROOT_DIR)}
+    env.pop("CHAT_PREDICTOR_BACKEND", None)
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_handler_cold_start():
+    """El handler no debe importar scikit-learn y debe arrancar dentro del presupuesto"""
+    stats = measure_cold_start()
+    print(f"Importación del handler: {stats['import_seconds'] * 1000:.1f} ms")
+    print(f"Primer mensaje: {stats['first_message_seconds'] * 1000:.1f} ms")
+
+    assert stats['heavy_after_import'] == []
+    assert stats['heavy_after_message'] == []
+    assert stats['import_seconds'] < COLD_START_BUDGET
+
+
+if __name__ == "__main__":
+    test_handler_cold_start()
+    print("Arranque en frío dentro del presupuesto")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Pruebas del generador de diálogos sintéticos (sin datasets ARASAAC)
+"""
+import csv
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+sys.path.insert(0, str(ROOT_DIR / "backend" / "scripts"))
+
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+import generate_data
+from generate_data import DialogueGeneratorForKids, SPLIT_FILES
+from utils.dataset_utils import COMPACT_SCHEMA_FILE, load_compact_schema, load_split
+
+
+def make_generator(tmp_path):
+    return DialogueGeneratorForKids(str(tmp_path / "sin_palabras.json"), str(tmp_path / "sin_pictos.json"))
+
+
+def read_split(directory, name):
+    with open(Path(directory) / SPLIT_FILES[name], encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_sharded_generation_is_reproducible_across_workers(tmp_path):
+    """La salida depende de la semilla y del tamaño de shard, no de la cantidad de procesos"""
+    outputs = []
+    for workers in (1, 2):
+        out_dir = tmp_path / f"out{workers}"
+        stats = make_generator(tmp_path).generate_sharded(
+            700, str(out_dir), workers=workers, shard_size=150, seed=7)
+        outputs.append({name: (out_dir / filename).read_bytes() for name, filename in SPLIT_FILES.items()})
+        assert sum(stats['splits'].values()) == sum(stats['intents'].values()) == 700
+        assert [p.name for p in out_dir.iterdir() if p.name.startswith('.')] == []
+    assert outputs[0] == outputs[1]
+
+    rows = {name: read_split(tmp_path / "out1", name) for name in SPLIT_FILES}
+    ids = [row['id'] for split in rows.values() for row in split]
+    assert len(ids) == len(set(ids)) == 700
+    # Cada fila quedó en el split que le asigna el hash de su índice
+    for name, split in rows.items():
+        for row in split:
+            index = int(row['id'].rsplit('_', 1)[1])
+            assert generate_data.split_for_index(index, 7, 0.7, 0.15) == name
+    assert 0.6 < len(rows['train']) / 700 < 0.8
+
+    other_seed = tmp_path / "otra"
+    make_generator(tmp_path).generate_sharded(700, str(other_seed), workers=1, shard_size=150, seed=8)
+    assert (other_seed / SPLIT_FILES['train']).read_bytes() != outputs[0]['train']
+
+
+def test_compact_format_keeps_texts_and_intents(tmp_path):
+    """El formato compacto guarda los mismos diálogos con ids y load_split lo lee igual"""
+    full_dir, compact_dir = tmp_path / "full", tmp_path / "compact"
+    make_generator(tmp_path).generate_sharded(500, str(full_dir), workers=1, shard_size=200, seed=3)
+    make_generator(tmp_path).generate_sharded(500, str(compact_dir), workers=1, shard_size=200, seed=3,
+                                              output_format='compact')
+    assert (compact_dir / COMPACT_SCHEMA_FILE).exists() and not (full_dir / COMPACT_SCHEMA_FILE).exists()
+
+    for name, filename in SPLIT_FILES.items():
+        assert load_split(str(compact_dir / filename)) == load_split(str(full_dir / filename))
+        assert list(read_split(compact_dir, name)[0]) == generate_data.COMPACT_FIELDNAMES
+        assert (compact_dir / filename).stat().st_size * 2 < (full_dir / filename).stat().st_size
+
+    # El template_id apunta al template original
+    schema = load_compact_schema(str(compact_dir))
+    for full, compact in zip(read_split(full_dir, 'train'), read_split(compact_dir, 'train')):
+        intent = schema['intents'][int(compact['intent_id'])]
+        assert (intent, schema['templates'][intent][int(compact['template_id'])]) == (full['intent'], full['template'])
+
+    # Volver a generar en formato completo borra el esquema viejo
+    make_generator(tmp_path).generate_sharded(50, str(compact_dir), workers=1, seed=3)
+    assert not (compact_dir / COMPACT_SCHEMA_FILE).exists()
+
+
+def test_compiled_templates_match_str_replace(tmp_path):
+    """Llenar el template compilado sortea y arma lo mismo que reemplazar cada placeholder"""
+    import random
+    generator, other = make_generator(tmp_path), make_generator(tmp_path)
+
+    def reference(template, rng):
+        for placeholder, options in generator.vocabulary.items():
+            if f"{{{placeholder}}}" in template:
+                template = template.replace(f"{{{placeholder}}}", rng.choice(options))
+        return template
+
+    templates = [t for data in generator.intents.values() for t in data["templates"]]
+    templates += ["{persona} y {persona} con {desconocido}", "{desconocido}", ""]
+    for template in templates:
+        compiled = generate_data.compile_template(template, generator.vocabulary)
+        assert "".join(compiled.parts) == template
+        for seed in range(5):
+            generator.rng = random.Random(seed)
+            filled = generator.generate_kid_dialogue("SALUDAR", template)
+            other.rng = random.Random(seed)
+            assert filled == other.add_kid_variations(reference(template, other.rng))
+
+    # Las reglas de simplificación en una pasada equivalen a aplicarlas en orden
+    for text in ["estoy muy feliz", "me siento triste", "eh estoy muy me siento", "estoy muyy", "hola"]:
+        expected = text
+        for old, new in generate_data.SIMPLIFY_RULES.items():
+            expected = expected.replace(old, new)
+        assert generate_data._SIMPLIFY_RE.sub(lambda m: generate_data.SIMPLIFY_RULES[m.group()], text) == expected
+
+    assert generate_data.compile_template("quiero {objeto}", generator.vocabulary).has_request_word
+    assert not generate_data.compile_template("qui{objeto}ero", generator.vocabulary).has_request_word
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
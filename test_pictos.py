@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Pruebas del mapeador de pictogramas con un dataset ARASAAC pequeño
+"""
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+from utils import pictos_mapping
+from utils.pictos_mapping import PictosMapper, normalize_token
+from utils.prefix_index import PrefixIndex
+from utils.fuzzy_index import DeletionIndex, bounded_distance
+from utils.json_stream import iter_json_array
+
+MODEL_PATH = ROOT_DIR / "backend" / "models" / "baseline_nb.joblib"
+
+SAMPLE_PICTOS = [
+    {"_id": 2248, "keywords": [{"keyword": "agua"}, {"keyword": "Bebida"}]},
+    {"_id": 6889, "keywords": [{"keyword": "agua"}]},
+    {"_id": 2439, "keywords": [{"keyword": "jugar"}], "tags": ["juego"]},
+    {"_id": 4001, "keywords": [{"keyword": "chocolate caliente"}]},
+    {"_id": 4002, "keywords": [{"keyword": "chocolate"}]},
+    {"_id": 5000, "keywords": [{"keyword": "cuarto de hospital"}]},
+]
+
+
+def use_sample_dataset(tmp_path, monkeypatch):
+    """Apunta el mapeador a un dataset de ejemplo y a un índice temporal"""
+    picto_file = tmp_path / "dataset_picto.json"
+    words_file = tmp_path / "dataset_words.json"
+    picto_file.write_text(json.dumps(SAMPLE_PICTOS), encoding="utf-8")
+    words_file.write_text(json.dumps({"words": ["agua", "jugar"]}), encoding="utf-8")
+    monkeypatch.setattr(pictos_mapping, "DATASET_PICTO_FILE", str(picto_file))
+    monkeypatch.setattr(pictos_mapping, "DATASET_WORDS_FILE", str(words_file))
+    monkeypatch.setattr(pictos_mapping, "PICTOS_INDEX_DIR", str(tmp_path / "index"))
+    return picto_file
+
+
+def test_index_is_built_once_and_reused(tmp_path, monkeypatch):
+    """El segundo mapeador debe abrir el índice en disco sin recorrer el corpus"""
+    picto_file = use_sample_dataset(tmp_path, monkeypatch)
+    original_build = PictosMapper._build_from_arasaac_datasets
+    built = PictosMapper()
+    assert built.get_pictos("agua") == [2248, 6889]
+
+    def fail_build(self):
+        raise AssertionError("el índice debería cargarse desde disco")
+
+    monkeypatch.setattr(PictosMapper, "_build_from_arasaac_datasets", fail_build)
+    loaded = PictosMapper()
+    assert dict(loaded.mapping) == dict(built.mapping)
+    assert loaded.map_text("quiero agua para jugar") == [2248, 6889, 2439]
+
+    # Cambiar el dataset invalida el índice guardado
+    monkeypatch.setattr(PictosMapper, "_build_from_arasaac_datasets", original_build)
+    picto_file.write_text(json.dumps(SAMPLE_PICTOS[:1]), encoding="utf-8")
+    assert PictosMapper().get_pictos("agua") == [2248]
+    assert len(list((tmp_path / "index").glob("v*-*"))) == 1
+
+    # También una edición del mismo tamaño que conserva la fecha de modificación
+    stat = picto_file.stat()
+    picto_file.write_text(json.dumps(SAMPLE_PICTOS[:1]).replace("2248", "3248"), encoding="utf-8")
+    os.utime(picto_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert picto_file.stat().st_size == stat.st_size
+    assert PictosMapper().get_pictos("agua") == [3248]
+
+
+def test_shared_mapper_is_built_once(tmp_path, monkeypatch):
+    """Los helpers de compatibilidad comparten un único mapeador hasta recargarlo"""
+    use_sample_dataset(tmp_path, monkeypatch)
+    monkeypatch.setattr(pictos_mapping, "_shared_mapper", None)
+    built = []
+    original_init = PictosMapper.__init__
+
+    def counting_init(self, *args, **kwargs):
+        built.append(self)
+        original_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(PictosMapper, "__init__", counting_init)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        mappers = set(pool.map(lambda _: pictos_mapping.get_shared_mapper(), range(32)))
+    assert len(mappers) == 1 and len(built) == 1
+
+    assert pictos_mapping.get_pictos_for_text("agua") == [2248, 6889]
+    assert pictos_mapping.get_picto_objs("jugar")[0]["id"] == 2439
+    assert len(built) == 1
+
+    reloaded = pictos_mapping.reload_shared_mapper()
+    assert reloaded is pictos_mapping.get_shared_mapper()
+    assert reloaded not in mappers and len(built) == 2
+
+
+def test_predictors_use_reloaded_mapper(tmp_path, monkeypatch):
+    """Tras reload_shared_mapper los predictores en servicio usan el mapeo nuevo"""
+    from models.predict import ChatPredictor
+    from models.simple_predictor import SimpleChatPredictor
+
+    picto_file = use_sample_dataset(tmp_path, monkeypatch)
+    monkeypatch.setattr(pictos_mapping, "_shared_mapper", None)
+    predictor = ChatPredictor(model_path=str(MODEL_PATH), backend='compiled')
+    simple = SimpleChatPredictor()
+    assert predictor.picto_mapper.get_pictos("agua") == [2248, 6889]
+
+    picto_file.write_text(json.dumps(SAMPLE_PICTOS + [{"_id": 7777, "keywords": [{"keyword": "agua"}]}]),
+                          encoding="utf-8")
+    reloaded = pictos_mapping.reload_shared_mapper()
+    assert predictor.picto_mapper is reloaded and simple.picto_mapper is reloaded
+    assert 7777 in predictor.predict_intent("quiero agua")["pictos"]
+    assert 7777 in simple.predict_intent("quiero agua")["pictos"]
+
+
+def test_lazy_indexes_belong_to_each_mapper(tmp_path, monkeypatch):
+    """Cada mapeador (también el de reload_shared_mapper) arma sus índices con sus propios locks"""
+    use_sample_dataset(tmp_path, monkeypatch)
+    first, second = PictosMapper(), PictosMapper()
+    legacy = pictos_mapping.PictoMapper({"agua": ["7"], "gato negro": ["8"]})
+    assert first._index_lock is not second._index_lock and first._phrase_lock is not legacy._phrase_lock
+
+    first.get_prefix_index()
+    assert second._prefix_index is None and second._term_aliases is None
+    assert legacy.get_prefix_index().complete("ag", 3) == ["agua"]
+    assert legacy.segment("un gato negro") == ["un", "gato negro"]
+    assert first.segment("quiero chocolate caliente")[-1] == "chocolate caliente"
+
+
+def test_multiword_keywords_use_longest_match(tmp_path, monkeypatch):
+    """Los términos de dos palabras del dataset se reconocen dentro del mensaje"""
+    use_sample_dataset(tmp_path, monkeypatch)
+    mapper = PictosMapper()
+
+    assert "chocolate caliente" in mapper.mapping
+    assert mapper.segment("Quiero CHOCOLATE caliente, ya") == ["quiero", "chocolate caliente", "ya"]
+    assert mapper.map_text("quiero chocolate caliente") == [4001]
+    assert mapper.map_text("chocolate frio y agua") == [4002, 2248, 6889]
+    assert mapper.get_pictos("Chocolate  Caliente") == [4001]
+
+
+def test_suggest_completes_prefixes(tmp_path, monkeypatch):
+    """Las sugerencias completan la palabra en curso, los términos más cortos primero"""
+    use_sample_dataset(tmp_path, monkeypatch)
+    mapper = PictosMapper()
+
+    assert mapper.suggest("quiero Choc") == [
+        {"term": "chocolate", "pictos": [4002]},
+        {"term": "chocolate caliente", "pictos": [4001]},
+    ]
+    # Las últimas palabras pueden ser el inicio de un término de varias palabras
+    assert [s["term"] for s in mapper.suggest("un chocolate cal")] == ["chocolate caliente"]
+    assert mapper.suggest("ag", limit=1) == [{"term": "agua", "pictos": [2248, 6889]}]
+    assert mapper.suggest("xyz") == [] and mapper.suggest("   ") == []
+
+
+def test_prefix_index_table_matches_scan():
+    """El ranking precalculado de prefijos cortos coincide con ordenar el rango"""
+    terms = ["casa", "cama", "camión", "ca", "caballo", "cepillo", "casa azul", "oso"]
+    precomputed = PrefixIndex(terms)
+    scanned = PrefixIndex(terms, table_depth=0)
+    for prefix in ["c", "ca", "cam", "casa", "o", "z"]:
+        assert precomputed.complete(prefix, 3) == scanned.complete(prefix, 3)
+    assert precomputed.complete("ca", 3) == ["ca", "cama", "casa"]
+
+
+def test_fuzzy_lookup_corrects_misspellings(tmp_path, monkeypatch):
+    """Las palabras mal escritas se corrigen solo si la búsqueda exacta falla, y se informa la corrección"""
+    use_sample_dataset(tmp_path, monkeypatch)
+    mapper = PictosMapper()
+
+    pictos, corrections = mapper.map_text_detailed("kiero agwa y jugr")
+    assert pictos == [2248, 6889, 2439]
+    assert corrections == [
+        {"input": "agwa", "term": "agua", "distance": 1},
+        {"input": "jugr", "term": "jugar", "distance": 1},
+    ]
+    assert mapper.lookup("chocolaet") == ([4002], {"input": "chocolaet", "term": "chocolate", "distance": 1})
+    # Palabras cortas o demasiado lejanas no se corrigen
+    assert mapper.lookup("ag") == ([], None)
+    assert mapper.lookup("zapato") == ([], None)
+
+    def fail_index(self):
+        raise AssertionError("la búsqueda exacta no debería usar el índice aproximado")
+
+    monkeypatch.setattr(PictosMapper, "get_fuzzy_index", fail_index)
+    assert PictosMapper().map_text_detailed("agua y jugar") == ([2248, 6889, 2439], [])
+
+
+def test_fuzzy_lookup_keeps_known_words(tmp_path, monkeypatch):
+    """Las palabras bien escritas sin pictograma no se "corrigen" a un término parecido"""
+    words_file = ROOT_DIR / "backend" / "dataset_words.json"
+    monkeypatch.setattr(pictos_mapping, "DATASET_PICTO_FILE", str(tmp_path / "sin_pictos.json"))
+    monkeypatch.setattr(pictos_mapping, "DATASET_WORDS_FILE", str(words_file))
+    monkeypatch.setattr(pictos_mapping, "MAPPING_FILE", str(tmp_path / "sin_mapeo.json"))
+    monkeypatch.setattr(pictos_mapping, "PICTOS_INDEX_DIR", str(tmp_path / "index"))
+    mapper = PictosMapper()
+    assert "casa" in mapper.mapping and "cosa" not in mapper.mapping
+
+    for word in ["cosa", "cama", "mesa", "ola", "sol"]:
+        assert mapper.lookup(word) == ([], None), word
+    assert mapper.map_text_detailed("la cosa de la cama") == ([], [])
+    # Los errores reales se siguen corrigiendo
+    assert mapper.lookup("kasa")[1] == {"input": "kasa", "term": "casa", "distance": 1}
+    assert mapper.lookup("trizte")[1] == {"input": "trizte", "term": "triste", "distance": 1}
+
+
+def test_accented_keys_match_unaccented_input(tmp_path, monkeypatch):
+    """Escribir "nino" o "niño" da el pictograma de la clave "niño" sin marcarlo como corrección"""
+    monkeypatch.setattr(pictos_mapping, "DATASET_PICTO_FILE", str(tmp_path / "sin_pictos.json"))
+    monkeypatch.setattr(pictos_mapping, "MAPPING_FILE", str(tmp_path / "sin_mapeo.json"))
+    monkeypatch.setattr(pictos_mapping, "PICTOS_INDEX_DIR", str(tmp_path / "index"))
+    mapper = PictosMapper()
+    expected = mapper.mapping["niño"][:3]
+
+    assert mapper.lookup("nino") == (expected, None)
+    assert mapper.lookup("niño") == (expected, None)
+    assert mapper.map_text("nino") == mapper.map_text("niño") != []
+
+
+def test_deletion_index_distances():
+    """El índice de borrados encuentra términos a distancia 1 y 2, incluidas transposiciones"""
+    index = DeletionIndex(["quiero", "agua", "jugar", "mamá", "pelota"], prefix_length=4)
+    assert index.lookup("kiero") == ("quiero", 2)
+    assert index.lookup("aguq") == ("agua", 1)
+    assert index.lookup("pleota") == ("pelota", 1)
+    assert index.lookup("pelotazzz") is None
+    assert bounded_distance("jugar", "jgaur", 2) == 2
+    assert bounded_distance("jugar", "xxxxx", 2) is None
+
+
+def test_normalize_matches_unidecode_reference():
+    """La tabla de traducción da lo mismo que lower + unidecode + filtro, también fuera del rango latino"""
+    import re
+    from unidecode import unidecode
+
+    def reference(token):
+        return re.sub(r"[^a-z0-9áéíóúñ]", "", unidecode(token.lower().strip()))
+
+    samples = [chr(cp) for cp in range(0x3000)]
+    samples += ["  Niño, ", "¿Qué?", "Ñandú", "straße", "İstanbul", "日本語 agua", "ǅemal", ""]
+    words_file = Path(pictos_mapping.DATASET_WORDS_FILE)
+    if words_file.exists():
+        samples += json.loads(words_file.read_text(encoding="utf-8"))["words"]
+    normalize_token.cache_clear()
+    assert [normalize_token(t) for t in samples] == [reference(t) for t in samples]
+    assert PictosMapper.normalize("¡AGUA!") == "agua"
+
+
+def test_streaming_reader_matches_json_load(tmp_path):
+    """El lector por bloques entrega los mismos elementos que json.load, aun con bloques mínimos"""
+    records = SAMPLE_PICTOS + [
+        {"_id": 7, "keywords": [{"keyword": "llave ] { \" , :"}], "score": -1.5e3},
+        12345678901234567890, "ñandú", None, True, [], {},
+    ]
+    picto_file = tmp_path / "pictos.json"
+    picto_file.write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding="utf-8")
+    words_file = tmp_path / "words.json"
+    words_file.write_text(json.dumps({"meta": {"n": [1, 2]}, "words": ["agua", "casa"], "x": 1}), encoding="utf-8")
+
+    for chunk_size in (1, 3, 64, 1 << 16):
+        assert list(iter_json_array(str(picto_file), chunk_size=chunk_size)) == records
+        assert list(iter_json_array(str(words_file), key="words", chunk_size=chunk_size)) == ["agua", "casa"]
+
+    bad_file = tmp_path / "bad.json"
+    bad_file.write_text('{"words": "agua"}', encoding="utf-8")
+    for key in ("words", "otra"):
+        try:
+            list(iter_json_array(str(bad_file), key=key))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("se esperaba ValueError")
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Pruebas del predictor del chat sin levantar el servidor
+"""
+import csv
+import os
+import shutil
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+import joblib
+import numpy as np
+from models import predict as predict_module
+from models.predict import ChatPredictor
+from models.compiled_nb import CompiledNB
+from models.simple_predictor import SimpleChatPredictor
+
+MODEL_PATH = ROOT_DIR / "backend" / "models" / "baseline_nb.joblib"
+TEST_CSV = ROOT_DIR / "data" / "processed" / "dialogos_test_kids.csv"
+
+TEXTS = ["hola", "quiero agua", "tengo hambre", "me duele la cabeza", "asdfff"]
+
+
+def test_process_messages_matches_single():
+    """El lote debe dar los mismos resultados y en el mismo orden que uno a uno"""
+    predictor = ChatPredictor(model_path=str(MODEL_PATH))
+    batch = predictor.process_messages(TEXTS)
+
+    assert [r['input'] for r in batch] == TEXTS
+    for text, result in zip(TEXTS, batch):
+        single = predictor.process_message(text)
+        assert result['decided_intent'] == single['decided_intent']
+        assert result['prediction'] == single['prediction']
+        assert result['pictos'] == single['pictos']
+
+    assert predictor.process_messages([]) == []
+
+
+def test_compiled_backend_matches_pipeline():
+    """El puntuador NumPy debe reproducir las probabilidades del pipeline"""
+    with open(TEST_CSV, encoding='utf-8') as f:
+        texts = [row['texto'] for row in csv.DictReader(f)][:2000]
+    texts += ["", "ÁRBOL Niño ñandú", "qué tal?? 123"]
+
+    pipeline = joblib.load(MODEL_PATH)
+    compiled = CompiledNB.from_pipeline(pipeline)
+
+    assert list(compiled.classes_) == list(pipeline.classes_)
+    np.testing.assert_allclose(compiled.predict_proba(texts), pipeline.predict_proba(texts), atol=1e-12)
+
+    predictor = ChatPredictor(model_path=str(MODEL_PATH), backend='compiled')
+    reference = ChatPredictor(model_path=str(MODEL_PATH), backend='sklearn')
+    for text in TEXTS:
+        assert predictor.predict_intent(text)['decided_intent'] == reference.predict_intent(text)['decided_intent']
+
+
+def test_compiled_export_rejects_other_classifiers():
+    """Solo se compila TfidfVectorizer + MultinomialNB: otro clasificador puntúa distinto"""
+    import pytest
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import BernoulliNB, ComplementNB, MultinomialNB
+    from sklearn.pipeline import Pipeline
+
+    texts = [text for text, _ in predict_module.CANARY_SET]
+    labels = [intent for _, intent in predict_module.CANARY_SET]
+    for clf in [ComplementNB(), BernoulliNB(), LogisticRegression()]:
+        pipeline = Pipeline([('tfidf', TfidfVectorizer()), ('clf', clf)]).fit(texts, labels)
+        with pytest.raises(ValueError, match=type(clf).__name__):
+            CompiledNB.from_pipeline(pipeline)
+    # La combinación soportada sigue exportándose
+    supported = Pipeline([('tfidf', TfidfVectorizer()), ('clf', MultinomialNB())]).fit(texts, labels)
+    np.testing.assert_allclose(CompiledNB.from_pipeline(supported).predict_proba(texts),
+                               supported.predict_proba(texts), atol=1e-12)
+
+
+def test_simple_predictor_word_boundaries():
+    """Las reglas coinciden por palabras completas y sin importar acentos"""
+    predictor = SimpleChatPredictor()
+
+    def intent(text):
+        return predictor.predict_intent(text, include_pictos=False)['decided_intent']
+
+    assert intent("mi nombre es ana") == "FALLBACK"
+    assert intent("casi listo") == "FALLBACK"
+    assert intent("no") == "NEGACION"
+    assert intent("Sí, claro") == "CONFIRMACION"
+    assert intent("¿qué tal?") == "SALUDAR"
+    assert intent("me duele la cabeza") == "DOLOR"
+
+    predictor.intent_rules["JUGAR"].append("escondidas")
+    predictor.compile_rules()
+    assert intent("juguemos a las escondidas") == "JUGAR"
+
+
+def test_prediction_cache(tmp_path, monkeypatch):
+    """Las frases repetidas salen del caché y el caché se invalida si cambia el modelo"""
+    model_copy = tmp_path / "baseline_nb.joblib"
+    shutil.copy(MODEL_PATH, model_copy)
+    monkeypatch.setattr(predict_module, "PREDICTION_CACHE_SIZE", 2)
+    monkeypatch.setattr(predict_module, "MODEL_CHECK_INTERVAL", 0.0)
+    predictor = ChatPredictor(model_path=str(model_copy), backend='sklearn')
+
+    first = predictor.predict_intent("Quiero  agua")
+    calls = []
+    monkeypatch.setattr(predict_module, "predict_batch",
+                        lambda *args, **kwargs: calls.append(args) or [])
+    again = predictor.predict_intent("quiero agua")
+    assert calls == []
+    assert again['input'] == "quiero agua"
+    assert again['prediction'] == first['prediction']
+    assert predictor.cache.stats()['hits'] == 1
+    monkeypatch.undo()
+
+    monkeypatch.setattr(predict_module, "MODEL_CHECK_INTERVAL", 0.0)
+    predictor.predict_intents(["hola", "tengo hambre"])
+    stats = predictor.cache.stats()
+    assert stats['size'] == 2 and stats['evictions'] == 1
+
+    # Un modelo nuevo en disco se recarga en segundo plano: la petición que lo
+    # detecta responde con el anterior, y al publicarlo se vacía el caché
+    old_version = predictor.model_version
+    os.utime(model_copy, ns=(0, 10**9))
+    predictor.predict_intent("hola")
+    predictor.wait_for_reload(timeout=30)
+    assert predictor.model_version != old_version
+    assert predictor.cache.stats()['size'] == 0
+    predictor.predict_intent("hola")
+    assert predictor.cache.stats()['size'] == 1
+
+
+def test_hot_reload_validates_with_canary(tmp_path, monkeypatch):
+    """Un modelo que falla el canario no se publica; uno válido se publica sin cortar las peticiones en curso"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+
+    model_copy = tmp_path / "baseline_nb.joblib"
+    shutil.copy(MODEL_PATH, model_copy)
+    monkeypatch.setattr(predict_module, "MODEL_CHECK_INTERVAL", 0.0)
+    predictor = ChatPredictor(model_path=str(model_copy), backend='sklearn')
+    in_flight = predictor.load_model()
+    assert predictor.reload_model()['result'] == 'unchanged'
+
+    # Modelo con las etiquetas del canario rotadas: carga bien pero predice mal
+    texts = [text for text, _ in predict_module.CANARY_SET]
+    labels = [intent for _, intent in predict_module.CANARY_SET]
+    bad = Pipeline([('tfidf', TfidfVectorizer()), ('nb', MultinomialNB())])
+    bad.fit(texts, labels[1:] + labels[:1])
+    joblib.dump(bad, model_copy)
+    os.utime(model_copy, ns=(0, 2 * 10**9))
+    report = predictor.reload_model()
+    assert report['result'] == 'rejected' and 'canario' in report['detail']
+    assert predictor.model_version == in_flight.version
+    # La versión rechazada no se reintenta en cada petición
+    predictor.predict_intent("hola")
+    assert predictor._reload_thread is None
+
+    shutil.copy(MODEL_PATH, model_copy)
+    os.utime(model_copy, ns=(0, 3 * 10**9))
+    report = predictor.reload_model()
+    assert report['result'] == 'ok' and report['canary']['accuracy'] >= 0.8
+    assert report['previous_version'] == in_flight.version
+    assert predictor.model_version == report['version'] != in_flight.version
+    # La referencia tomada antes de la recarga sigue siendo un modelo completo
+    assert predict_module.predict(in_flight.model, "hola")[0][0] == 'SALUDAR'
+    assert predictor.status()['reload']['result'] == 'ok'
+    assert predictor.reload_counter.values() == {('unchanged',): 1, ('rejected',): 1, ('ok',): 1}
+
+
+def test_compiled_backend_serves_retrained_model(tmp_path, monkeypatch):
+    """Tras reentrenar, el backend 'compiled' recarga y sirve el modelo nuevo aunque falte exportar el .npz"""
+    from argparse import Namespace
+    from models import train
+
+    def fit(extra):
+        pairs = predict_module.CANARY_SET + extra
+        return train.build_pipeline(min_df=1, max_df=1.0).fit([t for t, _ in pairs], [i for _, i in pairs])
+
+    def save(pipe, metrics_name):
+        metrics = {'test': {'accuracy': 1.0, 'f1_macro': 1.0}}
+        args = Namespace(model_out=str(tmp_path / "baseline_nb.joblib"), metrics_out=str(tmp_path / metrics_name))
+        train.save_model(pipe, metrics, args)
+
+    monkeypatch.setattr(predict_module, "MODEL_CHECK_INTERVAL", 0.0)
+    save(fit([]), "m1.json")
+    predictor = ChatPredictor(model_path=str(tmp_path / "baseline_nb.joblib"), backend='compiled')
+    assert predictor.load_model().path == str(tmp_path / "baseline_nb.npz")
+
+    # train.py exporta el .npz junto al .joblib
+    save(fit([("dinosaurio grande", "DINOSAURIO")]), "m2.json")
+    os.utime(tmp_path / "baseline_nb.npz", ns=(0, 10**9))
+    assert predictor.reload_model()['result'] == 'ok'
+    assert predictor.load_model().path.endswith(".npz")
+    assert predictor.predict_intent("dinosaurio grande")['prediction'][0]['intent'] == 'DINOSAURIO'
+
+    # Un .joblib nuevo sin exportar también se detecta y se compila en memoria
+    joblib.dump(fit([("cohete espacial", "COHETE")]), tmp_path / "baseline_nb.joblib")
+    os.utime(tmp_path / "baseline_nb.joblib", ns=(0, 2 * 10**9))
+    predictor.predict_intent("hola")
+    predictor.wait_for_reload(timeout=30)
+    assert predictor.load_model().path.endswith(".joblib")
+    assert predictor.predict_intent("cohete espacial")['prediction'][0]['intent'] == 'COHETE'
+    assert predictor.reload_model(force=True)['result'] == 'ok'
+    assert 'COHETE' in predictor.model.classes_
+
+
+def test_status_and_metrics_do_not_build_picto_mapper(monkeypatch):
+    """status() y el scrape de métricas no construyen el mapeador de pictogramas en frío"""
+    from utils import pictos_mapping
+    from utils.metrics import MetricsRegistry
+
+    monkeypatch.setattr(pictos_mapping, "_shared_mapper", None)
+    predictor = ChatPredictor(model_path=str(MODEL_PATH), backend='compiled')
+    registry = MetricsRegistry()
+    predictor.register_metrics(registry)
+
+    status = predictor.status()
+    text = registry.render()
+    assert status['pictos_index_size'] == 0 and predictor.cache_stats()['pictos'] is None
+    assert 'chat_pictos_index_size 0' in text and 'cache="pictos"' not in text
+    assert pictos_mapping.peek_shared_mapper() is None
+
+    predictor.warmup()
+    # El calentamiento no cuenta como tráfico: ni intenciones ni caché de predicciones
+    assert predictor.intent_counter.values() == {}
+    assert predictor.cache.stats()['misses'] == predictor.cache.stats()['size'] == 0
+    assert 'chat_predictions_total{' not in registry.render()
+    assert predictor.status()['pictos_index_size'] == len(pictos_mapping.peek_shared_mapper().mapping) > 0
+    assert 'cache="pictos"' in registry.render()
+
+
+def test_stage_timings_only_when_requested():
+    """Con debug se reportan las etapas y se agregan a los histogramas; sin debug, nada"""
+    predictor = ChatPredictor(model_path=str(MODEL_PATH), backend='compiled')
+    plain = predictor.process_message("quiero agua")
+    assert 'timings_ms' not in plain
+    assert predictor.stage_stats()['total']['count'] == 0
+
+    predictor.cache.clear()
+    debug = predictor.process_message("quiero agua", debug=True)
+    timings = debug.pop('timings_ms')
+    assert {'normalize', 'cache', 'transform', 'score', 'topk', 'pictos', 'response', 'total'} <= set(timings)
+    assert timings['total'] >= timings['transform'] + timings['score']
+    assert debug['prediction'] == plain['prediction']
+
+    stats = predictor.stage_stats()
+    assert stats['total']['count'] == 1 and stats['score']['count'] == 1
+    assert stats['total']['p50_ms'] is not None
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
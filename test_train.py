@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Pruebas del entrenamiento (barrido, caché de features y modo streaming) con un corpus pequeño
+"""
+import csv
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+from models import train
+from utils.feature_cache import features_key, file_fingerprint, load_or_build_features
+
+TEST_CSV = ROOT_DIR / "data" / "processed" / "dialogos_test_kids.csv"
+
+
+def load_sample(limit: int):
+    with open(TEST_CSV, encoding="utf-8") as f:
+        rows = [row for _, row in zip(range(limit), csv.DictReader(f))]
+    return [row["texto"] for row in rows], [row["intent"] for row in rows]
+
+
+def test_cached_tokens_match_pipeline_analyzer():
+    """Los n-gramas armados desde los tokens en caché son los mismos que los del vectorizador"""
+    texts = ["Me duele la CABEZA", "¿Quiero agua, mamá?", "hola", "", "ñandú está aquí ya"]
+    tokens = train.tokenize_texts(texts)
+    for ngram_range in [(1, 1), (1, 2), (1, 3), (2, 3)]:
+        analyzer = train.build_pipeline(ngram_range=ngram_range).named_steps['tfidf'].build_analyzer()
+        cached = train.ngram_analyzer(ngram_range)
+        assert [cached(t) for t in tokens] == [analyzer(text) for text in texts]
+
+
+def test_sweep_ranks_by_val_f1_then_latency():
+    """El barrido evalúa cada configuración en el pool y ordena por F1 de validación"""
+    texts, intents = load_sample(600)
+    configs = train.sweep_configs('random', 3, seed=1)
+    results = train.run_sweep(texts[:400], intents[:400], texts[400:], intents[400:], configs, jobs=1)
+
+    assert sorted(map(str, (r['params'] for r in results))) == sorted(map(str, configs))
+    keys = [(-round(r['val_f1_macro'], 4), r['latency_us']) for r in results]
+    assert keys == sorted(keys)
+    assert all(r['n_features'] > 0 and r['latency_us'] > 0 for r in results)
+
+    # Reentrenar la mejor sobre texto crudo reproduce su F1 de validación
+    from sklearn.metrics import f1_score
+    best = results[0]
+    pipe = train.build_pipeline(**best['params']).fit(texts[:400], intents[:400])
+    f1 = f1_score(intents[400:], pipe.predict(texts[400:]), average='macro')
+    assert abs(f1 - best['val_f1_macro']) < 1e-9
+
+
+def test_feature_cache_skips_text_processing(tmp_path):
+    """La segunda corrida lee las matrices del caché y el vectorizador reconstruido transforma igual"""
+    texts, intents = load_sample(300)
+    splits = {'train': (texts[:200], intents[:200]), 'val': (texts[200:], intents[200:])}
+    cache_dir = str(tmp_path / "features")
+
+    first = load_or_build_features(train.build_pipeline().named_steps['tfidf'], splits, cache_dir)
+    second = load_or_build_features(train.build_pipeline().named_steps['tfidf'], splits, cache_dir)
+    assert not first.cached and second.cached and first.key == second.key
+    for name in splits:
+        assert (first.matrices[name] != second.matrices[name]).nnz == 0
+    assert (second.vectorizer.transform(texts[200:]) != first.matrices['val']).nnz == 0
+
+    # Otros parámetros del vectorizador u otros datos usan otra entrada
+    other_params = load_or_build_features(train.build_pipeline(min_df=1).named_steps['tfidf'], splits, cache_dir)
+    other_data = load_or_build_features(train.build_pipeline().named_steps['tfidf'],
+                                        {**splits, 'val': (texts[200:299], intents[200:299])}, cache_dir)
+    assert not other_params.cached and not other_data.cached
+    assert len({first.key, other_params.key, other_data.key}) == 3
+
+
+def test_feature_cache_keys_on_source_files(tmp_path):
+    """Con archivos de origen la clave usa su tamaño y mtime, no el contenido de cada texto"""
+    data_file = tmp_path / "train.csv"
+    data_file.write_text("texto,intent\nhola,SALUDAR\n", encoding="utf-8")
+    splits = {'train': (["hola"], ["SALUDAR"])}
+    sources = {'files': [file_fingerprint(str(data_file))], 'seed': 42}
+
+    key = features_key(splits, {}, sources)
+    assert len(key) == 32
+    # Mismo origen y mismo tamaño de split: la clave no vuelve a mirar los textos
+    assert features_key({'train': (["otro"], ["X"])}, {}, sources) == key
+    assert features_key(splits, {}, {**sources, 'seed': 7}) != key
+
+    data_file.write_text("texto,intent\nchau,DESPEDIR\n", encoding="utf-8")
+    edited = {'files': [file_fingerprint(str(data_file))], 'seed': 42}
+    assert edited != sources and features_key(splits, {}, edited) != key
+
+
+def test_streaming_training_matches_in_memory_fit(tmp_path):
+    """partial_fit por bloques da el mismo modelo que ajustar hashing + tf-idf + NB de una vez"""
+    from sklearn.feature_extraction.text import TfidfTransformer
+    from sklearn.metrics import classification_report, f1_score
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+    from models.predict import predict_batch
+
+    texts, intents = load_sample(500)
+    train_csv = tmp_path / "train.csv"
+    with open(train_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["texto", "intent"])
+        writer.writerows(zip(texts, intents))
+
+    small, counts = train.train_streaming(str(train_csv), chunk_size=7, n_features=2 ** 12)
+    large, _ = train.train_streaming(str(train_csv), chunk_size=1000, n_features=2 ** 12)
+    reference = Pipeline([('hash', train.hashing_vectorizer(n_features=2 ** 12)),
+                          ('tfidf', TfidfTransformer()), ('clf', MultinomialNB(alpha=0.5))])
+    reference.fit(texts, intents)
+    probe = ["quiero agua", "me duele la cabeza", "hola mamá"]
+    assert np.allclose(small.predict_proba(probe), reference.predict_proba(probe))
+    assert np.allclose(large.predict_proba(probe), reference.predict_proba(probe))
+    assert counts == {intent: intents.count(intent) for intent in set(intents)}
+    # El servicio (backend 'sklearn') aplica todas las etapas previas al clasificador
+    assert predict_batch(small, ["tengo hambre"])[0][0][0] == small.predict(["tengo hambre"])[0]
+
+    # Métricas acumuladas por bloques = métricas de scikit-learn
+    metrics = train.evaluate_streaming(small, str(train_csv), chunk_size=7)
+    pred = [str(p) for p in small.predict(texts)]
+    assert abs(metrics['f1_macro'] - f1_score(intents, pred, average='macro')) < 1e-12
+    expected = classification_report(intents, pred, output_dict=True, zero_division=0)
+    assert all(abs(metrics['report'][label][field] - value) < 1e-12
+               for label, row in expected.items() if label != 'accuracy'
+               for field, value in row.items())
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))